@@ -1,3 +1,4 @@
+import os
 import re
 
 import streamlit as st
@@ -5,11 +6,20 @@ from dotenv import load_dotenv
 
 from llm_client import (
     build_refined_search_query,
-    generate_chat_response,
-    get_clarification_plan,
-    get_router_decision,
+    stream_chat_response,
+    understand_query,
 )
-from search import search_products
+from intent_rules import fast_understanding
+from search import (
+    combination_queries,
+    fetch_more,
+    get_similar_products,
+    search_products,
+    search_products_batch,
+)
+import timing
+from thumbnails import thumbnail_url
+from taxonomy import AUDIENCE_TERMS, CATEGORY_TERMS, COLOR_TERMS, OCCASION_TERMS
 
 load_dotenv()
 
@@ -131,6 +141,16 @@ def extract_quantity(text, default=6, max_limit=6):
     return default
 
 
+SHOW_MORE_COUNT = 6
+SIMILAR_COUNT = 4
+CHAT_HISTORY_LIMIT = int(os.getenv("CHAT_HISTORY_LIMIT", "40"))            # messages kept in the session
+CHAT_EXPANDED_RESULTS = int(os.getenv("CHAT_EXPANDED_RESULTS", "2"))      # newest card grids shown in full
+
+# st.fragment (Streamlit >= 1.37) reruns only the decorated section when its own widgets
+# are clicked; without it every click reruns the whole page as before
+fragment = getattr(st, "fragment", None) or (lambda fn: fn)
+
+
 def format_clarification_message(questions, reason=""):
     question_lines = "\n".join([f"{idx + 1}. {q}" for idx, q in enumerate(questions)])
     prefix = "To narrow this down, I need a bit more detail."
@@ -150,29 +170,10 @@ def has_enough_search_context(text):
     tokens = re.findall(r"\b\w+\b", lowered)
     token_count = len(tokens)
 
-    category_terms = {
-        "saree", "sari", "kurti", "kurta", "dress", "gown", "shirt", "top",
-        "tee", "blouse", "jeans", "denim", "jacket", "coat", "lehenga",
-        "salwar", "suit", "tshirt", "t-shirt", "hoodie", "skirt", "pants",
-        "trousers", "traditional", "ethnic", "western"
-    }
-    color_terms = {
-        "red", "blue", "green", "white", "black", "grey", "gray", "pink",
-        "purple", "orange", "yellow", "maroon", "navy", "beige", "brown"
-    }
-    audience_terms = {
-        "men", "man", "male", "women", "woman", "female", "kids", "kid",
-        "boy", "boys", "girl", "girls", "family", "adult", "adults"
-    }
-    occasion_terms = {
-        "wedding", "party", "festival", "office", "casual", "formal",
-        "college", "daily", "travel", "function", "engagement", "diwali", "eid"
-    }
-
-    has_category = any(term in lowered for term in category_terms)
-    has_color = any(term in lowered for term in color_terms)
-    has_audience = any(term in lowered for term in audience_terms)
-    has_occasion = any(term in lowered for term in occasion_terms)
+    has_category = any(term in lowered for term in CATEGORY_TERMS)
+    has_color = any(term in lowered for term in COLOR_TERMS)
+    has_audience = any(term in lowered for term in AUDIENCE_TERMS)
+    has_occasion = any(term in lowered for term in OCCASION_TERMS)
     has_budget = bool(re.search(r"\b(budget|under|below|between|rs|inr|rupee|rupees|\d{3,})\b", lowered))
     has_quantity = bool(re.search(r"\b\d+\b", lowered))
 
@@ -187,7 +188,7 @@ def has_enough_search_context(text):
 
 
 def render_card(item, idx, msg_idx):
-    img_url = item.get("image") or item.get("img") or "https://via.placeholder.com/300x400?text=No+Image"
+    img_url = thumbnail_url(item.get("image") or item.get("img")) or "https://via.placeholder.com/300x400?text=No+Image"
     rating = format_rating(item.get("avg_rating"))
 
     with st.container():
@@ -213,10 +214,60 @@ def render_card(item, idx, msg_idx):
             st.toast(f"Added {item.get('brand')} to your cart.")
 
 
-def run_search_and_render(search_query):
-    with st.spinner("Searching inventory..."):
+def render_timing_panel():
+    """Sidebar breakdown of the last request plus p50/p95/p99 per stage."""
+    if not st.sidebar.toggle("Latency breakdown", key="show_timings"):
+        return
+    last = st.session_state.get("last_timings")
+    if last:
+        st.sidebar.markdown(f"**Last request: {last['total_ms']:.0f} ms**")
+        st.sidebar.dataframe(
+            [
+                {
+                    "stage": "· " * span["depth"] + span["name"],
+                    "ms": span["ms"],
+                    "details": ", ".join(
+                        f"{k}={v}" for k, v in span.items() if k not in ("name", "ms", "depth", "at_ms")
+                    ),
+                }
+                for span in sorted(last["spans"], key=lambda s: s.get("at_ms", 0))
+            ],
+            hide_index=True,
+            use_container_width=True,
+        )
+    else:
+        st.sidebar.caption("No request timed yet.")
+
+    stats = timing.histograms.snapshot()
+    if stats:
+        st.sidebar.markdown("**All requests (ms)**")
+        st.sidebar.dataframe(
+            [{"stage": name, **{k: round(v, 1) if k != "count" else v for k, v in h.items()}}
+             for name, h in stats.items()],
+            hide_index=True,
+            use_container_width=True,
+        )
+
+
+def run_search_and_render(search_query, understanding=None):
+    outfit = combination_queries((understanding or {}).get("intent") or {})
+    if outfit:
+        run_outfit_search_and_render(search_query, outfit)
+        return
+
+    with st.spinner("Searching inventory..."), timing.span("app.search"):
         k = extract_quantity(search_query)
-        results = search_products(search_query, top_k=k)
+        if understanding:
+            # intent and rewrite already came back with the routing call
+            results, cursor = search_products(
+                search_query,
+                top_k=k,
+                intent=understanding.get("intent"),
+                rewritten=understanding.get("rewritten_query"),
+                return_cursor=True,
+            )
+        else:
+            results, cursor = search_products(search_query, top_k=k, return_cursor=True)
 
     if not results:
         no_result_msg = (
@@ -228,7 +279,7 @@ def run_search_and_render(search_query):
             "What would you like to try next?"
         )
         st.markdown(no_result_msg)
-        st.session_state.messages.append(
+        add_message(
             {"role": "assistant", "content": no_result_msg, "results": [], "type": "chat"}
         )
         return
@@ -237,60 +288,161 @@ def run_search_and_render(search_query):
     msg_text = f"I have curated {len(results)} matches for you:"
     st.markdown(msg_text)
 
-    cols = st.columns(4)
-    current_msg_idx = len(st.session_state.messages)
-    for i, item in enumerate(results):
-        with cols[i % 4]:
-            render_card(item, i, current_msg_idx)
+    with timing.span("app.render_cards", cards=len(results)):
+        cols = st.columns(4)
+        current_msg_idx = st.session_state.next_message_id
+        for i, item in enumerate(results):
+            with cols[i % 4]:
+                render_card(item, i, current_msg_idx)
 
-    st.session_state.messages.append(
-        {"role": "assistant", "content": msg_text, "results": results, "type": "chat"}
+    add_message(
+        {"role": "assistant", "content": msg_text, "results": results, "type": "chat", "cursor": cursor}
     )
 
 
+def run_outfit_search_and_render(search_query, outfit):
+    """Combination intents ("kurti with jeans"): both halves in one batched search, one message each."""
+    with st.spinner("Putting the outfit together..."), timing.span("app.search", outfit=True):
+        batches = search_products_batch(outfit, top_k=extract_quantity(search_query))
+
+    if not any(batches):
+        run_search_and_render(search_query)
+        return
+
+    all_results = []
+    for query, results in zip(outfit, batches):
+        msg_text = (
+            f"For the {query['intent']['category']}, {len(results)} picks:" if results
+            else f"I could not find a matching {query['intent']['category']}."
+        )
+        st.markdown(msg_text)
+        with timing.span("app.render_cards", cards=len(results)):
+            cols = st.columns(4)
+            current_msg_idx = st.session_state.next_message_id
+            for i, item in enumerate(results):
+                with cols[i % 4]:
+                    render_card(item, i, current_msg_idx)
+        add_message(
+            {"role": "assistant", "content": msg_text, "results": results, "type": "chat"}
+        )
+        all_results += results
+    st.session_state.last_results = all_results
+
+
+def add_message(msg):
+    """Appends to the chat history with a stable id (widget keys use it) and drops the oldest beyond the limit."""
+    msg["id"] = st.session_state.next_message_id
+    st.session_state.next_message_id += 1
+    st.session_state.messages.append(msg)
+    if len(st.session_state.messages) > CHAT_HISTORY_LIMIT:
+        del st.session_state.messages[:-CHAT_HISTORY_LIMIT]
+    return msg
+
+
+@fragment
+def render_results(msg):
+    cols = st.columns(4)
+    for p_idx, item in enumerate(msg["results"]):
+        with cols[p_idx % 4]:
+            render_card(item, p_idx, msg["id"])
+    cursor = msg.get("cursor")
+    if cursor is not None and not cursor.exhausted:
+        if st.button("Show more", key=f"more_{msg['id']}"):
+            show_more(msg)
+
+
+def render_results_summary(items):
+    """Older grids: one line plus a plain-text list, no images or widgets."""
+    names = ", ".join(str(item.get("name")) for item in items[:3])
+    st.caption(f"{len(items)} items: {names}{', ...' if len(items) > 3 else ''}")
+    with st.expander("List"):
+        st.markdown("\n".join(
+            f"{i + 1}. {item.get('brand')} - {item.get('name')} (Rs {item.get('price')})" for i, item in enumerate(items)
+        ))
+
+
+@fragment
+def render_details(msg, expanded):
+    p = msg["product_data"]
+    col1, col2 = st.columns([1, 2])
+    with col1:
+        st.image(p.get("image") or p.get("img"), use_container_width=True)
+        if st.button("Add to Bag", key=f"det_cart_{msg['id']}", type="primary", use_container_width=True):
+            st.success("Added to bag.")
+    with col2:
+        st.markdown(f"**Price: Rs {p['price']} | Rating: {format_rating(p.get('avg_rating'))}**")
+        desc = parse_description(p.get("description", ""))
+        st.markdown("**Detailed Specifications:**")
+        html_desc = "".join([f"<li>{line}</li>" for line in desc[:10]])
+        st.markdown(f'<div class="desc-box"><ul>{html_desc}</ul></div>', unsafe_allow_html=True)
+    if msg.get("similar"):
+        st.markdown("**Similar items**")
+        if not expanded:
+            render_results_summary(msg["similar"])
+            return
+        cols = st.columns(4)
+        for s_idx, item in enumerate(msg["similar"]):
+            with cols[s_idx % 4]:
+                render_card(item, s_idx, msg["id"])
+
+
+def show_more(msg):
+    """Appends the next page of a search to its message; reuses the search's cursor, no LLM calls."""
+    with timing.trace("show_more") as request_trace:
+        with st.spinner("Finding more..."):
+            more = fetch_more(msg["cursor"], SHOW_MORE_COUNT)
+    st.session_state.last_timings = {"total_ms": request_trace.total_ms, "spans": request_trace.spans}
+    if more:
+        msg["results"] = msg["results"] + more
+        st.session_state.last_results = msg["results"]
+    else:
+        st.toast("That's everything that matches.")
+    if hasattr(st, "fragment"):
+        st.rerun(scope="fragment")   # only this message's grid changed
+    st.rerun()
+
+
 st.title("AI Fashion Assistant")
 
 if "messages" not in st.session_state:
-    st.session_state.messages = [
+    st.session_state.messages = []
+    st.session_state.next_message_id = 0
+    add_message(
         {
             "role": "assistant",
             "content": "Welcome back. Looking for something specific?",
             "results": [],
             "type": "chat",
         }
-    ]
+    )
 
 if "pending_clarification" not in st.session_state:
     st.session_state.pending_clarification = None
 
-for m_idx, msg in enumerate(st.session_state.messages):
+# only the newest card grids are live widgets; older ones collapse to text summaries
+heavy = [m["id"] for m in st.session_state.messages if m.get("results") or m.get("similar")]
+expanded_ids = set(heavy[-CHAT_EXPANDED_RESULTS:]) if CHAT_EXPANDED_RESULTS > 0 else set()
+
+for msg in st.session_state.messages:
+    expanded = msg["id"] in expanded_ids
+    if not expanded:
+        msg.pop("cursor", None)   # no "show more" on collapsed grids, so let the embedding go
     with st.chat_message(msg["role"]):
         st.markdown(msg["content"])
 
         if msg.get("results"):
-            cols = st.columns(4)
-            for p_idx, item in enumerate(msg["results"]):
-                with cols[p_idx % 4]:
-                    render_card(item, p_idx, m_idx)
+            if expanded:
+                render_results(msg)
+            else:
+                render_results_summary(msg["results"])
 
         if msg.get("type") == "details":
-            p = msg["product_data"]
-            col1, col2 = st.columns([1, 2])
-            with col1:
-                st.image(p.get("image") or p.get("img"), use_container_width=True)
-                if st.button("Add to Bag", key=f"det_cart_{m_idx}", type="primary", use_container_width=True):
-                    st.success("Added to bag.")
-            with col2:
-                st.markdown(f"**Price: Rs {p['price']} | Rating: {format_rating(p.get('avg_rating'))}**")
-                desc = parse_description(p.get("description", ""))
-                st.markdown("**Detailed Specifications:**")
-                html_desc = "".join([f"<li>{line}</li>" for line in desc[:10]])
-                st.markdown(f'<div class="desc-box"><ul>{html_desc}</ul></div>', unsafe_allow_html=True)
+            render_details(msg, expanded)
 
 
 if prompt := st.chat_input("Search for styles or ask for '1st one details'"):
     st.chat_message("user").markdown(prompt)
-    st.session_state.messages.append({"role": "user", "content": prompt, "results": [], "type": "chat"})
+    add_message({"role": "user", "content": prompt, "results": [], "type": "chat"})
 
     lower_prompt = prompt.lower()
     ordinal_map = {"first": 0, "1st": 0, "second": 1, "2nd": 1, "third": 2, "3rd": 2, "fourth": 3, "4th": 3}
@@ -301,18 +453,19 @@ if prompt := st.chat_input("Search for styles or ask for '1st one details'"):
             if key in lower_prompt and idx < len(st.session_state.last_results):
                 product = st.session_state.last_results[idx]
                 resolved = True
-                st.session_state.messages.append(
+                add_message(
                     {
                         "role": "assistant",
                         "content": f"### Product details: {product['brand']}\n{product['name']}",
                         "type": "details",
                         "product_data": product,
+                        "similar": get_similar_products(product["product_id"], SIMILAR_COUNT),
                     }
                 )
                 st.rerun()
 
     if not resolved:
-        with st.chat_message("assistant"):
+        with st.chat_message("assistant"), timing.trace("request") as request_trace:
             pending = st.session_state.get("pending_clarification")
             if pending:
                 answers = pending.get("answers", [])
@@ -326,12 +479,12 @@ if prompt := st.chat_input("Search for styles or ask for '1st one details'"):
                     st.session_state.pending_clarification = None
                     ack_msg = "Thanks, that helps. Searching with those preferences now."
                     st.markdown(ack_msg)
-                    st.session_state.messages.append(
+                    add_message(
                         {"role": "assistant", "content": ack_msg, "results": [], "type": "chat"}
                     )
                     run_search_and_render(refined_query)
                 else:
-                    follow_up = get_clarification_plan(refined_query)
+                    follow_up = understand_query(refined_query)
                     if follow_up.get("needs_clarification") and rounds < 2 and follow_up.get("questions"):
                         questions = follow_up.get("questions", [])[:3]
                         clarification_msg = format_clarification_message(questions, follow_up.get("reason", ""))
@@ -341,39 +494,44 @@ if prompt := st.chat_input("Search for styles or ask for '1st one details'"):
                             "answers": answers,
                             "rounds": rounds + 1,
                         }
-                        st.session_state.messages.append(
+                        add_message(
                             {"role": "assistant", "content": clarification_msg, "results": [], "type": "chat"}
                         )
                     else:
                         st.session_state.pending_clarification = None
                         ack_msg = "Thanks, that helps. Searching with those preferences now."
                         st.markdown(ack_msg)
-                        st.session_state.messages.append(
+                        add_message(
                             {"role": "assistant", "content": ack_msg, "results": [], "type": "chat"}
                         )
-                        run_search_and_render(refined_query)
+                        run_search_and_render(refined_query, follow_up)
             else:
-                route = get_router_decision(prompt)
+                # well-formed searches are understood locally, no LLM round trip
+                with timing.span("app.route") as route_span:
+                    understanding = fast_understanding(prompt)
+                    route_span["fast_path"] = understanding is not None
+                    understanding = understanding or understand_query(prompt)
+                route = understanding["route"]
                 if route == "PERSONAL":
                     refusal_msg = (
                         "I can help with fashion and styling only.\n\n"
                         "If you want outfit ideas, colors, or shopping help, tell me what you need."
                     )
                     st.markdown(refusal_msg)
-                    st.session_state.messages.append(
+                    add_message(
                         {"role": "assistant", "content": refusal_msg, "results": [], "type": "chat"}
                     )
                 elif route == "CHAT":
-                    response = generate_chat_response(prompt, st.session_state.messages)
-                    st.markdown(response)
-                    st.session_state.messages.append(
+                    # render tokens as they arrive; write_stream returns the full text
+                    response = st.write_stream(stream_chat_response(prompt, st.session_state.messages))
+                    add_message(
                         {"role": "assistant", "content": response, "results": [], "type": "chat"}
                     )
                 else:
                     if has_enough_search_context(prompt):
-                        run_search_and_render(prompt)
+                        run_search_and_render(prompt, understanding)
                     else:
-                        clarification = get_clarification_plan(prompt)
+                        clarification = understanding
                         if clarification.get("needs_clarification") and clarification.get("questions"):
                             clarification_msg = format_clarification_message(
                                 clarification.get("questions", []), clarification.get("reason", "")
@@ -384,8 +542,11 @@ if prompt := st.chat_input("Search for styles or ask for '1st one details'"):
                                 "answers": [],
                                 "rounds": 1,
                             }
-                            st.session_state.messages.append(
+                            add_message(
                                 {"role": "assistant", "content": clarification_msg, "results": [], "type": "chat"}
                             )
                         else:
-                            run_search_and_render(prompt)
+                            run_search_and_render(prompt, understanding)
+        st.session_state.last_timings = {"total_ms": request_trace.total_ms, "spans": request_trace.spans}
+
+render_timing_panel()
@@ -0,0 +1,88 @@
+# benchmarks/ann_recall.py
+"""
+Speedup and recall@k of the ANN index against exact search.
+
+Uses stored product embeddings as queries, so it needs no model or LLM:
+
+    python -m benchmarks.ann_recall --queries 100 --top-k 8
+"""
+import argparse
+import json
+import statistics
+import time
+
+from db import connect
+from timing import percentile
+from vector_index import RECALL_MODES, apply_recall_mode
+
+SEARCH_SQL = """
+    SELECT product_id FROM myntra_products
+    ORDER BY embedding <=> %s::vector LIMIT %s;
+"""
+
+
+def sample_queries(cur, n: int) -> list:
+    cur.execute("SELECT embedding::text FROM myntra_products ORDER BY random() LIMIT %s;", (n,))
+    return [r[0] for r in cur.fetchall()]
+
+
+def run_mode(conn, mode: str, queries: list, top_k: int):
+    latencies, results = [], []
+    with conn.cursor() as cur:
+        for q in queries:
+            started = time.perf_counter()
+            apply_recall_mode(cur, mode, top_k)
+            cur.execute(SEARCH_SQL, (q, top_k))
+            ids = [r[0] for r in cur.fetchall()]
+            latencies.append((time.perf_counter() - started) * 1000)
+            conn.rollback()   # ends the transaction, resetting SET LOCAL
+            results.append(ids)
+    return latencies, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=8)
+    parser.add_argument("--modes", default="fast,balanced,accurate")
+    parser.add_argument("--json", action="store_true", help="print machine-readable output")
+    args = parser.parse_args()
+
+    conn = connect()
+    with conn.cursor() as cur:
+        queries = sample_queries(cur, args.queries)
+    conn.rollback()
+
+    exact_lat, exact_ids = run_mode(conn, "exact", queries, args.top_k)
+    report = {"queries": len(queries), "top_k": args.top_k, "modes": {}}
+    report["modes"]["exact"] = {
+        "p50_ms": statistics.median(exact_lat), "p95_ms": percentile(exact_lat, 95), "recall": 1.0, "speedup": 1.0
+    }
+
+    for mode in [m.strip() for m in args.modes.split(",") if m.strip()]:
+        if mode not in RECALL_MODES:
+            raise SystemExit(f"Unknown mode: {mode}")
+        lat, ids = run_mode(conn, mode, queries, args.top_k)
+        recall = statistics.mean(
+            len(set(a) & set(e)) / max(len(e), 1) for a, e in zip(ids, exact_ids)
+        )
+        report["modes"][mode] = {
+            "p50_ms": statistics.median(lat),
+            "p95_ms": percentile(lat, 95),
+            "recall": recall,
+            "speedup": statistics.median(exact_lat) / max(statistics.median(lat), 1e-9),
+        }
+    conn.close()
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"{len(queries)} queries, recall@{args.top_k} vs exact search")
+    print(f"{'mode':<10}{'p50 ms':>10}{'p95 ms':>10}{'recall':>10}{'speedup':>10}")
+    for mode, r in report["modes"].items():
+        print(f"{mode:<10}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['recall']:>10.3f}{r['speedup']:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+# benchmarks/cascade_latency.py
+"""
+Latency of the single-statement search cascade against the old one-query-per-tier
+cascade, for the best case (strict tier hits) and the worst case (every tier is
+empty, so the old code paid four scans and four round trips).
+
+Uses stored product embeddings as query vectors, so it needs no model or LLM:
+
+    python -m benchmarks.cascade_latency --queries 50 --top-k 8
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+
+# search imports llm_client, whose Groq client refuses to start without a key
+os.environ.setdefault("GROQ_API_KEY", "benchmark")
+
+from db import PooledConnection, connect, execute_prepared
+from search import CASCADE_PARAM_TYPES, build_cascade_sql, cascade_params
+from timing import percentile
+
+# the pre-cascade queries, one per tier, exactly as search_products used to send them
+LEGACY_TIERS = [
+    ("strict", """
+        SELECT product_id, 1 - (embedding <=> %(q)s::vector) AS similarity,
+        (CASE WHEN LOWER(name) LIKE ANY(%(like)s) OR LOWER(description) LIKE ANY(%(like)s) THEN 1 ELSE 0 END)
+        FROM myntra_products WHERE colour = ANY(%(colours)s) AND price <= %(max_price)s
+        ORDER BY embedding <=> %(q)s::vector LIMIT %(k)s;
+    """),
+    ("category", """
+        SELECT product_id, 1 - (embedding <=> %(q)s::vector) AS similarity,
+        (CASE WHEN LOWER(name) LIKE ANY(%(like)s) OR LOWER(description) LIKE ANY(%(like)s) THEN 1 ELSE 0 END)
+        FROM myntra_products WHERE price <= %(max_price)s
+        ORDER BY embedding <=> %(q)s::vector LIMIT %(k)s;
+    """),
+    ("colour", """
+        SELECT product_id, 1 - (embedding <=> %(q)s::vector) AS similarity, 0
+        FROM myntra_products WHERE colour = ANY(%(colours)s) AND price <= %(max_price)s
+        ORDER BY embedding <=> %(q)s::vector LIMIT %(k)s;
+    """),
+    ("fallback", """
+        SELECT product_id, 1 - (embedding <=> %(q)s::vector) AS similarity, 0
+        FROM myntra_products WHERE price <= %(max_price)s
+        ORDER BY embedding <=> %(q)s::vector LIMIT %(k)s;
+    """),
+]
+
+SCENARIOS = {
+    # a real colour and no price cap: the first tiers answer
+    "best_case": {"max_price": 10 ** 9},
+    # a price cap nothing satisfies: every tier runs and comes back empty
+    "worst_case": {"max_price": 0},
+}
+
+
+def run_legacy(cur, q: str, colours: list, like: list, max_price: int, k: int) -> list:
+    params = {"q": q, "colours": colours, "like": like, "max_price": max_price, "k": k}
+    for _, sql in LEGACY_TIERS:
+        cur.execute(sql, params)
+        rows = cur.fetchall()
+        if rows:
+            return rows
+    return []
+
+
+def run_cascade(cur, q: str, colours: list, category: str, max_price: int, k: int) -> list:
+    filters = {
+        "colour_family": None, "colour_values": colours, "category": category, "name_patterns": [],
+        "max_price": max_price, "min_price": None,
+    }
+    execute_prepared(
+        cur, "bench_cascade", build_cascade_sql("values", "column"),
+        cascade_params(q.strip("[]").split(","), filters, k), CASCADE_PARAM_TYPES
+    )
+    return cur.fetchall()
+
+
+def timed(fn, *args) -> float:
+    started = time.perf_counter()
+    fn(*args)
+    return (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=8)
+    parser.add_argument("--category", default="saree", help="category (a CATEGORY_ALIAS_MAP key)")
+    parser.add_argument("--json", action="store_true", help="print machine-readable output")
+    args = parser.parse_args()
+
+    # same connection class the pool uses: autocommit, tracks its prepared statements
+    conn = connect(connection_factory=PooledConnection)
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT embedding::text, colour FROM myntra_products
+        WHERE COALESCE(colour, '') <> '' ORDER BY random() LIMIT %s;
+    """, (args.queries,))
+    samples = cur.fetchall()
+    like = [f"%{args.category}%"]
+
+    report = {"queries": len(samples), "top_k": args.top_k, "scenarios": {}}
+    for scenario, opts in SCENARIOS.items():
+        legacy, cascade = [], []
+        for q, colour in samples:
+            legacy.append(timed(run_legacy, cur, q, [colour], like, opts["max_price"], args.top_k))
+            cascade.append(timed(run_cascade, cur, q, [colour], args.category, opts["max_price"], args.top_k))
+        report["scenarios"][scenario] = {
+            "legacy_p50_ms": statistics.median(legacy),
+            "legacy_p95_ms": percentile(legacy, 95),
+            "cascade_p50_ms": statistics.median(cascade),
+            "cascade_p95_ms": percentile(cascade, 95),
+            "p50_reduction_pct": 100 * (1 - statistics.median(cascade) / max(statistics.median(legacy), 1e-9)),
+        }
+    cur.close()
+    conn.close()
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"{len(samples)} queries, top_k={args.top_k}")
+    print(f"{'scenario':<12}{'legacy p50':>12}{'legacy p95':>12}{'single p50':>12}{'single p95':>12}{'p50 saved':>11}")
+    for scenario, r in report["scenarios"].items():
+        print(f"{scenario:<12}{r['legacy_p50_ms']:>12.2f}{r['legacy_p95_ms']:>12.2f}"
+              f"{r['cascade_p50_ms']:>12.2f}{r['cascade_p95_ms']:>12.2f}{r['p50_reduction_pct']:>10.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+# benchmarks/fake_llm_server.py
+"""
+Local stand-in for the Groq chat completions API, with tunable latency and
+failures, for exercising llm_client's deadlines, retries, breaker and hedging:
+
+    python -m benchmarks.fake_llm_server --port 8099 --latency 0.2 --slow-rate 0.05 --error-rate 0.1
+    GROQ_BASE_URL=http://127.0.0.1:8099 GROQ_API_KEY=fake streamlit run app.py
+
+JSON-mode requests get `--json-reply`, others `--reply`; streamed requests are
+sent word by word as server-sent events.
+"""
+import argparse
+import json
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+COMPLETIONS_PATH = "/openai/v1/chat/completions"
+
+
+def completion(model: str, content: str) -> dict:
+    return {
+        "id": "chatcmpl-fake",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+    }
+
+
+def chunk(model: str, delta: dict, finish_reason=None) -> dict:
+    return {
+        "id": "chatcmpl-fake",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+
+
+def make_handler(args):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *_):
+            pass
+
+        def _send_json(self, status: int, body: dict):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            if self.path != COMPLETIONS_PATH:
+                self._send_json(404, {"error": {"message": "not found"}})
+                return
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            model = request.get("model", "fake")
+
+            roll = random.random()
+            if roll < args.error_rate:
+                self._send_json(503, {"error": {"message": "fake upstream error", "type": "server_error"}})
+                return
+            delay = args.latency + random.uniform(0, args.jitter)
+            if roll < args.error_rate + args.slow_rate:
+                delay += args.slow_delay
+            time.sleep(delay)
+
+            json_mode = (request.get("response_format") or {}).get("type") == "json_object"
+            content = args.json_reply if json_mode else args.reply
+            if not request.get("stream"):
+                self._send_json(200, completion(model, content))
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.end_headers()
+            events = [chunk(model, {"role": "assistant", "content": ""})]
+            words = content.split(" ")
+            events += [chunk(model, {"content": w if i == 0 else " " + w}) for i, w in enumerate(words)]
+            events.append(chunk(model, {}, finish_reason="stop"))
+            for event in events:
+                self.wfile.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+                time.sleep(args.token_delay)
+            self.wfile.write(b"data: [DONE]\n\n")
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency", type=float, default=0.1, help="base seconds before answering")
+    parser.add_argument("--jitter", type=float, default=0.05, help="extra uniform random seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with 503")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="share of requests delayed by --slow-delay")
+    parser.add_argument("--slow-delay", type=float, default=5.0)
+    parser.add_argument("--token-delay", type=float, default=0.02, help="seconds between streamed chunks")
+    parser.add_argument("--reply", default="Sure! Tell me the colour, occasion and budget you have in mind.")
+    parser.add_argument("--json-reply", default=json.dumps({
+        "route": "SEARCH", "intent": {}, "rewritten_query": "", "needs_clarification": False, "questions": []
+    }))
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(args))
+    print(f"Fake LLM server on http://{args.host}:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+# benchmarks/quantization.py
+"""
+Index size, latency and recall@k of quantized ANN indexes (coarse search plus
+exact rerank, as search_products runs it) against exact search.
+
+Builds one temporary index per quantization next to the production index, so run
+it off-peak; the indexes are dropped afterwards unless --keep is given:
+
+    python -m benchmarks.quantization --queries 100 --top-k 8 --index hnsw
+"""
+import argparse
+import json
+import statistics
+import time
+
+from db import connect
+from vector_index import (
+    EMBEDDING_DIM,
+    INDEX_MAINTENANCE_WORK_MEM,
+    QUANTIZATIONS,
+    apply_recall_mode,
+    coarse_distance_sql,
+    index_definition,
+    rerank_candidates,
+)
+from benchmarks.ann_recall import run_mode, sample_queries
+from timing import percentile
+
+RERANK_SQL = """
+    SELECT product_id FROM (
+        SELECT product_id, embedding FROM myntra_products
+        ORDER BY {coarse_distance} LIMIT %s
+    ) candidates
+    ORDER BY embedding <=> %s::vector LIMIT %s;
+"""
+
+ROW_SIZES_SQL = f"""
+    SELECT avg(pg_column_size(embedding)),
+           avg(pg_column_size(embedding::halfvec({EMBEDDING_DIM}))),
+           avg(pg_column_size(binary_quantize(embedding)::bit({EMBEDDING_DIM}))),
+           count(*)
+    FROM myntra_products;
+"""
+
+
+def bench_index_name(quantization: str) -> str:
+    return f"myntra_products_embedding_{quantization}_bench"
+
+
+def build_bench_index(conn, kind: str, quantization: str, row_count: int) -> float:
+    """Builds the benchmark index and returns its size in MB."""
+    name = bench_index_name(quantization)
+    with conn.cursor() as cur:
+        cur.execute("SELECT set_config('maintenance_work_mem', %s, false);", (INDEX_MAINTENANCE_WORK_MEM,))
+        cur.execute(f"DROP INDEX IF EXISTS {name};")
+        cur.execute(
+            f"CREATE INDEX {name} ON myntra_products "
+            f"{index_definition(kind, row_count, quantization=quantization)};"
+        )
+        cur.execute("SELECT pg_relation_size(%s::regclass);", (name,))
+        size = cur.fetchone()[0]
+    conn.commit()
+    return size / 1024 / 1024
+
+
+def run_quantized(conn, quantization: str, mode: str, queries: list, top_k: int):
+    sql = RERANK_SQL.format(coarse_distance=coarse_distance_sql(quantization, param="%s"))
+    candidates = rerank_candidates(top_k, quantization)
+    latencies, results = [], []
+    with conn.cursor() as cur:
+        for q in queries:
+            started = time.perf_counter()
+            apply_recall_mode(cur, mode, candidates)
+            cur.execute(sql, (q, candidates, q, top_k))
+            ids = [r[0] for r in cur.fetchall()]
+            latencies.append((time.perf_counter() - started) * 1000)
+            conn.rollback()
+            results.append(ids)
+    return latencies, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=8)
+    parser.add_argument("--index", choices=("hnsw", "ivfflat"), default="hnsw")
+    parser.add_argument("--mode", default="balanced", help="recall mode used for the coarse search")
+    parser.add_argument("--quantizations", default=",".join(QUANTIZATIONS))
+    parser.add_argument("--keep", action="store_true", help="keep the benchmark indexes")
+    parser.add_argument("--json", action="store_true", help="print machine-readable output")
+    args = parser.parse_args()
+
+    conn = connect()
+    with conn.cursor() as cur:
+        queries = sample_queries(cur, args.queries)
+        cur.execute(ROW_SIZES_SQL)
+        vector_bytes, halfvec_bytes, bit_bytes, row_count = cur.fetchone()
+    conn.rollback()
+
+    exact_lat, exact_ids = run_mode(conn, "exact", queries, args.top_k)
+    report = {
+        "queries": len(queries), "top_k": args.top_k, "rows": row_count, "index": args.index,
+        "bytes_per_row": {"none": float(vector_bytes or 0), "halfvec": float(halfvec_bytes or 0),
+                          "binary": float(bit_bytes or 0)},
+        "exact_p50_ms": statistics.median(exact_lat),
+        "quantizations": {},
+    }
+
+    built = []
+    try:
+        for quantization in [q.strip() for q in args.quantizations.split(",") if q.strip()]:
+            if quantization not in QUANTIZATIONS:
+                raise SystemExit(f"Unknown quantization: {quantization}")
+            size_mb = build_bench_index(conn, args.index, quantization, row_count)
+            built.append(quantization)
+            lat, ids = run_quantized(conn, quantization, args.mode, queries, args.top_k)
+            report["quantizations"][quantization] = {
+                "index_mb": size_mb,
+                "candidates": rerank_candidates(args.top_k, quantization),
+                "p50_ms": statistics.median(lat),
+                "p95_ms": percentile(lat, 95),
+                "recall": statistics.mean(
+                    len(set(a) & set(e)) / max(len(e), 1) for a, e in zip(ids, exact_ids)
+                ),
+            }
+    finally:
+        if not args.keep:
+            with conn.cursor() as cur:
+                for quantization in built:
+                    cur.execute(f"DROP INDEX IF EXISTS {bench_index_name(quantization)};")
+            conn.commit()
+        conn.close()
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"{row_count} rows, {len(queries)} queries, {args.index} index, recall@{args.top_k} vs exact search "
+          f"(exact p50 {report['exact_p50_ms']:.2f} ms)")
+    print(f"{'quantization':<14}{'bytes/row':>10}{'index MB':>10}{'cands':>7}{'p50 ms':>9}{'p95 ms':>9}{'recall':>9}")
+    for quantization, r in report["quantizations"].items():
+        print(f"{quantization:<14}{report['bytes_per_row'][quantization]:>10.0f}{r['index_mb']:>10.1f}"
+              f"{r['candidates']:>7}{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}{r['recall']:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+# benchmarks/search_pipeline.py
+"""
+End-to-end search_products benchmark on a synthetic catalog, fully offline.
+
+Loads a generated catalog into a separate local database (default
+"search_bench"; the app's database is never touched), replaces llm_client's
+_safe_call with a deterministic fake and the sentence encoder with a hashed
+bag-of-words encoder, then replays a query corpus at every combination of
+catalog size, top_k, concurrency and backend:
+
+    python -m benchmarks.search_pipeline --catalog-sizes 2000,20000 --concurrency 1,4,16 \\
+        --top-k 6,24 --requests 400 --output bench.json
+
+The JSON report (stdout with --json, or --output) has throughput, latency
+percentiles and the share of requests answered by each cascade tier per run.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import statistics
+import sys
+import tempfile
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+
+def parse_list(value: str, cast=int) -> list:
+    return [cast(v.strip()) for v in value.split(",") if v.strip()]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dbname", default=os.getenv("BENCH_DB_NAME", "search_bench"),
+                        help="database the synthetic catalog is loaded into (created if missing)")
+    parser.add_argument("--catalog-sizes", default="2000,20000")
+    parser.add_argument("--top-k", default="6")
+    parser.add_argument("--concurrency", default="1,4,16")
+    parser.add_argument("--backends", default="postgres", help="postgres and/or memory")
+    parser.add_argument("--requests", type=int, default=200, help="requests per run")
+    parser.add_argument("--queries-file", help="one query per line (default: generated corpus)")
+    parser.add_argument("--index", default="hnsw", choices=("hnsw", "ivfflat", "none"))
+    parser.add_argument("--recall-mode", default=None)
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="simulated LLM latency per call")
+    parser.add_argument("--cold", action="store_true", help="clear the query embedding cache before each run")
+    parser.add_argument("--result-cache", action="store_true",
+                        help="keep the shared result cache on (off by default so every request searches)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="write the JSON report to this file")
+    parser.add_argument("--json", action="store_true", help="print the JSON report instead of a table")
+    return parser.parse_args()
+
+
+args = parse_args() if __name__ == "__main__" else None
+
+if args is not None:
+    # must be set before db / search read their configuration at import time
+    os.environ["DB_NAME"] = args.dbname
+    os.environ["DB_POOL_MAX"] = str(max(parse_list(args.concurrency)) + 2)
+    os.environ.setdefault("GROQ_API_KEY", "benchmark")
+    os.environ["LLM_CACHE"] = "0"
+    if not args.result_cache:
+        os.environ["RESULT_CACHE_SIZE"] = "0"
+
+import numpy as np
+
+import db
+import ingest
+import llm_client
+import memory_backend
+import search
+import timing
+import vector_index
+from embedding_cache import EmbeddingCache
+from intent_rules import parse_intent
+from taxonomy import CATEGORY_ALIAS_MAP, COLOR_FAMILY_MAP
+
+DIM = vector_index.EMBEDDING_DIM
+
+AUDIENCES = ["Women", "Men", "Girls", "Boys"]
+FABRICS = ["Cotton", "Silk", "Linen", "Georgette", "Denim", "Chiffon", "Rayon", "Polyester"]
+OCCASIONS = ["party", "office", "wedding", "casual", "festive"]
+COLOURS = sorted({c for members in COLOR_FAMILY_MAP.values() for c in members} | {"yellow", "beige", "brown"})
+BRANDS = ["Libas", "Biba", "W", "Roadster", "HERE&NOW", "Sangria", "Anouk", "Mitera"]
+
+
+# ---- deterministic stand-ins for the model and the LLM ----
+
+_token_vectors = {}
+
+
+def fake_encode(text: str) -> np.ndarray:
+    """Hashed bag of words: shared words make vectors similar, like a (very) small encoder."""
+    vec = np.zeros(DIM, dtype=np.float32)
+    for token in re.findall(r"[a-z0-9]+", text.lower()):
+        tv = _token_vectors.get(token)
+        if tv is None:
+            rng = np.random.default_rng(zlib.crc32(token.encode("utf-8")))
+            tv = _token_vectors[token] = rng.standard_normal(DIM).astype(np.float32)
+        vec += tv
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else vec
+
+
+def make_fake_safe_call(latency_ms: float):
+    """Answers extract_intent / understand_query / rewrite_query from intent_rules, after `latency_ms`."""
+    def fake_safe_call(messages, max_tokens=200, temp=0.0, json_mode=False):
+        if latency_ms:
+            time.sleep(latency_ms / 1000)
+        query = messages[-1]["content"]
+        parsed = parse_intent(query)
+        if json_mode:
+            return json.dumps({"route": "SEARCH", **parsed["intent"], "intent": parsed["intent"],
+                               "rewritten_query": parsed["rewritten_query"], "needs_clarification": False,
+                               "questions": []})
+        return parsed["rewritten_query"] or query
+    return fake_safe_call
+
+
+# ---- synthetic catalog and queries ----
+
+def synthetic_rows(n: int, rng: random.Random):
+    """Rows in the CSV shape ingest.to_db_row expects."""
+    for i in range(n):
+        category = rng.choice(list(CATEGORY_ALIAS_MAP))
+        garment = rng.choice(CATEGORY_ALIAS_MAP[category][:3])
+        colour = rng.choice(COLOURS)
+        name = f"{rng.choice(AUDIENCES)} {colour.title()} {rng.choice(FABRICS)} {garment.title()}"
+        yield {
+            "p_id": str(100000 + i),
+            "name": name,
+            "price": int(min(20000, max(199, rng.lognormvariate(7.0, 0.6)))),
+            "colour": colour,
+            "brand": rng.choice(BRANDS),
+            "img": f"https://example.invalid/{i}.jpg",
+            "ratingCount": rng.randint(0, 2000),
+            "avg_rating": round(rng.uniform(2.5, 5.0), 1),
+            "description": f"{name} for {rng.choice(OCCASIONS)} wear.",
+            "p_attributes": "{}",
+        }
+
+
+def generated_queries(rng: random.Random, n: int = 200) -> list:
+    """Mix of fully specified, partial and vague queries so every tier gets traffic."""
+    queries = []
+    for _ in range(n):
+        colour = rng.choice(list(COLOR_FAMILY_MAP) + COLOURS)
+        garment = rng.choice([a for aliases in CATEGORY_ALIAS_MAP.values() for a in aliases[:3]])
+        shape = rng.random()
+        if shape < 0.4:
+            queries.append(f"{colour} {garment} under {rng.choice([500, 1000, 2000, 5000])}")
+        elif shape < 0.6:
+            queries.append(f"{garment} for {rng.choice(OCCASIONS)}")
+        elif shape < 0.75:
+            queries.append(f"something {colour} for a {rng.choice(OCCASIONS)}")
+        elif shape < 0.9:
+            # a budget nothing meets forces the later tiers
+            queries.append(f"{colour} {garment} under 100")
+        else:
+            queries.append(f"{rng.choice(FABRICS).lower()} {garment}")
+    return queries
+
+
+def ensure_database(dbname: str):
+    conn = db.connect(dbname="postgres")
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute("SELECT 1 FROM pg_database WHERE datname = %s;", (dbname,))
+        if cur.fetchone() is None:
+            cur.execute(f'CREATE DATABASE "{dbname}";')
+    conn.close()
+
+
+def load_catalog(size: int, index: str, seed: int) -> float:
+    """(Re)creates myntra_products in the bench database; returns seconds spent."""
+    started = time.perf_counter()
+    conn = db.connect()
+    with conn.cursor() as cur:
+        cur.execute("CREATE EXTENSION IF NOT EXISTS vector;")
+        ingest.create_table(cur)
+        batch = []
+        for row in synthetic_rows(size, random.Random(seed)):
+            text = ingest.embedding_text(row)
+            batch.append(ingest.to_db_row(row, fake_encode(text), ingest.text_hash(text)))
+            if len(batch) >= 1000:
+                ingest.copy_rows(cur, batch)
+                batch = []
+        if batch:
+            ingest.copy_rows(cur, batch)
+        ingest.create_filter_indexes(cur)
+        cur.execute("ANALYZE myntra_products;")
+    conn.commit()
+    vector_index.build_index(conn, index)
+    conn.close()
+    return time.perf_counter() - started
+
+
+# ---- replay ----
+
+def timed_search(query: str, top_k: int, recall_mode):
+    with timing.trace("bench") as t:
+        search.search_products(query, top_k=top_k, recall_mode=recall_mode)
+    if any(s["name"] == "search.result_cache" and s.get("hit") for s in t.spans):
+        return t.total_ms, "cached"
+    tier = next((s.get("tier") for s in t.spans if s["name"].startswith("search.") and "tier" in s), None)
+    return t.total_ms, tier
+
+
+def run(queries: list, requests: int, concurrency: int, top_k: int, recall_mode) -> dict:
+    corpus = [queries[i % len(queries)] for i in range(requests)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(lambda q: timed_search(q, top_k, recall_mode), corpus))
+    elapsed = time.perf_counter() - started
+
+    latencies = [ms for ms, _ in outcomes]
+    tiers = {}
+    for _, tier in outcomes:
+        key = str(tier) if tier is not None else "empty"
+        tiers[key] = tiers.get(key, 0) + 1
+    return {
+        "requests": requests,
+        "throughput_rps": requests / elapsed if elapsed else 0.0,
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": timing.percentile(latencies, 95),
+        "p99_ms": timing.percentile(latencies, 99),
+        "max_ms": max(latencies),
+        "tier_hit_rate": {t: c / requests for t, c in sorted(tiers.items())},
+    }
+
+
+def main():
+    rng = random.Random(args.seed)
+    if args.queries_file:
+        with open(args.queries_file, encoding="utf-8") as f:
+            queries = [line.strip() for line in f if line.strip()]
+    else:
+        queries = generated_queries(rng)
+
+    llm_client._safe_call = make_fake_safe_call(args.llm_latency_ms)
+    search.query_embeddings = EmbeddingCache(fake_encode, max_entries=search.query_embeddings.max_entries)
+    ensure_database(args.dbname)
+
+    report = {
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "json")},
+        "queries": len(queries),
+        "runs": [],
+    }
+    snapshot_dir = tempfile.mkdtemp(prefix="bench_snapshot_")
+    for size in parse_list(args.catalog_sizes):
+        load_seconds = load_catalog(size, args.index, args.seed)
+        search.get_distinct_colours_from_db.cache_clear()
+        search.result_cache.clear()
+        backends = parse_list(args.backends, str)
+        if "memory" in backends:
+            memory_backend.build_snapshot(snapshot_dir)
+            memory_backend.reload_memory_index(snapshot_dir)
+
+        for backend in backends:
+            search.SEARCH_BACKEND = backend
+            for top_k in parse_list(args.top_k):
+                run(queries, min(len(queries), 50), 1, top_k, args.recall_mode)   # warm-up
+                for concurrency in parse_list(args.concurrency):
+                    if args.cold:
+                        search.query_embeddings.clear()
+                        search.result_cache.clear()
+                    result = run(queries, args.requests, concurrency, top_k, args.recall_mode)
+                    report["runs"].append({
+                        "catalog_size": size, "load_seconds": load_seconds, "backend": backend,
+                        "top_k": top_k, "concurrency": concurrency, **result,
+                    })
+    report["stages"] = timing.histograms.snapshot()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.json:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+        return
+
+    print(f"{len(queries)} distinct queries, {args.requests} requests per run, fake LLM "
+          f"({args.llm_latency_ms:.0f} ms), index={args.index}")
+    print(f"{'rows':>7}{'backend':>10}{'top_k':>6}{'conc':>6}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}"
+          f"{'p99 ms':>9}  tiers")
+    for r in report["runs"]:
+        tiers = " ".join(f"{t}:{share:.0%}" for t, share in r["tier_hit_rate"].items())
+        print(f"{r['catalog_size']:>7}{r['backend']:>10}{r['top_k']:>6}{r['concurrency']:>6}"
+              f"{r['throughput_rps']:>9.1f}{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}{r['p99_ms']:>9.2f}  {tiers}")
+
+
+if __name__ == "__main__":
+    main()
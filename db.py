@@ -0,0 +1,218 @@
+# db.py
+"""Postgres connection settings and the process-wide connection pool."""
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import errors, extensions, pool
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger("db")
+
+DB_NAME = os.getenv("DB_NAME", "testdb")
+DB_USER = os.getenv("DB_USER", "aaryagodbole")
+DB_PASS = os.getenv("DB_PASS", "")
+DB_HOST = os.getenv("DB_HOST", "localhost")
+DB_PORT = os.getenv("DB_PORT", "5432")
+DB_SSLMODE = os.getenv("DB_SSLMODE", "prefer")
+
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))                 # seconds to wait for a free connection
+DB_HEALTHCHECK_INTERVAL = float(os.getenv("DB_HEALTHCHECK_INTERVAL", "30"))  # re-ping connections idle longer than this
+
+# errors after which the connection is unusable and worth one retry on a fresh one
+RECONNECT_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError)
+
+
+def connect_kwargs(**overrides) -> dict:
+    kwargs = {
+        "dbname": DB_NAME,
+        "user": DB_USER,
+        "password": DB_PASS,
+        "host": DB_HOST,
+        "port": DB_PORT,
+        "sslmode": DB_SSLMODE,
+        # keep idle pooled connections alive through NATs / managed proxies
+        "keepalives": 1,
+        "keepalives_idle": 30,
+        "keepalives_interval": 10,
+        "keepalives_count": 3,
+    }
+    kwargs.update(overrides)
+    return kwargs
+
+
+def connect(**overrides):
+    """A standalone (unpooled) connection, for scripts like ingest.py."""
+    return psycopg2.connect(**connect_kwargs(**overrides))
+
+
+class PooledConnection(extensions.connection):
+    """Connection that remembers its prepared statements and last health check."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # reads need no explicit transaction; autocommit saves psycopg2's BEGIN round trip
+        self.autocommit = True
+        self.prepared = set()
+        self.last_checked = time.monotonic()
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool with blocking checkout, health checks on connections that sat
+    idle and one transparent retry when the server drops a connection mid-query.
+
+    Returned connections stay open (up to maxconn) and the most recently used one
+    is handed out first, so concurrent load keeps warm connections and their
+    prepared statements instead of reconnecting. `minconn` are opened up front.
+    """
+
+    def __init__(self, minconn: int = DB_POOL_MIN, maxconn: int = DB_POOL_MAX,
+                 timeout: float = DB_POOL_TIMEOUT, healthcheck_interval: float = DB_HEALTHCHECK_INTERVAL,
+                 connect_fn=None, **overrides):
+        kwargs = connect_kwargs(**overrides)
+        self._connect = connect_fn or (lambda: psycopg2.connect(connection_factory=PooledConnection, **kwargs))
+        self._idle = []   # LIFO
+        self._lock = threading.Lock()
+        # at most maxconn checked out; callers wait for a slot instead of failing
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self.timeout = timeout
+        self.healthcheck_interval = healthcheck_interval
+        self.stats = {"connects": 0, "reuses": 0, "discarded": 0}
+        for _ in range(min(minconn, maxconn)):
+            self._idle.append(self._open())
+
+    def _open(self):
+        conn = self._connect()
+        with self._lock:
+            self.stats["connects"] += 1
+        return conn
+
+    def _is_healthy(self, conn) -> bool:
+        if conn.closed:
+            return False
+        if time.monotonic() - conn.last_checked < self.healthcheck_interval:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1;")
+            conn.rollback()
+        except psycopg2.Error:
+            return False
+        conn.last_checked = time.monotonic()
+        return True
+
+    def getconn(self):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise pool.PoolError(f"No database connection free after {self.timeout}s")
+        try:
+            while True:
+                with self._lock:
+                    conn = self._idle.pop() if self._idle else None
+                if conn is None:
+                    return self._open()
+                if self._is_healthy(conn):
+                    with self._lock:
+                        self.stats["reuses"] += 1
+                    return conn
+                logger.warning("Discarding stale pooled connection")
+                self._close(conn)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn, close: bool = False):
+        try:
+            if not close and not conn.closed and \
+                    conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()   # also resets any SET LOCAL
+            conn.last_checked = time.monotonic()
+        except psycopg2.Error:
+            close = True
+        finally:
+            if close or conn.closed:
+                self._close(conn)
+            else:
+                with self._lock:
+                    self._idle.append(conn)
+            self._slots.release()
+
+    def _close(self, conn):
+        with self._lock:
+            self.stats["discarded"] += 1
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    @contextmanager
+    def connection(self):
+        conn = self.getconn()
+        broken = False
+        try:
+            yield conn
+        except RECONNECT_ERRORS:
+            broken = True
+            raise
+        finally:
+            self.putconn(conn, close=broken)
+
+    def run(self, fn, retries: int = 1):
+        """Calls fn(conn) on a pooled connection, retrying on a fresh one if it was dropped."""
+        for attempt in range(retries + 1):
+            try:
+                with self.connection() as conn:
+                    return fn(conn)
+            except errors.QueryCanceled:
+                raise   # a statement timeout will not get faster on another connection
+            except RECONNECT_ERRORS as e:
+                if attempt >= retries:
+                    raise
+                logger.warning(f"Database connection lost ({e}), retrying")
+
+    def closeall(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """Lazily creates the pool shared by every session in this process."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool()
+    return _pool
+
+
+def execute_prepared(cur, name: str, sql: str, params: list, types: tuple = (),
+                     prefix: str = "", prefix_params: list = ()):
+    """
+    EXECUTEs a server-side prepared statement, PREPAREing it the first time this
+    connection sees it. `sql` uses $1..$n placeholders; `types` declares them.
+    `prefix` statements (e.g. SET LOCAL knobs) go out in the same message, and
+    therefore the same implicit transaction, as the EXECUTE.
+    """
+    conn = cur.connection
+    if name not in conn.prepared:
+        type_list = f" ({', '.join(types)})" if types else ""
+        cur.execute(f"PREPARE {name}{type_list} AS {sql}")
+        conn.prepared.add(name)
+    if params:
+        statement = f"EXECUTE {name} ({', '.join(['%s'] * len(params))});"
+    else:
+        statement = f"EXECUTE {name};"
+    cur.execute(prefix + statement, list(prefix_params) + list(params))
@@ -0,0 +1,119 @@
+# embedding_cache.py
+"""Bounded LRU cache of query embeddings with request coalescing."""
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import numpy as np
+
+
+def normalize_query(text: str) -> str:
+    """Case, whitespace and punctuation insensitive form used as the cache key."""
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    text = re.sub(r"(?<=\d),(?=\d)", "", text)        # "1,000" -> "1000"
+    text = re.sub(r"[^\w\s]", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class EmbeddingCache:
+    """
+    Maps normalized query text to a read-only float32 vector. Concurrent misses for
+    the same text wait on a single encode instead of each running the model.
+    """
+
+    def __init__(self, encode_fn, max_entries: int = 2048, encode_many_fn=None):
+        self._encode = encode_fn
+        self._encode_many = encode_many_fn    # list of texts -> one vector per text
+        self.max_entries = max_entries
+        self._entries = OrderedDict()   # normalized text -> np.ndarray
+        self._inflight = {}             # normalized text -> Future
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "evictions": 0}
+
+    def get(self, text: str) -> np.ndarray:
+        key = normalize_query(text)
+        with self._lock:
+            vec = self._entries.get(key)
+            if vec is not None:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return vec
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+                self.stats["misses"] += 1
+            else:
+                self.stats["coalesced"] += 1
+
+        if not owner:
+            return future.result()
+
+        return self._fill({key: future}, lambda keys: [self._encode(keys[0])])[key]
+
+    def get_many(self, texts: list) -> list:
+        """Like get() for several texts, with every miss encoded in one model call."""
+        keys = [normalize_query(t) for t in texts]
+        found, waiting, owned = {}, {}, {}
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                vec = self._entries.get(key)
+                if vec is not None:
+                    self._entries.move_to_end(key)
+                    self.stats["hits"] += 1
+                    found[key] = vec
+                elif key in self._inflight:
+                    self.stats["coalesced"] += 1
+                    waiting[key] = self._inflight[key]
+                else:
+                    self.stats["misses"] += 1
+                    owned[key] = self._inflight[key] = Future()
+
+        if owned:
+            encode_many = self._encode_many or (lambda keys: [self._encode(k) for k in keys])
+            found.update(self._fill(owned, encode_many))
+        for key, future in waiting.items():
+            found[key] = future.result()
+        return [found[key] for key in keys]
+
+    def _fill(self, owned: dict, encode_many) -> dict:
+        """Encodes the keys this caller registered as in flight and resolves their futures."""
+        try:
+            vecs = {}
+            for key, vec in zip(owned, encode_many(list(owned))):
+                vec = np.asarray(vec, dtype=np.float32)
+                vec.setflags(write=False)   # shared between requests
+                vecs[key] = vec
+        except BaseException as e:
+            with self._lock:
+                for key in owned:
+                    del self._inflight[key]
+            for future in owned.values():
+                future.set_exception(e)
+            raise
+
+        with self._lock:
+            for key, vec in vecs.items():
+                self._entries[key] = vec
+                del self._inflight[key]
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+        for key, future in owned.items():
+            future.set_result(vecs[key])
+        return vecs
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self._entries)
+            stats["bytes"] = sum(v.nbytes for v in self._entries.values())
+        lookups = stats["hits"] + stats["misses"] + stats["coalesced"]
+        stats["hit_rate"] = (stats["hits"] + stats["coalesced"]) / lookups if lookups else 0.0
+        return stats
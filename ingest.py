@@ -1,58 +1,84 @@
 # ingest.py
+import argparse
+import csv
+import hashlib
+import io
+import json
+import math
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+
 import pandas as pd
-import psycopg2
 from sentence_transformers import SentenceTransformer
 from dotenv import load_dotenv
-import os
 from tqdm import tqdm
 
+import db
+import memory_backend
+import neighbors
+import thumbnails
+import vector_index
+from result_cache import bump_catalog_version
+from taxonomy import colour_families, derive_category
+
 load_dotenv()
 
-DB_NAME = os.getenv("DB_NAME", "testdb")
-DB_USER = os.getenv("DB_USER", "aaryagodbole")
-DB_PASS = os.getenv("DB_PASS", "")
-DB_HOST = os.getenv("DB_HOST", "localhost")
-DB_PORT = os.getenv("DB_PORT", "5432")
+DB_SSLMODE = os.getenv("DB_SSLMODE", "require")
 
-CSV_FILE = "FashionDataset.csv"  
-SAMPLE_SIZE = 2000              
+CSV_FILE = os.getenv("INGEST_CSV_FILE", "FashionDataset.csv")
+SAMPLE_SIZE = int(os.getenv("INGEST_SAMPLE_SIZE", "0"))          # 0 = whole catalog
+BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "1000"))         # rows read, encoded and committed per chunk
+ENCODE_BATCH_SIZE = int(os.getenv("INGEST_ENCODE_BATCH_SIZE", "64"))
+WORKERS = int(os.getenv("INGEST_WORKERS", "1"))                  # encoder processes (1 = in-process)
+MAX_PENDING_CHUNKS = int(os.getenv("INGEST_MAX_PENDING_CHUNKS", "2"))  # chunks encoding ahead of the writer
 
+MODEL_NAME = "sentence-transformers/all-mpnet-base-v2"
 
-model = SentenceTransformer("sentence-transformers/all-mpnet-base-v2")
+REQUIRED_COLS = ["p_id", "name", "price", "colour", "brand", "img",
+                 "ratingCount", "avg_rating", "description", "p_attributes"]
 
+TABLE_COLUMNS = ["product_id", "name", "price", "colour", "brand", "img", "rating_count",
+                 "avg_rating", "description", "attributes", "category", "colour_family",
+                 "text_hash", "embedding"]
 
-df = pd.read_csv(CSV_FILE)
-df.columns = [c.strip() for c in df.columns]
-if SAMPLE_SIZE:
-    df = df.head(SAMPLE_SIZE)
+# columns compared to decide whether an unchanged-text row still needs an update
+SCALAR_COLUMNS = ["name", "price", "colour", "brand", "img", "rating_count",
+                  "avg_rating", "description", "attributes", "category", "colour_family"]
 
 
-required_cols = ["p_id", "name", "price", "colour", "brand", "img",
-                 "ratingCount", "avg_rating", "description", "p_attributes"]
-missing = [c for c in required_cols if c not in df.columns]
-if missing:
-    raise SystemExit(f"Missing columns in CSV: {missing}")
-
-# Connect to DB
-conn = psycopg2.connect(
-    dbname=DB_NAME,
-    user=DB_USER,
-    password=DB_PASS,
-    host=DB_HOST,
-    port=DB_PORT,
-    sslmode="require"   
-)
-
-cur = conn.cursor()
-
-
-cur.execute("CREATE EXTENSION IF NOT EXISTS vector;")
-conn.commit()
-
-# create table (clean start)
-cur.execute("DROP TABLE IF EXISTS myntra_products;")
-cur.execute("""
-CREATE TABLE myntra_products (
+def connect():
+    return db.connect(sslmode=DB_SSLMODE)
+
+
+def iter_catalog(path: str, chunk_size: int, sample_size: int = 0, skip_rows: int = 0):
+    """
+    Streams the CSV in chunks of `chunk_size` rows so memory stays flat however big
+    the file is. `skip_rows` data rows are skipped without being parsed into frames.
+    """
+    remaining = sample_size - skip_rows if sample_size else None
+    reader = pd.read_csv(
+        path,
+        chunksize=chunk_size,
+        skiprows=range(1, skip_rows + 1) if skip_rows else None,
+    )
+    for chunk in reader:
+        chunk.columns = [c.strip() for c in chunk.columns]
+        missing = [c for c in REQUIRED_COLS if c not in chunk.columns]
+        if missing:
+            raise SystemExit(f"Missing columns in CSV: {missing}")
+        if remaining is not None:
+            if remaining <= 0:
+                return
+            chunk = chunk.head(remaining)
+            remaining -= len(chunk)
+        yield chunk
+
+
+PRODUCTS_DDL = """
+CREATE TABLE {if_not_exists} myntra_products (
     product_id TEXT PRIMARY KEY,
     name TEXT,
     price INT,
@@ -63,44 +89,496 @@ CREATE TABLE myntra_products (
     avg_rating FLOAT,
     description TEXT,
     attributes TEXT,
-    embedding VECTOR(768)
+    category TEXT,
+    colour_family TEXT[],
+    text_hash TEXT,
+    embedding VECTOR(768),
+    search_tsv TSVECTOR {search_tsv}
 );
-""")
-conn.commit()
+"""
+
+# full-text side of the hybrid search; computed by Postgres as rows are written
+SEARCH_TSV_EXPRESSION = """GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', COALESCE(name, '') || ' ' || COALESCE(brand, '')), 'A') ||
+        setweight(to_tsvector('english', COALESCE(description, '')), 'B')
+    ) STORED"""
+
+# search filters on these with equality instead of LIKE scans over descriptions
+FILTER_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS myntra_products_category_idx ON myntra_products (category);",
+    "CREATE INDEX IF NOT EXISTS myntra_products_colour_idx ON myntra_products (colour);",
+    "CREATE INDEX IF NOT EXISTS myntra_products_colour_family_idx ON myntra_products USING gin (colour_family);",
+    "CREATE INDEX IF NOT EXISTS myntra_products_search_tsv_idx ON myntra_products USING gin (search_tsv);",
+]
+
+
+def create_table(cur):
+    """Drops and recreates myntra_products (clean start)."""
+    cur.execute("DROP TABLE IF EXISTS myntra_products;")
+    cur.execute(PRODUCTS_DDL.format(if_not_exists="", search_tsv=SEARCH_TSV_EXPRESSION))
+
+
+def ensure_table(cur):
+    """Creates myntra_products if needed without touching existing rows."""
+    cur.execute(PRODUCTS_DDL.format(if_not_exists="IF NOT EXISTS", search_tsv=SEARCH_TSV_EXPRESSION))
+    # tables created before hashes existed get re-embedded once
+    cur.execute("ALTER TABLE myntra_products ADD COLUMN IF NOT EXISTS text_hash TEXT;")
+    # and get their derived filter columns filled by the scalar upsert
+    cur.execute("ALTER TABLE myntra_products ADD COLUMN IF NOT EXISTS category TEXT;")
+    cur.execute("ALTER TABLE myntra_products ADD COLUMN IF NOT EXISTS colour_family TEXT[];")
+    # filled for existing rows by the ALTER itself
+    cur.execute(f"ALTER TABLE myntra_products ADD COLUMN IF NOT EXISTS search_tsv TSVECTOR {SEARCH_TSV_EXPRESSION};")
+
+
+def create_filter_indexes(cur):
+    for sql in FILTER_INDEXES:
+        cur.execute(sql)
+
+
+def create_work_tables(cur):
+    """Staging table (per session) plus the tables that make a run resumable."""
+    cur.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS myntra_products_stage
+        (LIKE myntra_products INCLUDING DEFAULTS) ON COMMIT DELETE ROWS;
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS ingest_checkpoints (
+            run_key TEXT PRIMARY KEY,
+            csv_path TEXT,
+            mode TEXT,
+            chunks_done INT NOT NULL DEFAULT 0,
+            rows_done BIGINT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+    """)
+    # product ids an incremental run has seen so far, kept across a crash
+    cur.execute("CREATE TABLE IF NOT EXISTS ingest_seen_products (product_id TEXT PRIMARY KEY);")
+
 
-# Insert with embeddings
-for _, row in tqdm(df.iterrows(), total=len(df)):
-    # build semantic text from name + description + attributes
-    text_for_embedding = " ".join([
+def run_key(path: str, mode: str, chunk_size: int, sample_size: int) -> str:
+    """Identifies a run; a checkpoint is only resumed for the same file and settings."""
+    st = os.stat(path)
+    raw = json.dumps([os.path.abspath(path), st.st_size, int(st.st_mtime), mode, chunk_size, sample_size])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+def load_checkpoint(cur, key: str):
+    cur.execute("SELECT chunks_done, rows_done FROM ingest_checkpoints WHERE run_key = %s;", (key,))
+    row = cur.fetchone()
+    return (row[0], row[1]) if row else (0, 0)
+
+
+def save_checkpoint(cur, key: str, path: str, mode: str, chunks_done: int, rows_done: int):
+    cur.execute("""
+        INSERT INTO ingest_checkpoints (run_key, csv_path, mode, chunks_done, rows_done, updated_at)
+        VALUES (%s, %s, %s, %s, %s, now())
+        ON CONFLICT (run_key) DO UPDATE SET
+            chunks_done = EXCLUDED.chunks_done, rows_done = EXCLUDED.rows_done, updated_at = now();
+    """, (key, path, mode, chunks_done, rows_done))
+
+
+def _clean(value):
+    return None if pd.isna(value) else value
+
+
+def embedding_text(row) -> str:
+    """Builds the semantic text from name + description + attributes."""
+    return " ".join([
         str(row.get("name", "")),
         str(row.get("description", "")),
         str(row.get("p_attributes", ""))
     ]).strip()
 
-    embedding = model.encode(text_for_embedding).tolist()
 
-    cur.execute("""
-        INSERT INTO myntra_products
-        (product_id, name, price, colour, brand, img, rating_count,
-        avg_rating, description, attributes, embedding)
-        VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
-        ON CONFLICT (product_id) DO NOTHING;
-    """, (
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def to_db_row(row, embedding, hash_value) -> list:
+    colour = str(row["colour"]).lower() if not pd.isna(row["colour"]) else None
+    return [
         str(row["p_id"]),
-        row["name"],
+        _clean(row["name"]),
         int(row["price"]) if not pd.isna(row["price"]) else None,
-        str(row["colour"]).lower() if not pd.isna(row["colour"]) else None,
-        row["brand"],
-        row["img"],
+        colour,
+        _clean(row["brand"]),
+        _clean(row["img"]),
         int(row["ratingCount"]) if not pd.isna(row["ratingCount"]) else 0,
         float(row["avg_rating"]) if not pd.isna(row["avg_rating"]) else 0.0,
-        row.get("description", ""),
-        row.get("p_attributes", ""),
-        embedding
-    ))
+        _clean(row.get("description", "")),
+        _clean(row.get("p_attributes", "")),
+        derive_category(_clean(row["name"]), _clean(row.get("description", ""))),
+        array_literal(colour_families(colour)),
+        hash_value,
+        vector_literal(embedding) if embedding is not None else None,
+    ]
+
+
+def vector_literal(embedding) -> str:
+    """pgvector text format, e.g. '[0.1,0.2,...]'."""
+    return "[" + ",".join(repr(float(x)) for x in embedding) + "]"
+
+
+def array_literal(values: list) -> str:
+    """Postgres text[] literal, e.g. '{"red","pink"}'."""
+    return "{" + ",".join('"' + v.replace('\\', '\\\\').replace('"', '\\"') + '"' for v in values) + "}"
+
+
+def copy_rows(cur, rows: list, table: str = "myntra_products"):
+    """Streams a batch of rows into the table with COPY ... FROM STDIN (CSV)."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for r in rows:
+        writer.writerow(["\\N" if v is None else v for v in r])
+    buf.seek(0)
+    cur.copy_expert(
+        f"COPY {table} ({', '.join(TABLE_COLUMNS)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+        buf
+    )
+
+
+def encode_texts(model, texts: list, encode_batch_size: int):
+    return model.encode(
+        texts,
+        batch_size=encode_batch_size,
+        show_progress_bar=False,
+        convert_to_numpy=True
+    )
+
+
+_worker_model = None
+
+
+def _init_worker(model_name: str, threads: int):
+    """Loads the encoder once per worker process, sharing the cores between workers."""
+    global _worker_model
+    import torch
+    torch.set_num_threads(threads)
+    _worker_model = SentenceTransformer(model_name)
+
+
+def _encode_in_worker(texts: list, encode_batch_size: int):
+    return encode_texts(_worker_model, texts, encode_batch_size)
+
+
+class Encoder:
+    """
+    Encodes texts in-process (workers=1) or on a pool of worker processes. submit()
+    splits the texts across the workers and returns futures in text order.
+    """
+
+    def __init__(self, model=None, workers: int = 1, encode_batch_size: int = ENCODE_BATCH_SIZE):
+        self.workers = max(1, workers)
+        self.encode_batch_size = encode_batch_size
+        self.model = model
+        self._pool = None
+        if self.workers > 1:
+            threads = max(1, (os.cpu_count() or 1) // self.workers)
+            # spawn, not fork: children must not inherit the writer's DB connection
+            self._pool = ProcessPoolExecutor(
+                self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(MODEL_NAME, threads),
+            )
+        elif self.model is None:
+            self.model = SentenceTransformer(MODEL_NAME)
+
+    def submit(self, texts: list) -> list:
+        if not texts:
+            return []
+        if self._pool is None:
+            future = Future()
+            future.set_result(encode_texts(self.model, texts, self.encode_batch_size))
+            return [future]
+        size = max(self.encode_batch_size, math.ceil(len(texts) / self.workers))
+        return [
+            self._pool.submit(_encode_in_worker, texts[start:start + size], self.encode_batch_size)
+            for start in range(0, len(texts), size)
+        ]
+
+    @staticmethod
+    def gather(futures: list) -> list:
+        return [e for f in futures for e in f.result()]
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+
+
+def _upsert_sql() -> str:
+    cols = ", ".join(TABLE_COLUMNS)
+    assignments = ",\n        ".join(f"{c} = EXCLUDED.{c}" for c in SCALAR_COLUMNS + ["text_hash"])
+    current = ", ".join(f"p.{c}" for c in SCALAR_COLUMNS)
+    incoming = ", ".join(f"EXCLUDED.{c}" for c in SCALAR_COLUMNS)
+    return f"""
+    INSERT INTO myntra_products AS p ({cols})
+    SELECT {cols} FROM myntra_products_stage
+    ON CONFLICT (product_id) DO UPDATE SET
+        {assignments},
+        embedding = COALESCE(EXCLUDED.embedding, p.embedding)
+    WHERE EXCLUDED.embedding IS NOT NULL
+       OR ({current}) IS DISTINCT FROM ({incoming})
+    RETURNING (xmax = 0) AS inserted;
+    """
+
+
+def _insert_sql() -> str:
+    cols = ", ".join(TABLE_COLUMNS)
+    # the old per-row insert kept the first row for a duplicated p_id
+    return f"""
+    INSERT INTO myntra_products ({cols})
+    SELECT {cols} FROM myntra_products_stage
+    ON CONFLICT (product_id) DO NOTHING;
+    """
+
+
+def prepare_chunk(cur, chunk: pd.DataFrame, incremental: bool):
+    """Records, texts and hashes of a chunk plus the indexes that need (re-)encoding."""
+    records = chunk.drop_duplicates(subset="p_id", keep="first").to_dict("records")
+    texts = [embedding_text(r) for r in records]
+    hashes = [text_hash(t) for t in texts]
+    if not incremental:
+        return records, texts, hashes, list(range(len(records)))
+
+    cur.execute(
+        "SELECT product_id, text_hash FROM myntra_products WHERE product_id = ANY(%s);",
+        ([str(r["p_id"]) for r in records],)
+    )
+    known = dict(cur.fetchall())
+    stale = [i for i, r in enumerate(records) if known.get(str(r["p_id"])) != hashes[i]]
+    return records, texts, hashes, stale
+
+
+def write_chunk(cur, records: list, hashes: list, stale: list, encoded, incremental: bool,
+                stats: dict, sql: str):
+    """Stages a chunk with COPY and merges it into myntra_products."""
+    embeddings = [None] * len(records)
+    for i, e in zip(stale, encoded):
+        embeddings[i] = e
+
+    copy_rows(cur, [to_db_row(r, e, h) for r, e, h in zip(records, embeddings, hashes)],
+              table="myntra_products_stage")
+    cur.execute(sql)
+    if incremental:
+        written = cur.fetchall()
+        inserted = sum(1 for (is_new,) in written if is_new)
+        stats["inserted"] += inserted
+        stats["updated"] += len(written) - inserted
+        stats["unchanged"] += len(records) - len(written)
+        cur.execute("""
+            INSERT INTO ingest_seen_products SELECT product_id FROM myntra_products_stage
+            ON CONFLICT DO NOTHING;
+        """)
+    else:
+        stats["inserted"] += cur.rowcount
+    stats["embedded"] += len(stale)
+    stats["rows"] += len(records)
+
+
+def ingest(path: str, encoder: Encoder, incremental: bool = False, batch_size: int = BATCH_SIZE,
+           sample_size: int = 0, restart: bool = False, delete_missing: bool = True,
+           max_pending: int = MAX_PENDING_CHUNKS) -> dict:
+    """
+    Streams the CSV into myntra_products one chunk at a time. Every chunk commits
+    together with a checkpoint, so a crashed run picks up after the last committed
+    chunk when started again with the same file and settings.
+
+    Up to `max_pending` chunks are encoding on the encoder's workers while this
+    process, the only DB writer, commits finished chunks in CSV order.
+
+    The default mode rebuilds the table. In incremental mode the live table is
+    upserted instead: only rows whose embedding text hash changed are re-encoded,
+    scalar-only changes are updated in place and products missing from the CSV are
+    deleted at the end, so search keeps serving the whole time.
+    """
+    mode = "incremental" if incremental else "rebuild"
+    key = run_key(path, mode, batch_size, sample_size)
+    conn = connect()
+    cur = conn.cursor()
+
+    cur.execute("CREATE EXTENSION IF NOT EXISTS vector;")
+    ensure_table(cur)
+    create_work_tables(cur)
+    conn.commit()
+
+    chunks_done, rows_done = (0, 0) if restart else load_checkpoint(cur, key)
+    if chunks_done:
+        print(f"Resuming {mode} ingest after chunk {chunks_done} ({rows_done} rows already committed)")
+    elif incremental:
+        cur.execute("TRUNCATE ingest_seen_products;")
+    else:
+        create_table(cur)
+    conn.commit()
+
+    sql = _upsert_sql() if incremental else _insert_sql()
+    stats = {"rows": 0, "inserted": 0, "updated": 0, "unchanged": 0, "embedded": 0, "deleted": 0,
+             "resumed_rows": rows_done}
+
+    pending = deque()   # (chunk rows, records, hashes, stale, futures), in CSV order
+    started = time.perf_counter()
+
+    def write_oldest(bar):
+        nonlocal chunks_done, rows_done
+        n_rows, records, hashes, stale, futures = pending.popleft()
+        write_chunk(cur, records, hashes, stale, Encoder.gather(futures), incremental, stats, sql)
+
+        chunks_done += 1
+        rows_done += n_rows
+        save_checkpoint(cur, key, path, mode, chunks_done, rows_done)
+        conn.commit()
+
+        bar.update(n_rows)
+        bar.set_postfix(rows_per_sec=f"{stats['rows'] / (time.perf_counter() - started):.1f}")
+
+    with tqdm(unit="rows", initial=rows_done) as bar:
+        for chunk in iter_catalog(path, batch_size, sample_size, skip_rows=chunks_done * batch_size):
+            records, texts, hashes, stale = prepare_chunk(cur, chunk, incremental)
+            futures = encoder.submit([texts[i] for i in stale])
+            pending.append((len(chunk), records, hashes, stale, futures))
+            while len(pending) > max(0, max_pending - 1):
+                write_oldest(bar)
+        while pending:
+            write_oldest(bar)
+
+    # an empty CSV should never wipe the catalog
+    if incremental and delete_missing and rows_done:
+        cur.execute("""
+            DELETE FROM myntra_products p
+            WHERE NOT EXISTS (SELECT 1 FROM ingest_seen_products s WHERE s.product_id = p.product_id);
+        """)
+        stats["deleted"] = cur.rowcount
+        cur.execute("TRUNCATE ingest_seen_products;")
+
+    create_filter_indexes(cur)
+    cur.execute("DELETE FROM ingest_checkpoints WHERE run_key = %s;", (key,))
+    conn.commit()
+    cur.close()
+    conn.close()
+    return stats
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Embed FashionDataset.csv into myntra_products.")
+    parser.add_argument("--csv", default=CSV_FILE, help="path to the catalog CSV")
+    parser.add_argument("--sample-size", type=int, default=SAMPLE_SIZE,
+                        help="only ingest the first N rows (0 = whole catalog)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE,
+                        help="rows read, encoded and committed per chunk")
+    parser.add_argument("--encode-batch-size", type=int, default=ENCODE_BATCH_SIZE,
+                        help="batch size passed to SentenceTransformer.encode")
+    parser.add_argument("--workers", type=int, default=WORKERS,
+                        help="encoder processes; each loads its own model and gets cpu_count/N threads")
+    parser.add_argument("--max-pending-chunks", type=int, default=MAX_PENDING_CHUNKS,
+                        help="chunks encoding ahead of the DB writer (bounds memory)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="upsert into the live table and only re-embed rows whose text changed")
+    parser.add_argument("--restart", action="store_true",
+                        help="ignore a checkpoint left by a crashed run and start from the first row")
+    parser.add_argument("--index", choices=vector_index.INDEX_KINDS, default=vector_index.VECTOR_INDEX,
+                        help="ANN index on the embedding column")
+    parser.add_argument("--hnsw-m", type=int, default=vector_index.HNSW_M)
+    parser.add_argument("--hnsw-ef-construction", type=int, default=vector_index.HNSW_EF_CONSTRUCTION)
+    parser.add_argument("--ivfflat-lists", type=int, default=vector_index.IVFFLAT_LISTS,
+                        help="IVFFlat lists (0 = derive from row count)")
+    parser.add_argument("--quantization", choices=vector_index.QUANTIZATIONS,
+                        default=vector_index.VECTOR_QUANTIZATION,
+                        help="index a halfvec or binary-quantized form of the embedding; search reranks "
+                             "with the full vectors (set VECTOR_QUANTIZATION to match)")
+    parser.add_argument("--reindex", action="store_true",
+                        help="rebuild the index after an incremental run (IVFFlat drifts as data changes)")
+    parser.add_argument("--skip-thumbnails", action="store_true",
+                        help="do not prefetch card thumbnails of new product images (see thumbnails.py)")
+    parser.add_argument("--index-only", action="store_true",
+                        help="skip the CSV and only (re)build the index")
+    return parser.parse_args()
+
+
+def refresh_index(args, rebuild: bool):
+    """Builds the ANN index after loading (much faster than maintaining it row by row)."""
+    conn = connect()
+    try:
+        with conn.cursor() as cur:
+            exists = vector_index.index_exists(cur)
+        conn.rollback()
+        if args.index == "none" or rebuild or not exists:
+            started = time.perf_counter()
+            vector_index.build_index(
+                conn, args.index, m=args.hnsw_m, ef_construction=args.hnsw_ef_construction,
+                lists=args.ivfflat_lists, quantization=args.quantization
+            )
+            print("Vector index '{}' ({}) ready in {:.1f}s".format(
+                args.index, args.quantization, time.perf_counter() - started))
+    finally:
+        conn.close()
+
+
+def refresh_neighbors() -> dict:
+    """Recomputes "similar items" for the products this run changed (see neighbors.py)."""
+    conn = connect()
+    try:
+        return neighbors.refresh_neighbors(conn)
+    finally:
+        conn.close()
+
+
+def bump_version() -> int:
+    conn = connect()
+    try:
+        with conn.cursor() as cur:
+            version = bump_catalog_version(cur)
+        conn.commit()
+    finally:
+        conn.close()
+    return version
+
+
+def main():
+    args = parse_args()
+    if args.index_only:
+        refresh_index(args, rebuild=True)
+        return
+
+    started = time.perf_counter()
+    encoder = Encoder(workers=args.workers, encode_batch_size=args.encode_batch_size)
+    try:
+        stats = ingest(
+            args.csv, encoder,
+            incremental=args.incremental,
+            batch_size=args.batch_size,
+            sample_size=args.sample_size,
+            restart=args.restart,
+            # a sampled CSV is not the whole catalog, so nothing counts as removed
+            delete_missing=not args.sample_size,
+            max_pending=args.max_pending_chunks,
+        )
+    finally:
+        encoder.close()
+    refresh_index(args, rebuild=not args.incremental or args.reindex)
+    neighbor_stats = refresh_neighbors()
+    print("Similar items: {recomputed} of {products} products recomputed".format(**neighbor_stats))
+    if not args.skip_thumbnails:
+        conn = connect()
+        try:
+            thumb_stats = thumbnails.prefetch_catalog(conn)
+        finally:
+            conn.close()
+        print("Thumbnails: {created} created, {hits} already cached, {failed} failed, "
+              "{skipped} skipped (cache full)".format(**thumb_stats))
+    print("Catalog version {} (cached search results invalidated)".format(bump_version()))
+    if os.getenv("SEARCH_BACKEND", "postgres") == "memory":
+        # after the bump, so the snapshot carries the new version and running apps just reload it
+        print("Memory snapshot rebuilt ({} rows)".format(memory_backend.build_snapshot()))
+    elapsed = time.perf_counter() - started
+    rate = stats["rows"] / elapsed if elapsed else 0.0
+
+    if args.incremental:
+        print("Incremental ingest done in {:.1f}s ({:.1f} rows/sec): {inserted} inserted, {updated} updated, "
+              "{unchanged} unchanged, {embedded} re-embedded, {deleted} deleted".format(elapsed, rate, **stats))
+    else:
+        print("Fashion dataset ingested successfully ({} rows in {:.1f}s, {:.1f} rows/sec)".format(
+            stats["inserted"], elapsed, rate))
 
-conn.commit()
-cur.close()
-conn.close()
 
-print("Fashion dataset ingested successfully (sample size: {})".format(len(df)))
\ No newline at end of file
+if __name__ == "__main__":
+    main()
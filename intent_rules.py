@@ -0,0 +1,201 @@
+# intent_rules.py
+"""
+Deterministic intent parser for well-formed shopping queries ("black jeans under
+1000", "3 red kurtis for office"). search_products and app.py only fall back to
+the LLM when the parse is not confident.
+"""
+import os
+import re
+from typing import Optional
+
+from taxonomy import (
+    AUDIENCE_TERMS,
+    CATEGORY_ALIAS_MAP,
+    CATEGORY_TERMS,
+    COLOR_FAMILY_MAP,
+    COLOR_TERMS,
+    OCCASION_TERMS,
+    STYLE_TERMS,
+)
+
+INTENT_RULES_MIN_CONFIDENCE = float(os.getenv("INTENT_RULES_MIN_CONFIDENCE", "0.8"))
+
+STOPWORDS = {
+    "i", "im", "me", "my", "we", "our", "want", "wanna", "need", "looking", "look", "show", "find",
+    "buy", "get", "give", "some", "any", "a", "an", "the", "for", "in", "on", "with", "and", "or",
+    "of", "to", "please", "pls", "plz", "color", "colour", "coloured", "colored", "shade", "items",
+    "item", "options", "option", "something", "can", "you", "like", "that", "is", "are", "price",
+    "budget", "rs", "inr", "rupees", "rupee",
+}
+
+# phrase -> category key; free-standing garments outside the alias map map to themselves
+_CATEGORY_PHRASES = {alias: key for key, aliases in CATEGORY_ALIAS_MAP.items() for alias in aliases}
+for _term in CATEGORY_TERMS - STYLE_TERMS:
+    _CATEGORY_PHRASES.setdefault(_term.replace("-", ""), _term.replace("-", ""))
+
+# spelled the way product names spell it, for the embedding and full-text query
+_KEYWORD_FORMS = {"tshirt": "t-shirt", "tshirts": "t-shirts"}
+
+_COLOR_PHRASES = set(COLOR_FAMILY_MAP) | set(COLOR_TERMS)
+for _members in COLOR_FAMILY_MAP.values():
+    _COLOR_PHRASES.update(_members)
+_COLOR_PHRASES.add("navy blue")
+
+_OTHER_TERMS = AUDIENCE_TERMS | OCCASION_TERMS | STYLE_TERMS
+
+_MAX_PHRASE_WORDS = max(len(p.split()) for p in list(_CATEGORY_PHRASES) + list(_COLOR_PHRASES))
+
+# a number is only a price next to a currency or a price cue ("under", "budget");
+# bare numbers are quantities, sizes or years ("2024 wedding saree")
+_CURRENCY = r"(?:(?:\b(?:rs\.?|inr)|₹)\s*)?"
+_AMOUNT = r"(\d+(?:\.\d+)?)\s*(k\b)?\s*(?:rs\b|inr\b|rupees?\b|/-)?"
+_PRICE_PATTERNS = [
+    ("range", re.compile(rf"\bbetween\s+{_CURRENCY}{_AMOUNT}\s*(?:and|to|-)\s*{_CURRENCY}{_AMOUNT}")),
+    ("range", re.compile(rf"(?<!\w){_CURRENCY}{_AMOUNT}\s*(?:to|-)\s*{_CURRENCY}{_AMOUNT}")),
+    ("max", re.compile(rf"\b(?:under|below|less than|upto|up to|within|max(?:imum)?|cheaper than|not more than|"
+                       rf"budget(?: of| is)?|around)\s+{_CURRENCY}{_AMOUNT}")),
+    ("min", re.compile(rf"\b(?:above|over|more than|min(?:imum)?|at least|starting(?: from| at)?|from)\s+{_CURRENCY}{_AMOUNT}")),
+    ("max", re.compile(rf"(?:\b(?:rs\.?|inr)|₹)\s*{_AMOUNT}")),
+    ("max", re.compile(r"\b(\d+(?:\.\d+)?)\s*(k\b)?\s*(?:rs\b|inr\b|rupees?\b|/-)")),
+]
+
+def _amount(number: str, thousands: Optional[str]) -> int:
+    value = float(number)
+    return int(value * 1000) if thousands else int(value)
+
+
+def _extract_prices(text: str):
+    """Returns (min_price, max_price, text with the price phrases blanked out)."""
+    min_price = max_price = None
+    for kind, pattern in _PRICE_PATTERNS:
+        match = pattern.search(text)
+        if not match:
+            continue
+        groups = match.groups()
+        if kind == "range":
+            low, high = _amount(*groups[0:2]), _amount(*groups[2:4])
+            if high < 100:      # "2-3 kurtis" is a quantity, not a price
+                continue
+            min_price, max_price = min(low, high), max(low, high)
+        elif kind == "max" and max_price is None:
+            max_price = _amount(*groups[0:2])
+        elif kind == "min" and min_price is None:
+            min_price = _amount(*groups[0:2])
+        else:
+            continue
+        text = text[:match.start()] + " " + text[match.end():]
+    return min_price, max_price, text
+
+
+def _forms(token: str) -> list:
+    """The token plus its naive singulars ("sarees" -> "saree", "dresses" -> "dress")."""
+    forms = [token]
+    for suffix in ("s", "es"):
+        if token.endswith(suffix) and len(token) > len(suffix) + 2:
+            forms.append(token[: -len(suffix)])
+    return forms
+
+
+def parse_intent(query: str) -> dict:
+    """
+    Returns {"intent", "rewritten_query", "quantity", "confidence"}. `intent` has the
+    same keys extract_intent produces (category, color, min_price, max_price);
+    confidence is the share of the query the rules could account for, scaled down
+    when no garment was recognised.
+    """
+    text = (query or "").lower()
+    text = re.sub(r"(?<=\d),(?=\d)", "", text)          # "1,000" -> "1000"
+    text = re.sub(r"\bt[- ]?shirt", "tshirt", text)
+    min_price, max_price, text = _extract_prices(text)
+
+    tokens = re.findall(r"[a-z0-9]+", text)
+    categories, colors, keywords = [], [], []
+    quantity = None
+    explained = 0
+    i = 0
+    while i < len(tokens):
+        matched = False
+        for size in range(min(_MAX_PHRASE_WORDS, len(tokens) - i), 0, -1):
+            phrase = " ".join(tokens[i:i + size])
+            candidates = [phrase] if size > 1 else _forms(phrase)
+            for candidate in candidates:
+                if candidate in _CATEGORY_PHRASES:
+                    categories.append(_CATEGORY_PHRASES[candidate])
+                elif candidate in _COLOR_PHRASES:
+                    colors.append(candidate)
+                elif candidate in _OTHER_TERMS:
+                    pass
+                else:
+                    continue
+                keywords.append(phrase)
+                explained += size
+                i += size
+                matched = True
+                break
+            if matched:
+                break
+        if matched:
+            continue
+
+        token = tokens[i]
+        if token.isdigit():
+            value = int(token)
+            if quantity is None and 0 < value <= 50:
+                quantity = value
+            else:
+                i += 1      # left unexplained, so odd numbers send the query to the LLM
+                continue
+            explained += 1
+        elif token in STOPWORDS:
+            explained += 1
+        else:
+            keywords.append(token)   # brands, fabrics, ... still useful for the embedding
+        i += 1
+
+    intent = {}
+    unique_categories = list(dict.fromkeys(categories))
+    if unique_categories:
+        intent["category"] = unique_categories[0]
+    if colors:
+        intent["color"] = colors[0]
+    if min_price is not None:
+        intent["min_price"] = min_price
+    if max_price is not None:
+        intent["max_price"] = max_price
+
+    coverage = explained / len(tokens) if tokens else (1.0 if (min_price or max_price) else 0.0)
+    if unique_categories:
+        confidence = coverage
+    elif colors:
+        confidence = 0.6 * coverage
+    else:
+        confidence = 0.3 * coverage
+    if len(unique_categories) > 1:
+        # "kurti jeans" / "denim jacket": combination or modifier, let the LLM decide
+        confidence = min(confidence, 0.5)
+
+    return {
+        "intent": intent,
+        "rewritten_query": " ".join(_KEYWORD_FORMS.get(k, k) for k in keywords),
+        "quantity": quantity,
+        "confidence": round(confidence, 3),
+    }
+
+
+def fast_understanding(query: str, min_confidence: float = INTENT_RULES_MIN_CONFIDENCE) -> Optional[dict]:
+    """
+    A llm_client.understand_query-shaped result for queries the rules fully
+    understand (a recognised garment and little else), or None to escalate.
+    """
+    parsed = parse_intent(query)
+    if parsed["confidence"] < min_confidence or "category" not in parsed["intent"]:
+        return None
+    return {
+        "route": "SEARCH",
+        "intent": parsed["intent"],
+        "rewritten_query": parsed["rewritten_query"] or query,
+        "needs_clarification": False,
+        "questions": [],
+        "missing_fields": [],
+        "reason": "",
+    }
@@ -3,23 +3,44 @@
 import os
 import json
 import logging
-from groq import Groq
+import time
 from dotenv import load_dotenv
 
+import timing
+from llm_cache import LLMCache
+from llm_resilience import ResilientLLM
+
 load_dotenv()
 
 # Logger Setup
 logger = logging.getLogger("llm_client")
 logger.setLevel(logging.ERROR)
 
-# Client Setup
-client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+# Client Setup: async transport with deadlines, retries, hedging and a circuit
+# breaker. Every failure (including an open breaker) surfaces as None / an empty
+# stream, so each caller falls back to its local default.
+client = ResilientLLM(api_key=os.getenv("GROQ_API_KEY"))
 MODEL = "llama-3.1-8b-instant"
 
+# Opt-in cache for deterministic (temperature 0) calls; set LLM_CACHE=1 to enable
+llm_cache = LLMCache() if os.getenv("LLM_CACHE", "0") == "1" else None
+
 def _safe_call(messages, max_tokens=200, temp=0.0, json_mode=False):
     """
     Centralized safe caller with strict temperature control.
     """
+    with timing.span("llm.call") as span:
+        return _call(messages, max_tokens, temp, json_mode, span)
+
+def _call(messages, max_tokens, temp, json_mode, span):
+    cache_key = None
+    if llm_cache is not None and temp == 0.0:
+        cache_key = LLMCache.make_key(MODEL, messages, max_tokens=max_tokens, temp=temp, json_mode=json_mode)
+        cached = llm_cache.get(cache_key)
+        span["cached"] = cached is not None
+        if cached is not None:
+            return cached
+
     try:
         kwargs = {
             "model": MODEL,
@@ -30,12 +51,67 @@ def _safe_call(messages, max_tokens=200, temp=0.0, json_mode=False):
         if json_mode:
             kwargs["response_format"] = {"type": "json_object"}
 
-        response = client.chat.completions.create(**kwargs)
-        return response.choices[0].message.content
+        response = client.complete(**kwargs)
+        content = response.choices[0].message.content
+        if cache_key and content:
+            llm_cache.set(cache_key, content)
+        return content
     except Exception as e:
-        logger.error(f"LLM Error: {e}")
+        logger.error(f"LLM Error: {e!r}")
+        span["error"] = type(e).__name__
         return None
 
+def _safe_call_stream(messages, max_tokens=200, temp=0.0):
+    """
+    Streaming counterpart of _safe_call: yields content deltas as Groq produces
+    them, so the first words render while the rest is still generating. Yields
+    nothing on error; a cached response is yielded in one piece.
+    """
+    cache_key = None
+    if llm_cache is not None and temp == 0.0:
+        cache_key = LLMCache.make_key(MODEL, messages, max_tokens=max_tokens, temp=temp, json_mode=False)
+        cached = llm_cache.get(cache_key)
+        if cached is not None:
+            yield cached
+            return
+
+    parts = []
+    started = time.perf_counter()
+    try:
+        stream = client.stream(
+            model=MODEL,
+            messages=messages,
+            temperature=temp,
+            max_tokens=max_tokens,
+        )
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                if not parts:
+                    timing.record("llm.stream.first_token", (time.perf_counter() - started) * 1000)
+                parts.append(delta)
+                yield delta
+    except Exception as e:
+        logger.error(f"LLM Error: {e!r}")
+        return
+    finally:
+        timing.record("llm.stream", (time.perf_counter() - started) * 1000, tokens=len(parts))
+
+    if cache_key and parts:
+        llm_cache.set(cache_key, "".join(parts))
+
+def _with_fallback(tokens, fallback: str):
+    """Passes tokens through, or yields `fallback` if the stream produced none."""
+    produced = False
+    for token in tokens:
+        produced = True
+        yield token
+    if not produced:
+        yield fallback
+
+@timing.timed("llm.rewrite")
 def rewrite_query(query: str) -> str:
     """Optimizes the query WITHOUT adding categories not present."""
     system_prompt = (
@@ -53,6 +129,7 @@ def rewrite_query(query: str) -> str:
     )
     return res.strip() if res else query
 
+@timing.timed("llm.router")
 def get_router_decision(query: str) -> str:
     """
     Decides if the query is a 'SEARCH' or 'CHAT'.
@@ -77,6 +154,7 @@ def get_router_decision(query: str) -> str:
     except:
         return "SEARCH"
 
+@timing.timed("llm.intent")
 def extract_intent(query: str) -> dict:
     """
     Extracts structured filters from the query.
@@ -107,13 +185,11 @@ def extract_intent(query: str) -> dict:
     except:
         return {}
 
-def generate_product_summary(query: str, products: list) -> str:
-    """
-    Summarizes REAL database results.
-    """
-    if not products:
-        return "I checked our inventory, but I couldn't find an exact match. Could we try a different color?"
+NO_PRODUCTS_SUMMARY = "I checked our inventory, but I couldn't find an exact match. Could we try a different color?"
+SUMMARY_FALLBACK = "Here are the best matches I found for you."
+CHAT_FALLBACK = "Sorry, I couldn't come up with a reply just now. Could you try asking again?"
 
+def _product_summary_messages(query: str, products: list) -> list:
     context_str = "\n".join(
         [f"- {p['name']} ({p['brand']})" for p in products[:3]]
     )
@@ -125,15 +201,29 @@ def generate_product_summary(query: str, products: list) -> str:
     )
 
     prompt = f"User Query: {query}\n\nAvailable Products:\n{context_str}"
+    return [{"role": "system", "content": system_prompt}, {"role": "user", "content": prompt}]
 
-    res = _safe_call(
-        [{"role": "system", "content": system_prompt}, {"role": "user", "content": prompt}],
-        max_tokens=200,
-        temp=0.1
+@timing.timed("llm.summary")
+def generate_product_summary(query: str, products: list) -> str:
+    """
+    Summarizes REAL database results.
+    """
+    if not products:
+        return NO_PRODUCTS_SUMMARY
+    res = _safe_call(_product_summary_messages(query, products), max_tokens=200, temp=0.1)
+    return res or SUMMARY_FALLBACK
+
+def stream_product_summary(query: str, products: list):
+    """generate_product_summary as a token stream, e.g. for st.write_stream."""
+    if not products:
+        yield NO_PRODUCTS_SUMMARY
+        return
+    yield from _with_fallback(
+        _safe_call_stream(_product_summary_messages(query, products), max_tokens=200, temp=0.1),
+        SUMMARY_FALLBACK
     )
-    return res or "Here are the best matches I found for you."
 
-def generate_chat_response(query: str, history: list) -> str:
+def _chat_messages(query: str, history: list) -> list:
     messages = [
         {
             "role": "system",
@@ -161,9 +251,17 @@ def generate_chat_response(query: str, history: list) -> str:
         "role": "user",
         "content": query
     })
+    return messages
 
-    return _safe_call(messages, max_tokens=100)
+@timing.timed("llm.chat")
+def generate_chat_response(query: str, history: list) -> str:
+    return _safe_call(_chat_messages(query, history), max_tokens=100)
+
+def stream_chat_response(query: str, history: list):
+    """generate_chat_response as a token stream, e.g. for st.write_stream."""
+    yield from _with_fallback(_safe_call_stream(_chat_messages(query, history), max_tokens=100), CHAT_FALLBACK)
 
+@timing.timed("llm.clarification")
 def get_clarification_plan(query: str) -> dict:
     """
     Detects vague shopping requests and returns targeted follow-up questions.
@@ -194,25 +292,85 @@ def get_clarification_plan(query: str) -> dict:
         json_mode=True
     )
 
+    try:
+        return _normalize_clarification(json.loads(res))
+    except Exception:
+        return _normalize_clarification({})
+
+def _normalize_clarification(data: dict) -> dict:
+    questions = data.get("questions") or []
+    if not isinstance(questions, list):
+        questions = []
+    questions = [str(q).strip() for q in questions if str(q).strip()][:4]
+    return {
+        "needs_clarification": bool(data.get("needs_clarification", False)) and bool(questions),
+        "questions": questions,
+        "missing_fields": data.get("missing_fields") or [],
+        "reason": str(data.get("reason") or "").strip()
+    }
+
+@timing.timed("llm.understand")
+def understand_query(query: str) -> dict:
+    """
+    One call that does the work of get_router_decision, extract_intent,
+    rewrite_query and get_clarification_plan, so a search turn pays for a single
+    round trip to Groq instead of three or four.
+    """
+    system_prompt = (
+        "You are the query understanding step of a fashion shopping assistant.\n"
+        "Analyze the user's message and return ONLY JSON with this shape:\n"
+        "{\n"
+        "  \"route\": \"SEARCH\" | \"CHAT\" | \"PERSONAL\",\n"
+        "  \"intent\": {\"category\": str, \"color\": str, \"min_price\": int, \"max_price\": int},\n"
+        "  \"rewritten_query\": \"fashion keywords only\",\n"
+        "  \"needs_clarification\": true|false,\n"
+        "  \"questions\": [\"question 1\"],\n"
+        "  \"missing_fields\": [\"category\", \"color\"],\n"
+        "  \"reason\": \"short reason\"\n"
+        "}\n\n"
+        "Routing:\n"
+        "- Clothing items, fashion, colors, brands, outfits, styling -> SEARCH\n"
+        "- Greetings or shopping-related help -> CHAT\n"
+        "- Feelings, loneliness, life, relationships, emotions -> PERSONAL\n\n"
+        "Intent:\n"
+        "- Only include keys the user actually mentioned. Do NOT invent categories.\n"
+        "- If the query mentions TWO clothing items together (e.g. 'jeans top', 'kurti jeans'),\n"
+        "  use {\"primary_item\": \"top\", \"pair_with\": \"jeans\"} instead of category.\n\n"
+        "Rewritten query:\n"
+        "- Extract ONLY the fashion keywords. If they only say a color, output only that color.\n\n"
+        "Clarification:\n"
+        "- needs_clarification is true only when the request is too vague to search well.\n"
+        "- Ask at most 4 short questions about category/type, color, occasion, audience or budget.\n"
+        "- For family/group shopping, ask who to shop for (adults/kids, gender split, count).\n"
+        "- If the request is specific enough, set needs_clarification to false and questions to []."
+    )
+
+    res = _safe_call(
+        [{"role": "system", "content": system_prompt}, {"role": "user", "content": query}],
+        max_tokens=350,
+        temp=0.0,
+        json_mode=True
+    )
+
     try:
         data = json.loads(res)
-        questions = data.get("questions") or []
-        if not isinstance(questions, list):
-            questions = []
-        return {
-            "needs_clarification": bool(data.get("needs_clarification", False)) and bool(questions),
-            "questions": [str(q).strip() for q in questions if str(q).strip()][:4],
-            "missing_fields": data.get("missing_fields") or [],
-            "reason": str(data.get("reason") or "").strip()
-        }
+        if not isinstance(data, dict):
+            raise ValueError("expected a JSON object")
     except Exception:
-        return {
-            "needs_clarification": False,
-            "questions": [],
-            "missing_fields": [],
-            "reason": ""
-        }
+        # same fallbacks as the individual calls
+        data = {"route": "SEARCH"}
+
+    intent = data.get("intent")
+    rewritten = str(data.get("rewritten_query") or "").strip()
+    route = str(data.get("route") or "CHAT").upper()
+    return {
+        "route": route if route in ("SEARCH", "CHAT", "PERSONAL") else "CHAT",
+        "intent": intent if isinstance(intent, dict) else {},
+        "rewritten_query": rewritten or query,
+        **_normalize_clarification(data)
+    }
 
+@timing.timed("llm.refine")
 def build_refined_search_query(original_query: str, clarification_answers: str) -> str:
     """
     Combines original request + user clarification into a single searchable query.
@@ -0,0 +1,239 @@
+# llm_resilience.py
+"""
+Async Groq transport for llm_client: per-call deadlines, jittered retries, a
+circuit breaker and optional hedged requests.
+
+The AsyncGroq client lives on one background event loop; Streamlit's script
+threads call into it through the blocking helpers and never wait past the deadline.
+GROQ_BASE_URL points it at another server, e.g. benchmarks/fake_llm_server.py.
+"""
+import asyncio
+import concurrent.futures
+import os
+import queue
+import random
+import threading
+import time
+from typing import Optional
+
+import groq
+import httpx
+from groq import AsyncGroq
+
+GROQ_BASE_URL = os.getenv("GROQ_BASE_URL") or None
+LLM_DEADLINE = float(os.getenv("LLM_DEADLINE", "10"))                  # seconds per call, retries included
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.25"))
+LLM_HEDGE_AFTER = float(os.getenv("LLM_HEDGE_AFTER", "0"))             # seconds; 0 = no hedging
+LLM_BREAKER_THRESHOLD = int(os.getenv("LLM_BREAKER_THRESHOLD", "5"))   # consecutive failures
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))  # seconds before a trial call
+
+# worth another attempt; anything else (bad request, auth) fails straight away
+RETRYABLE_ERRORS = (
+    asyncio.TimeoutError,
+    groq.APIConnectionError,     # includes APITimeoutError
+    groq.RateLimitError,
+    groq.InternalServerError,
+)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling upstream while the breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive failures. Once `cooldown` seconds have
+    passed a single trial call is let through (half-open); its outcome closes the
+    breaker or opens it for another cooldown.
+    """
+
+    def __init__(self, threshold: int = LLM_BREAKER_THRESHOLD, cooldown: float = LLM_BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            return "half-open" if time.monotonic() - self._opened_at >= self.cooldown else "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.cooldown or self._trial_running:
+                return False
+            self._trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def release(self):
+        """Gives up a trial call that ended without an outcome (e.g. cancelled)."""
+        with self._lock:
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_running = False
+            if self._opened_at is not None or self._failures >= self.threshold:
+                self._opened_at = time.monotonic()
+
+
+class ResilientLLM:
+    """Chat completions with a deadline, retries, hedging and a circuit breaker."""
+
+    def __init__(self, api_key: Optional[str], base_url: Optional[str] = GROQ_BASE_URL,
+                 deadline: float = LLM_DEADLINE, max_retries: int = LLM_MAX_RETRIES,
+                 retry_base_delay: float = LLM_RETRY_BASE_DELAY, hedge_after: float = LLM_HEDGE_AFTER,
+                 breaker: Optional[CircuitBreaker] = None):
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.hedge_after = hedge_after
+        self.breaker = breaker or CircuitBreaker()
+        self.stats = {"calls": 0, "retries": 0, "hedges": 0, "timeouts": 0, "failures": 0, "short_circuited": 0}
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="llm-loop", daemon=True)
+        self._thread.start()
+        # retries are ours; the SDK's own would ignore the deadline
+        self._client = AsyncGroq(api_key=api_key, base_url=base_url, timeout=deadline, max_retries=0)
+
+    # blocking entry points for the Streamlit script thread
+
+    def complete(self, **kwargs):
+        """chat.completions.create(**kwargs) with the resilience policy applied."""
+        future = asyncio.run_coroutine_threadsafe(self.acomplete(**kwargs), self._loop)
+        try:
+            return future.result(timeout=self.deadline + 1)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+
+    def stream(self, **kwargs):
+        """
+        Yields completion chunks. Opening the stream is retried like complete();
+        after the first chunk a stalled stream fails once the deadline passes
+        without new data.
+        """
+        chunks = queue.Queue()
+        done = object()
+
+        async def pump():
+            try:
+                response = await self._call(lambda: self._client.chat.completions.create(stream=True, **kwargs))
+                async for chunk in response:
+                    chunks.put(chunk)
+                chunks.put(done)
+            except httpx.TimeoutException:
+                # the SDK leaves read timeouts mid-stream unwrapped; report them like our own stall
+                chunks.put(TimeoutError("LLM stream stalled"))
+            except BaseException as e:
+                chunks.put(e)
+
+        future = asyncio.run_coroutine_threadsafe(pump(), self._loop)
+        try:
+            while True:
+                item = chunks.get(timeout=self.deadline + 1)
+                if item is done:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        except queue.Empty:
+            raise TimeoutError("LLM stream stalled")
+        finally:
+            future.cancel()
+
+    # async implementation
+
+    async def acomplete(self, **kwargs):
+        return await self._call(lambda: self._client.chat.completions.create(**kwargs))
+
+    async def _call(self, make_request):
+        self.stats["calls"] += 1
+        if not self.breaker.allow():
+            self.stats["short_circuited"] += 1
+            raise CircuitOpenError("LLM circuit breaker is open")
+
+        deadline = self._loop.time() + self.deadline
+        attempt = 0
+        while True:
+            remaining = deadline - self._loop.time()
+            try:
+                if remaining <= 0:
+                    raise asyncio.TimeoutError()
+                result = await asyncio.wait_for(self._hedged(make_request), remaining)
+                self.breaker.record_success()
+                return result
+            except RETRYABLE_ERRORS as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    self.stats["timeouts"] += 1
+                # full jitter keeps retrying clients from stampeding together
+                delay = random.uniform(0, self.retry_base_delay * 2 ** attempt)
+                if attempt >= self.max_retries or self._loop.time() + delay >= deadline:
+                    self._fail()
+                    raise
+                attempt += 1
+                self.stats["retries"] += 1
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                self.breaker.release()
+                raise
+            except groq.APIStatusError:
+                # upstream answered (bad request, auth, ...): not an outage
+                self.breaker.record_success()
+                self.stats["failures"] += 1
+                raise
+            except Exception:
+                self._fail()
+                raise
+
+    def _fail(self):
+        self.stats["failures"] += 1
+        self.breaker.record_failure()
+
+    async def _hedged(self, make_request):
+        """
+        Sends a second identical request if the first has not answered within
+        `hedge_after` seconds and returns whichever finishes first successfully.
+        """
+        first = asyncio.ensure_future(make_request())
+        if not self.hedge_after:
+            return await first
+
+        done, _ = await asyncio.wait({first}, timeout=self.hedge_after)
+        if done:
+            return first.result()
+
+        self.stats["hedges"] += 1
+        pending = {first, asyncio.ensure_future(make_request())}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def snapshot(self) -> dict:
+        stats = dict(self.stats)
+        stats["breaker"] = self.breaker.state
+        return stats
@@ -0,0 +1,548 @@
+# memory_backend.py
+"""
+In-process alternative to the pgvector cascade for read-heavy deployments.
+
+A snapshot of myntra_products (Postgres stays the source of truth) is written to
+disk once: embeddings as a normalized float32 matrix that is memory-mapped on
+load, filter and display columns alongside. Queries are one matrix-vector product
+plus boolean masks, with no DB round trip.
+
+Ranking mirrors the SQL cascade's hybrid retrieval: within a tier the nearest
+rows by cosine and the best lexical matches are fused with reciprocal rank
+fusion and scored with the same weights. The lexical side is an in-memory term
+index over name + brand and description; it approximates Postgres's english
+stemming and ts_rank_cd (plural stripping, a short stopword list, A/B weights),
+so a row near the cut-off can still rank differently than in Postgres.
+
+Each build writes a fresh generation directory under the snapshot path and then
+repoints the CURRENT file at it, so readers always find a complete snapshot.
+Builds hold an exclusive lock file, so ingest.py and the running apps never
+build at once. The snapshot records the catalog version it was built from.
+get_memory_index() reloads it when CURRENT changes. When ingest.py has bumped
+the catalog version since, and no other build holds the lock, it rebuilds in the
+background while the old snapshot serves.
+
+    python memory_backend.py            # (re)build the snapshot from Postgres
+"""
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+try:
+    import fcntl
+except ImportError:     # Windows
+    fcntl = None
+    import msvcrt
+
+import numpy as np
+
+from db import connect, get_pool
+from result_cache import catalog_version
+
+MEMORY_INDEX_PATH = os.getenv("MEMORY_INDEX_PATH", ".vector_snapshot")
+MEMORY_RELOAD_CHECK = float(os.getenv("MEMORY_RELOAD_CHECK", "5"))   # seconds between snapshot/version checks
+EMBEDDING_DIM = 768
+
+_FETCH_SIZE = 2000
+
+# ts_rank_cd's default weights for the A (name, brand) and B (description) labels
+_TEXT_WEIGHTS = (1.0, 0.4)
+# the common words Postgres's english configuration drops from both sides
+_TEXT_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "have", "in", "is", "it", "its",
+    "me", "my", "of", "on", "or", "our", "so", "that", "the", "this", "to", "was", "with", "you", "your",
+}
+
+SNAPSHOT_SQL = """
+    SELECT product_id, name, price, colour, brand, img, description, avg_rating, rating_count,
+           category, colour_family, embedding::real[]
+    FROM myntra_products
+    WHERE embedding IS NOT NULL
+    ORDER BY product_id;
+"""
+
+
+def text_terms(text: Optional[str]) -> list:
+    """Lowercase words with naive plural stripping, standing in for english stemming."""
+    terms = []
+    for word in re.findall(r"[a-z0-9]+", (text or "").lower()):
+        if word in _TEXT_STOPWORDS or word.isdigit():
+            continue
+        if len(word) > 4 and word.endswith("ies"):
+            word = word[:-3] + "y"
+        elif len(word) > 4 and word.endswith(("ches", "shes", "sses", "xes", "zes")):
+            word = word[:-2]
+        elif len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        terms.append(word)
+    return terms
+
+
+@contextmanager
+def snapshot_lock(path: str = MEMORY_INDEX_PATH, wait: bool = True):
+    """Exclusive build lock for the snapshot at `path`; yields False if `wait` is off and it is taken."""
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, "build.lock"), "a+b") as f:
+        try:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX if wait else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                while True:
+                    try:
+                        msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+                        break
+                    except OSError:
+                        if not wait:
+                            raise BlockingIOError()
+                        time.sleep(0.1)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def snapshot_locked(path: str = MEMORY_INDEX_PATH) -> bool:
+    """True while some process is building the snapshot."""
+    with snapshot_lock(path, wait=False) as locked:
+        return not locked
+
+
+def snapshot_dir(path: str = MEMORY_INDEX_PATH) -> Optional[str]:
+    """Directory of the current generation (or `path` itself for a pre-generation snapshot)."""
+    try:
+        with open(os.path.join(path, "CURRENT"), encoding="utf-8") as f:
+            return os.path.join(path, f.read().strip())
+    except FileNotFoundError:
+        return path if os.path.exists(os.path.join(path, "columns.json")) else None
+
+
+def publish_snapshot(path: str, write_fn: Callable[[str], int], wait: bool = True) -> Optional[int]:
+    """
+    Runs write_fn(directory) under the build lock on a new generation directory and
+    makes it current. Returns write_fn's row count, or None without building when
+    `wait` is off and another build holds the lock. The previous generation is
+    kept for readers that already resolved it; older ones are removed.
+    """
+    with snapshot_lock(path, wait) as locked:
+        if not locked:
+            return None
+        generation = tempfile.mkdtemp(dir=path, prefix="gen-")
+        try:
+            rows = write_fn(generation)
+        except BaseException:
+            shutil.rmtree(generation, ignore_errors=True)
+            raise
+        previous = snapshot_dir(path)
+        pointer = os.path.join(generation, "CURRENT.tmp")
+        with open(pointer, "w", encoding="utf-8") as f:
+            f.write(os.path.basename(generation))
+        os.replace(pointer, os.path.join(path, "CURRENT"))
+        keep = {os.path.basename(generation), os.path.basename(previous or "")}
+        for name in os.listdir(path):
+            if name.startswith("gen-") and name not in keep:
+                shutil.rmtree(os.path.join(path, name), ignore_errors=True)
+        return rows
+
+
+def build_snapshot(path: str = MEMORY_INDEX_PATH, conn=None, wait: bool = True) -> Optional[int]:
+    """
+    Writes a new snapshot generation under `path` and returns the number of rows
+    (None if `wait` is off and another build is running). Rows are streamed with
+    a server-side cursor.
+    """
+    def write(directory: str) -> int:
+        own_conn = conn is None
+        db = conn or connect()
+        try:
+            return _write_snapshot(db, directory)
+        finally:
+            if own_conn:
+                db.close()
+
+    return publish_snapshot(path, write, wait)
+
+
+def _write_snapshot(conn, directory: str) -> int:
+    # read first: a bump during the copy leaves the snapshot behind, so it is rebuilt again
+    version = catalog_version(conn)
+    with conn.cursor() as cur:
+        cur.execute("SELECT COUNT(*) FROM myntra_products WHERE embedding IS NOT NULL;")
+        count = cur.fetchone()[0]
+
+    embeddings = np.lib.format.open_memmap(
+        os.path.join(directory, "embeddings.npy"), mode="w+", dtype=np.float32, shape=(count, EMBEDDING_DIM)
+    )
+    columns = {k: [] for k in ("product_id", "name", "price", "colour", "brand", "img", "description",
+                               "avg_rating", "rating_count", "category", "colour_family")}
+    with conn.cursor(name="memory_snapshot") as cur:
+        cur.itersize = _FETCH_SIZE
+        cur.execute(SNAPSHOT_SQL)
+        i = 0
+        for row in cur:
+            if i >= count:      # rows added since the COUNT land in the next snapshot
+                break
+            *values, embedding = row
+            for key, value in zip(columns, values):
+                columns[key].append(value)
+            vec = np.asarray(embedding, dtype=np.float32)
+            norm = np.linalg.norm(vec)
+            embeddings[i] = vec / norm if norm else vec
+            i += 1
+    conn.rollback()
+    embeddings.flush()
+    del embeddings
+
+    columns = {k: v[:i] for k, v in columns.items()}
+    with open(os.path.join(directory, "columns.json"), "w", encoding="utf-8") as f:
+        json.dump(columns, f)
+    with open(os.path.join(directory, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"catalog_version": version, "rows": i}, f)
+    return i
+
+
+class MemoryIndex:
+    """Memory-mapped embeddings plus per-value boolean masks for the search filters."""
+
+    def __init__(self, path: str = MEMORY_INDEX_PATH):
+        self.stamp = snapshot_stamp(path)
+        path = snapshot_dir(path) or path
+        meta_path = os.path.join(path, "meta.json")
+        meta = {}
+        if os.path.exists(meta_path):
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+        self.catalog_version = meta.get("catalog_version")   # None for snapshots older than meta.json
+        embeddings = np.load(os.path.join(path, "embeddings.npy"), mmap_mode="r")
+        with open(os.path.join(path, "columns.json"), encoding="utf-8") as f:
+            self.columns = json.load(f)
+        self.embeddings = embeddings[:len(self.columns["product_id"])]
+
+        self.product_ids = np.array(self.columns["product_id"])
+        self.price = np.array([np.nan if p is None else p for p in self.columns["price"]], dtype=np.float64)
+        self.lower_names = np.array([(n or "").lower() for n in self.columns["name"]])
+        self.category_masks = self._masks(self.columns["category"])
+        self.colour_masks = self._masks(self.columns["colour"])
+        self.family_masks = self._masks(self.columns["colour_family"], multi=True)
+        self.popularity = np.minimum(
+            np.array([r or 0 for r in self.columns["rating_count"]], dtype=np.float64) / 500.0, 1.0
+        )
+        self._name_masks = {}
+        self._postings = None
+        self._postings_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.columns["product_id"])
+
+    def _masks(self, values: list, multi: bool = False) -> dict:
+        masks = {}
+        for i, value in enumerate(values):
+            for v in (value or []) if multi else [value]:
+                if v is None:
+                    continue
+                if v not in masks:
+                    masks[v] = np.zeros(len(values), dtype=bool)
+                masks[v][i] = True
+        return masks
+
+    def _empty(self) -> np.ndarray:
+        return np.zeros(len(self), dtype=bool)
+
+    def price_mask(self, max_price: Optional[int], min_price: Optional[int]) -> np.ndarray:
+        mask = np.ones(len(self), dtype=bool)
+        # NaN prices fail both comparisons, like NULL in SQL
+        if max_price is not None:
+            mask &= self.price <= max_price
+        if min_price is not None:
+            mask &= self.price >= min_price
+        return mask
+
+    def colour_mask(self, colour_mode: Optional[str], filters: dict) -> np.ndarray:
+        if colour_mode == "family":
+            return self.family_masks.get(filters["colour_family"], self._empty())
+        mask = self._empty()
+        for value in filters["colour_values"] or []:
+            mask = mask | self.colour_masks.get(value, self._empty())
+        return mask
+
+    def category_mask(self, category_mode: Optional[str], filters: dict) -> np.ndarray:
+        if category_mode == "column":
+            return self.category_masks.get(filters["category"], self._empty())
+        mask = self._empty()
+        for pattern in filters["name_patterns"]:
+            term = pattern.strip("%").lower()
+            if term not in self._name_masks:
+                self._name_masks[term] = np.char.find(self.lower_names, term) >= 0
+            mask = mask | self._name_masks[term]
+        return mask
+
+    def search(self, query_embedding, filters: dict, colour_mode: Optional[str],
+               category_mode: Optional[str], tiers: list, top_k: int, text: str = "",
+               pool: Optional[int] = None, rrf_k: int = 60) -> list:
+        """
+        Runs the same fallback cascade as the SQL path. `tiers` is search's tier plan
+        of (tier, category_match, uses colour, uses category); `text` the words to
+        match lexically and `pool` the candidates per retriever (default top_k).
+        Rows come back in the SQL column order, scored like the SQL tiers, with the
+        tier that produced them last.
+        """
+        similarities = self._similarities(query_embedding)
+        text_scores = self.text_scores(text)
+        masks = self._tier_masks(filters, colour_mode, category_mode)
+        pool = max(pool or top_k, top_k)
+
+        for tier, category_match, uses_colour, uses_category in tiers:
+            candidates = np.flatnonzero(masks(uses_colour, uses_category))
+            if not candidates.size:
+                continue
+            fused = {}
+            for scores, rows in ((similarities, candidates),
+                                 (text_scores, candidates[text_scores[candidates] > 0])):
+                if not rows.size:
+                    continue
+                for rank, i in enumerate(self._nearest(scores, rows, pool), start=1):
+                    fused[i] = fused.get(i, 0.0) + 1.0 / (rrf_k + rank)
+            scored = [
+                (0.6 * rrf * (rrf_k + 1) / 2 + 0.3 * category_match + 0.1 * self.popularity[i], i)
+                for i, rrf in fused.items()
+            ]
+            scored.sort(key=lambda item: (-item[0], item[1]))
+            return [self._row(i, float(similarities[i]), category_match, tier, float(score))
+                    for score, i in scored[:top_k]]
+        return []
+
+    def text_scores(self, text: str) -> np.ndarray:
+        """Per-row lexical score for the OR of the words in `text` (0 where nothing matches)."""
+        scores = np.zeros(len(self), dtype=np.float64)
+        postings = self._text_postings()
+        for term in dict.fromkeys(text_terms(text)):
+            if term in postings:
+                rows, weights = postings[term]
+                scores[rows] += weights
+        return scores
+
+    def _text_postings(self) -> dict:
+        """term -> (rows, weights), built on the first lexical query."""
+        if self._postings is None:
+            with self._postings_lock:
+                if self._postings is None:
+                    postings = {}
+                    c = self.columns
+                    for i, (name, brand, description) in enumerate(zip(c["name"], c["brand"], c["description"])):
+                        weights = {}
+                        for weight, text in zip(_TEXT_WEIGHTS, (f"{name or ''} {brand or ''}", description)):
+                            for term in text_terms(text):
+                                weights[term] = max(weights.get(term, 0.0), weight)
+                        for term, weight in weights.items():
+                            postings.setdefault(term, ([], []))
+                            postings[term][0].append(i)
+                            postings[term][1].append(weight)
+                    self._postings = {
+                        term: (np.array(rows, dtype=np.int64), np.array(weights, dtype=np.float64))
+                        for term, (rows, weights) in postings.items()
+                    }
+        return self._postings
+
+    def search_after(self, query_embedding, filters: dict, colour_mode: Optional[str],
+                     category_mode: Optional[str], tier_entry: tuple, k: int,
+                     after: Optional[float] = None, exclude=()) -> list:
+        """
+        fetch_more for one tier: the k nearest rows at cosine distance >= `after`
+        whose product_id is not in `exclude`, each as (distance, *row).
+        """
+        tier, category_match, uses_colour, uses_category = tier_entry
+        similarities = self._similarities(query_embedding)
+        distances = 1 - similarities
+        mask = self._tier_masks(filters, colour_mode, category_mode)(uses_colour, uses_category)
+        if after is not None:
+            mask = mask & (distances >= after)
+        if len(exclude):
+            mask = mask & ~np.isin(self.product_ids, list(exclude))
+        candidates = np.flatnonzero(mask)
+        if not candidates.size:
+            return []
+        return [(float(distances[i]), *self._row(i, float(similarities[i]), category_match, tier))
+                for i in self._nearest(similarities, candidates, k)]
+
+    def similar(self, product_id: str, k: int, scope: str = "any") -> list:
+        """
+        "More like this" from the snapshot, scoped like neighbors.py (products
+        without the attribute are unrestricted). Rows are shaped like SIMILAR_SQL's.
+        """
+        matches = np.flatnonzero(self.product_ids == product_id)
+        if not matches.size:
+            return []
+        row = matches[0]
+        mask = np.ones(len(self), dtype=bool)
+        category = self.columns["category"][row]
+        if scope in ("category", "both") and category:
+            mask &= self.category_masks.get(category, self._empty())
+        families = self.columns["colour_family"][row] or []
+        if scope in ("colour_family", "both") and families:
+            shared = self._empty()
+            for family in families:
+                shared = shared | self.family_masks.get(family, self._empty())
+            mask &= shared
+        mask[row] = False
+        candidates = np.flatnonzero(mask)
+        if not candidates.size or k <= 0:
+            return []
+        similarities = self.embeddings @ self.embeddings[row]
+        return [self._row(i, float(similarities[i]), 0, 0) for i in self._nearest(similarities, candidates, k)]
+
+    def _similarities(self, query_embedding) -> np.ndarray:
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        return self.embeddings @ (query / norm if norm else query)
+
+    def _tier_masks(self, filters: dict, colour_mode: Optional[str], category_mode: Optional[str]):
+        """Returns mask(uses_colour, uses_category); the filter masks are built once per query."""
+        base = self.price_mask(filters["max_price"], filters["min_price"])
+        colour = self.colour_mask(colour_mode, filters) if colour_mode else None
+        category = self.category_mask(category_mode, filters) if category_mode else None
+
+        def mask(uses_colour: bool, uses_category: bool) -> np.ndarray:
+            m = base
+            if uses_colour:
+                m = m & colour
+            if uses_category:
+                m = m & category
+            return m
+        return mask
+
+    @staticmethod
+    def _nearest(similarities: np.ndarray, candidates: np.ndarray, k: int) -> np.ndarray:
+        k = min(k, candidates.size)
+        top = candidates[np.argpartition(-similarities[candidates], k - 1)[:k]]
+        return top[np.argsort(-similarities[top], kind="stable")]
+
+    def _row(self, i: int, similarity: float, category_match: int, tier: int, score: Optional[float] = None) -> tuple:
+        c = self.columns
+        return (c["product_id"][i], c["name"][i], c["price"][i], c["colour"][i], c["brand"][i], c["img"][i],
+                c["description"][i], c["avg_rating"][i], c["rating_count"][i], similarity, category_match, score, tier)
+
+
+def snapshot_stamp(path: str = MEMORY_INDEX_PATH) -> Optional[tuple]:
+    """(directory, inode, mtime) of the current generation's columns.json; changes with every publish."""
+    directory = snapshot_dir(path)
+    try:
+        st = os.stat(os.path.join(directory or path, "columns.json"))
+    except FileNotFoundError:
+        return None
+    return os.path.basename(directory), st.st_ino, st.st_mtime_ns
+
+
+def _postgres_catalog_version() -> int:
+    return get_pool().run(catalog_version)
+
+
+class MemoryIndexHandle:
+    """
+    The live MemoryIndex for one snapshot path. At most every `check_interval`
+    seconds, get() reloads the index if the snapshot on disk changed and starts a
+    background rebuild if `version_fn` reports a catalog version the snapshot was
+    not built from, unless another build holds the lock (its publish is picked up
+    by the reload check). A failing version read keeps the current index.
+    `build_fn(path, wait)` is build_snapshot's signature.
+    """
+
+    def __init__(self, path: str = MEMORY_INDEX_PATH, version_fn: Callable[[], int] = _postgres_catalog_version,
+                 check_interval: float = MEMORY_RELOAD_CHECK, build_fn: Callable = build_snapshot):
+        self.path = path
+        self._version_fn = version_fn
+        self.check_interval = check_interval
+        self._build = build_fn
+        self._index = None
+        self._lock = threading.Lock()
+        self._checked = 0.0
+        self._rebuild_thread = None
+        self.stats = {"reloads": 0, "rebuilds": 0, "rebuild_failures": 0, "version_errors": 0}
+
+    def get(self) -> MemoryIndex:
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    if snapshot_stamp(self.path) is None:
+                        self._build(self.path)
+                    self._index = MemoryIndex(self.path)
+                    self._checked = time.monotonic()
+            return self._index
+        now = time.monotonic()
+        if now - self._checked >= self.check_interval:
+            self._checked = now
+            self._check()
+        return self._index
+
+    def _check(self):
+        if snapshot_stamp(self.path) not in (None, self._index.stamp):
+            self.reload()
+        try:
+            version = self._version_fn()
+        except Exception:
+            self.stats["version_errors"] += 1
+            return
+        if version != self._index.catalog_version and not snapshot_locked(self.path):
+            self._start_rebuild()
+
+    def reload(self) -> MemoryIndex:
+        """Swaps in a freshly loaded snapshot; in-flight searches keep the old one."""
+        index = MemoryIndex(self.path)
+        with self._lock:
+            self._index = index
+            self.stats["reloads"] += 1
+        return index
+
+    def _start_rebuild(self):
+        with self._lock:
+            if self._rebuild_thread is not None and self._rebuild_thread.is_alive():
+                return
+            self._rebuild_thread = threading.Thread(target=self._rebuild, name="memory-snapshot", daemon=True)
+            self._rebuild_thread.start()
+
+    def _rebuild(self):
+        try:
+            rows = self._build(self.path, wait=False)
+        except Exception:
+            self.stats["rebuild_failures"] += 1
+            return
+        if rows is None:    # lost the race for the lock; the winner's snapshot is reloaded
+            return
+        self.stats["rebuilds"] += 1
+        self.reload()
+
+
+_handles = {}
+_handles_lock = threading.Lock()
+
+
+def get_memory_handle(path: str = MEMORY_INDEX_PATH) -> MemoryIndexHandle:
+    if path not in _handles:
+        with _handles_lock:
+            _handles.setdefault(path, MemoryIndexHandle(path))
+    return _handles[path]
+
+
+def get_memory_index(path: str = MEMORY_INDEX_PATH) -> MemoryIndex:
+    """Process-wide index, building the snapshot from Postgres on first use if missing."""
+    return get_memory_handle(path).get()
+
+
+def reload_memory_index(path: str = MEMORY_INDEX_PATH) -> MemoryIndex:
+    """Swaps in a freshly loaded snapshot; in-flight searches keep the old one."""
+    return get_memory_handle(path).reload()
+
+
+if __name__ == "__main__":
+    print(f"Wrote {build_snapshot()} rows to {MEMORY_INDEX_PATH}")
@@ -0,0 +1,293 @@
+# neighbors.py
+"""
+Precomputed "similar items" for the product details view.
+
+product_neighbors holds, per product, the NEIGHBORS_COUNT most similar products
+by cosine similarity, optionally only among products sharing its category and/or
+colour family. They are computed in one vectorized pass over the embeddings (a
+block of products against the whole catalog per matrix product), so the details
+view only needs a primary-key lookup.
+
+ingest.py refreshes the table after every load. The refresh is incremental:
+only products that changed, lost a neighbor or would gain a changed product
+among their top N are recomputed.
+
+    python neighbors.py            # refresh
+    python neighbors.py --full     # recompute every product
+"""
+import argparse
+import os
+import time
+from typing import Optional
+
+import numpy as np
+from psycopg2.extras import execute_values
+
+from db import connect
+from taxonomy import COLOR_FAMILY_MAP
+
+NEIGHBORS_COUNT = int(os.getenv("NEIGHBORS_COUNT", "8"))
+# "any", "category", "colour_family" or "both"; products without the attribute are unrestricted
+NEIGHBORS_SCOPE = os.getenv("NEIGHBORS_SCOPE", "category")
+NEIGHBORS_BLOCK_SIZE = int(os.getenv("NEIGHBORS_BLOCK_SIZE", "256"))   # products per matrix product
+SCOPES = ("any", "category", "colour_family", "both")
+
+EMBEDDING_DIM = 768
+_FETCH_SIZE = 2000
+
+NEIGHBORS_DDL = """
+CREATE TABLE IF NOT EXISTS product_neighbors (
+    product_id TEXT PRIMARY KEY,
+    neighbor_ids TEXT[] NOT NULL,
+    similarities REAL[] NOT NULL,
+    source_hash TEXT NOT NULL,
+    settings TEXT NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+"""
+
+# changes to any of these invalidate a product's neighbors
+SOURCE_HASH_SQL = "md5(concat_ws('|', text_hash, category, array_to_string(colour_family, ',')))"
+
+# neighbors in rank order, as rows shaped like the search cascade's
+SIMILAR_SQL = """
+SELECT p.product_id, p.name, p.price, p.colour, p.brand, p.img, p.description, p.avg_rating, p.rating_count,
+       n.similarity, 0 AS category_match, NULL::float8 AS score, 0 AS tier
+FROM product_neighbors pn
+CROSS JOIN LATERAL unnest(pn.neighbor_ids, pn.similarities) WITH ORDINALITY AS n(neighbor_id, similarity, rank)
+JOIN myntra_products p ON p.product_id = n.neighbor_id
+WHERE pn.product_id = $1
+ORDER BY n.rank
+LIMIT $2
+"""
+SIMILAR_PARAM_TYPES = ("text", "int")
+
+_FAMILY_BITS = {family: 1 << i for i, family in enumerate(sorted(COLOR_FAMILY_MAP))}
+
+
+def _check_scope(scope: str) -> str:
+    if scope not in SCOPES:
+        raise ValueError(f"Unknown neighbors scope: {scope} (expected one of {SCOPES})")
+    return scope
+
+
+class Catalog:
+    """Normalized embeddings plus the attributes the scope restricts on, one row per product."""
+
+    def __init__(self, conn):
+        with conn.cursor() as cur:
+            cur.execute("SELECT COUNT(*) FROM myntra_products WHERE embedding IS NOT NULL;")
+            count = cur.fetchone()[0]
+
+        self.embeddings = np.zeros((count, EMBEDDING_DIM), dtype=np.float32)
+        self.product_ids, self.source_hashes = [], []
+        categories, families = [], []
+        with conn.cursor(name="neighbors_catalog") as cur:
+            cur.itersize = _FETCH_SIZE
+            cur.execute(f"""
+                SELECT product_id, category, colour_family, {SOURCE_HASH_SQL}, embedding::real[]
+                FROM myntra_products WHERE embedding IS NOT NULL ORDER BY product_id;
+            """)
+            i = 0
+            for product_id, category, colour_family, source_hash, embedding in cur:
+                if i >= count:
+                    break
+                self.product_ids.append(product_id)
+                self.source_hashes.append(source_hash)
+                categories.append(category)
+                families.append(colour_family or [])
+                vec = np.asarray(embedding, dtype=np.float32)
+                norm = np.linalg.norm(vec)
+                self.embeddings[i] = vec / norm if norm else vec
+                i += 1
+        conn.rollback()
+
+        self.embeddings = self.embeddings[:i]
+        self._index_attributes(categories, families)
+
+    @classmethod
+    def from_arrays(cls, product_ids: list, embeddings: np.ndarray, categories: list, families: list,
+                    source_hashes: list) -> "Catalog":
+        """A catalog from in-memory rows (embeddings normalized here), e.g. for tests."""
+        catalog = cls.__new__(cls)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        catalog.embeddings = (embeddings / np.where(norms == 0, 1, norms)).astype(np.float32)
+        catalog.product_ids, catalog.source_hashes = list(product_ids), list(source_hashes)
+        catalog._index_attributes(list(categories), [f or [] for f in families])
+        return catalog
+
+    def _index_attributes(self, categories: list, families: list):
+        self.position = {pid: n for n, pid in enumerate(self.product_ids)}
+        codes = {c: n for n, c in enumerate(sorted({c for c in categories if c}))}
+        self.category_codes = np.array([codes.get(c, -1) for c in categories], dtype=np.int32)
+        self.family_bits = np.array(
+            [sum(_FAMILY_BITS.get(f, 0) for f in set(fam)) for fam in families], dtype=np.int64
+        )
+
+    def __len__(self):
+        return len(self.product_ids)
+
+    def scope_mask(self, rows: np.ndarray, cols: Optional[np.ndarray], scope: str) -> Optional[np.ndarray]:
+        """(len(rows), len(cols)) mask of allowed pairs, or None when everything is."""
+        mask = None
+        if scope in ("category", "both"):
+            codes = self.category_codes if cols is None else self.category_codes[cols]
+            row_codes = self.category_codes[rows][:, None]
+            mask = (row_codes == codes[None, :]) | (row_codes < 0)
+        if scope in ("colour_family", "both"):
+            bits = self.family_bits if cols is None else self.family_bits[cols]
+            row_bits = self.family_bits[rows][:, None]
+            shared = ((row_bits & bits[None, :]) != 0) | (row_bits == 0)
+            mask = shared if mask is None else mask & shared
+        return mask
+
+
+def top_neighbors(catalog: Catalog, rows: np.ndarray, count: int = NEIGHBORS_COUNT,
+                  scope: str = NEIGHBORS_SCOPE, block_size: int = NEIGHBORS_BLOCK_SIZE):
+    """Yields (row, neighbor rows, similarities) for `rows`, most similar first."""
+    k = min(count, len(catalog) - 1)
+    if k <= 0:
+        for row in rows:
+            yield row, np.array([], dtype=np.int64), np.array([], dtype=np.float32)
+        return
+    for start in range(0, len(rows), block_size):
+        block = rows[start:start + block_size]
+        sims = catalog.embeddings[block] @ catalog.embeddings.T
+        mask = catalog.scope_mask(block, None, scope)
+        if mask is not None:
+            sims[~mask] = -np.inf
+        sims[np.arange(len(block)), block] = -np.inf      # never its own neighbor
+        top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+        top_sims = np.take_along_axis(sims, top, axis=1)
+        order = np.argsort(-top_sims, axis=1, kind="stable")
+        top = np.take_along_axis(top, order, axis=1)
+        top_sims = np.take_along_axis(top_sims, order, axis=1)
+        for row, neighbors, similarities in zip(block, top, top_sims):
+            keep = np.isfinite(similarities)
+            yield row, neighbors[keep], similarities[keep]
+
+
+def _stored(cur) -> dict:
+    """product_id -> (neighbor_ids, weakest similarity, source_hash, settings)."""
+    cur.execute("""
+        SELECT product_id, neighbor_ids, similarities[array_upper(similarities, 1)], source_hash, settings
+        FROM product_neighbors;
+    """)
+    return {pid: (ids, kth, source_hash, settings) for pid, ids, kth, source_hash, settings in cur.fetchall()}
+
+
+def _affected(catalog: Catalog, stored: dict, count: int, scope: str, block_size: int) -> np.ndarray:
+    """Rows whose neighbor list may differ from the stored one."""
+    n = len(catalog)
+    changed = np.array([
+        pid not in stored or stored[pid][2] != source_hash
+        for pid, source_hash in zip(catalog.product_ids, catalog.source_hashes)
+    ], dtype=bool)
+    invalid = {pid for pid, i in catalog.position.items() if changed[i]}
+    invalid |= set(stored) - set(catalog.position)
+
+    affected = changed.copy()
+    kth = np.full(n, -np.inf, dtype=np.float32)
+    for pid, (ids, weakest, _, _) in stored.items():
+        i = catalog.position.get(pid)
+        if i is None:
+            continue
+        if invalid.intersection(ids or []):
+            affected[i] = True
+        if ids and len(ids) >= min(count, n - 1) and weakest is not None:
+            kth[i] = weakest
+
+    # unchanged products gain a changed one when it beats their current weakest neighbor
+    changed_rows = np.flatnonzero(changed)
+    if changed_rows.size:
+        changed_emb = catalog.embeddings[changed_rows]
+        for start in range(0, n, block_size):
+            block = np.arange(start, min(start + block_size, n))
+            sims = catalog.embeddings[block] @ changed_emb.T
+            mask = catalog.scope_mask(block, changed_rows, scope)
+            if mask is not None:
+                sims[~mask] = -np.inf
+            sims[block[:, None] == changed_rows[None, :]] = -np.inf
+            affected[block] |= sims.max(axis=1) > kth[block]
+    return np.flatnonzero(affected)
+
+
+def rows_to_refresh(catalog: Catalog, stored: dict, full: bool = False, count: int = NEIGHBORS_COUNT,
+                    scope: str = NEIGHBORS_SCOPE, block_size: int = NEIGHBORS_BLOCK_SIZE):
+    """(rows to recompute, whether that is all of them); a scope or count change forces a full pass."""
+    settings = f"{scope}/{count}"
+    if full or any(s != settings for _, _, _, s in stored.values()):
+        return np.arange(len(catalog)), True
+    return _affected(catalog, stored, count, scope, block_size), False
+
+
+def refresh_neighbors(conn=None, full: bool = False, count: int = NEIGHBORS_COUNT,
+                      scope: str = NEIGHBORS_SCOPE, block_size: int = NEIGHBORS_BLOCK_SIZE) -> dict:
+    """
+    Brings product_neighbors in line with myntra_products. Everything is recomputed
+    when `full` is set or the scope or count changed since the last refresh.
+    """
+    _check_scope(scope)
+    own_conn = conn is None
+    conn = conn or connect()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(NEIGHBORS_DDL)
+            stored = _stored(cur)
+        conn.commit()
+
+        catalog = Catalog(conn)
+        settings = f"{scope}/{count}"
+        rows, full = rows_to_refresh(catalog, stored, full, count, scope, block_size)
+
+        values = []
+        with conn.cursor() as cur:
+            for row, neighbors, similarities in top_neighbors(catalog, rows, count, scope, block_size):
+                values.append((
+                    catalog.product_ids[row], [catalog.product_ids[j] for j in neighbors],
+                    [float(s) for s in similarities], catalog.source_hashes[row], settings,
+                ))
+                if len(values) >= _FETCH_SIZE:
+                    _upsert(cur, values)
+                    values = []
+            if values:
+                _upsert(cur, values)
+            cur.execute("""
+                DELETE FROM product_neighbors pn
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM myntra_products p WHERE p.product_id = pn.product_id AND p.embedding IS NOT NULL
+                );
+            """)
+            deleted = cur.rowcount
+        conn.commit()
+    finally:
+        if own_conn:
+            conn.close()
+    return {"products": len(catalog), "recomputed": len(rows), "deleted": deleted, "full": full}
+
+
+def _upsert(cur, values: list):
+    execute_values(cur, """
+        INSERT INTO product_neighbors (product_id, neighbor_ids, similarities, source_hash, settings)
+        VALUES %s
+        ON CONFLICT (product_id) DO UPDATE SET
+            neighbor_ids = EXCLUDED.neighbor_ids, similarities = EXCLUDED.similarities,
+            source_hash = EXCLUDED.source_hash, settings = EXCLUDED.settings, updated_at = now();
+    """, values, template="(%s, %s::text[], %s::real[], %s, %s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Refresh the product_neighbors table.")
+    parser.add_argument("--full", action="store_true", help="recompute every product")
+    parser.add_argument("--count", type=int, default=NEIGHBORS_COUNT)
+    parser.add_argument("--scope", choices=SCOPES, default=NEIGHBORS_SCOPE)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    stats = refresh_neighbors(full=args.full, count=args.count, scope=args.scope)
+    print("Neighbors refreshed in {:.1f}s: {recomputed} of {products} products recomputed, "
+          "{deleted} removed".format(time.perf_counter() - started, **stats))
+
+
+if __name__ == "__main__":
+    main()
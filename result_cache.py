@@ -0,0 +1,160 @@
+# result_cache.py
+"""
+Cross-session cache of search_products results, keyed on the resolved search
+(normalized rewrite, filters, top_k) and tied to the catalog version that
+ingest.py bumps, so cached results never outlive a re-ingest.
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from psycopg2 import errors
+
+from embedding_cache import normalize_query
+
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "1024"))                    # entries; 0 disables
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "300"))                     # seconds
+RESULT_CACHE_VERSION_CHECK = float(os.getenv("RESULT_CACHE_VERSION_CHECK", "5"))   # seconds between version reads
+
+CATALOG_META_DDL = """
+CREATE TABLE IF NOT EXISTS catalog_meta (
+    id INT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+"""
+
+
+def catalog_version(conn) -> int:
+    """Current catalog version (0 before the first versioned ingest)."""
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT version FROM catalog_meta WHERE id = 1;")
+            row = cur.fetchone()
+    except errors.UndefinedTable:
+        conn.rollback()
+        return 0
+    return row[0] if row else 0
+
+
+def bump_catalog_version(cur) -> int:
+    """Called by ingest.py once the new catalog is committed; invalidates every cached result."""
+    cur.execute(CATALOG_META_DDL)
+    cur.execute("""
+        INSERT INTO catalog_meta (id, version) VALUES (1, 1)
+        ON CONFLICT (id) DO UPDATE SET version = catalog_meta.version + 1, updated_at = now()
+        RETURNING version;
+    """)
+    return cur.fetchone()[0]
+
+
+class ResultCache:
+    """
+    LRU of result lists with a TTL. The catalog version is read through
+    `version_fn` at most every `version_check` seconds; when it changes the cache
+    is emptied, so a re-ingest is picked up within that interval. While the
+    version can't be read the cache is bypassed (every get misses, set is a
+    no-op) rather than serving results it can't vouch for.
+    """
+
+    def __init__(self, version_fn: Callable[[], int], max_entries: int = RESULT_CACHE_SIZE,
+                 ttl: float = RESULT_CACHE_TTL, version_check: float = RESULT_CACHE_VERSION_CHECK):
+        self._version_fn = version_fn
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.version_check = version_check
+        self._entries = OrderedDict()   # key -> (expires_at, results, meta)
+        self._lock = threading.Lock()
+        self._version = None
+        self._version_checked = 0.0
+        self._version_ok = True
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0, "version_errors": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    @staticmethod
+    def make_key(rewritten: str, filters: dict, top_k: int, **extra) -> str:
+        payload = {
+            "q": normalize_query(rewritten),
+            "colour_family": filters.get("colour_family"),
+            "colour_values": sorted(filters.get("colour_values") or []),
+            "category": filters.get("category"),
+            "name_patterns": sorted(filters.get("name_patterns") or []),
+            "min_price": filters.get("min_price"),
+            "max_price": filters.get("max_price"),
+            "top_k": top_k,
+            **extra,
+        }
+        return json.dumps(payload, sort_keys=True, default=str)
+
+    def _check_version(self, now: float) -> bool:
+        """False while the version is unreadable."""
+        if now - self._version_checked < self.version_check:
+            return self._version_ok
+        self._version_checked = now
+        try:
+            version = self._version_fn()
+        except Exception:
+            with self._lock:
+                self._version_ok = False
+                self.stats["version_errors"] += 1
+            return False
+        with self._lock:
+            self._version_ok = True
+            if self._version is not None and version != self._version:
+                self._entries.clear()
+                self.stats["invalidations"] += 1
+            self._version = version
+        return True
+
+    def get(self, key: str) -> Optional[list]:
+        entry = self.get_entry(key)
+        return entry[0] if entry else None
+
+    def get_entry(self, key: str) -> Optional[tuple]:
+        """(results, meta) for a live entry, else None."""
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        if not self._check_version(now):
+            with self._lock:
+                self.stats["misses"] += 1
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return [dict(r) for r in entry[1]], dict(entry[2])
+            if entry:
+                del self._entries[key]
+            self.stats["misses"] += 1
+            return None
+
+    def set(self, key: str, results: list, meta: Optional[dict] = None):
+        if not self.enabled or not self._version_ok:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, [dict(r) for r in results], dict(meta or {}))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self._entries)
+            stats["catalog_version"] = self._version
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
@@ -1,52 +1,62 @@
 # search.py
+import json
 import os
 import re
-import psycopg2
 from sentence_transformers import SentenceTransformer
 from dotenv import load_dotenv
 from llm_client import rewrite_query, extract_intent
+from vector_index import (ORDERED_ITERATIVE_SCAN, VECTOR_QUANTIZATION, coarse_distance_sql, recall_mode_sql,
+                          rerank_candidates)
+from db import execute_prepared, get_pool
+from embedding_cache import EmbeddingCache
+from memory_backend import get_memory_index
+from neighbors import NEIGHBORS_SCOPE, SIMILAR_PARAM_TYPES, SIMILAR_SQL
+from result_cache import ResultCache, catalog_version
+import timing
+from taxonomy import COLOR_FAMILY_MAP, CATEGORY_ALIAS_MAP, category_for_term
+from intent_rules import INTENT_RULES_MIN_CONFIDENCE, parse_intent
 import streamlit as st
+import psycopg2
+from psycopg2 import errors, pool
 import difflib
+import logging
+import hashlib
 import functools
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Tuple, Optional
 
 load_dotenv()
 
-DB_NAME = os.getenv("DB_NAME", "testdb")
-DB_USER = os.getenv("DB_USER", "aaryagodbole")
-DB_PASS = os.getenv("DB_PASS", "")
-DB_HOST = os.getenv("DB_HOST", "localhost")
-DB_PORT = os.getenv("DB_PORT", "5432")
+# "postgres" runs the cascade in pgvector; "memory" answers from memory_backend's snapshot
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "postgres")
+
+logger = logging.getLogger("search")
+
+# extract_intent and rewrite_query are independent network calls; run them side by side
+_llm_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="search-llm")
+# search_products_batch understands its queries concurrently; each of those waits on _llm_executor
+_batch_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="search-batch")
 
 @st.cache_resource(show_spinner=False)
 def get_model():
     return SentenceTransformer("sentence-transformers/all-mpnet-base-v2")
 
-def get_db():
-    return psycopg2.connect(
-        dbname=DB_NAME, user=DB_USER, password=DB_PASS, host=DB_HOST, port=DB_PORT
-    )
+# the query encoder is the largest local CPU cost per search
+query_embeddings = EmbeddingCache(
+    lambda text: get_model().encode(text),
+    max_entries=int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "2048")),
+    encode_many_fn=lambda texts: get_model().encode(texts),
+)
 
-COLOR_FAMILY_MAP = {
-    "red": ["red","maroon","magenta","rust","coral","peach"],
-    "blue": ["blue","navy blue","turquoise blue","teal","sea green"],
-    "green": ["green","olive","lime green","fluorescent green"],
-    "white": ["white","off white"],
-    "black": ["black","charcoal"],
-    "grey": ["grey","gray"],
-    "pink": ["pink","peach","lavender"],
-    "purple": ["purple","magenta"],
-    "orange": ["orange","rust"],
-}
+def backend_version():
+    """What cached results depend on: the loaded snapshot in memory mode, else the catalog version."""
+    if SEARCH_BACKEND == "memory":
+        index = get_memory_index()
+        return index.catalog_version, index.stamp
+    return get_pool().run(catalog_version)
 
-CATEGORY_ALIAS_MAP = {
-    "saree": ["saree", "sari", "drape", "pleats", "pallu", "zari", "border", "banarasi", "kanjeevaram", "silk saree"],
-    "kurti": ["kurti","kurta","tunic"],
-    "dress": ["dress","gown","one piece","anarkali"],
-    "shirt": ["shirt","top","tee","blouse"],
-    "jeans": ["jean","jeans","denim"],
-    "jacket": ["jacket","coat"],
-}
+# identical resolved searches from any session share one result list
+result_cache = ResultCache(version_fn=backend_version)
 
 def clean_description(text: str, max_len: int = 300) -> str:
     if not text: return ""
@@ -58,13 +68,14 @@ def clean_description(text: str, max_len: int = 300) -> str:
 
 @functools.lru_cache(maxsize=1)
 def get_distinct_colours_from_db() -> List[str]:
-    conn = get_db()
-    try:
+    if SEARCH_BACKEND == "memory":
+        return sorted(get_memory_index().colour_masks)
+
+    def fetch(conn):
         with conn.cursor() as cur:
             cur.execute("SELECT DISTINCT TRIM(LOWER(colour)) FROM myntra_products WHERE COALESCE(colour,'') <> ''")
             return [r[0] for r in cur.fetchall() if r and r[0]]
-    finally:
-        conn.close()
+    return get_pool().run(fetch)
 
 def resolve_color_values(user_color: Optional[str]) -> Optional[List[str]]:
     if not user_color: return None
@@ -97,93 +108,544 @@ def build_price_clause(max_price, min_price) -> Tuple[str, List]:
         
     return (" AND " + " AND ".join(parts), params) if parts else ("", [])
 
-def search_products(user_query: str, top_k: int = 8):
-    try:
-        intent = extract_intent(user_query) or {}
-        rewritten = rewrite_query(user_query) or user_query
-    except:
-        intent, rewritten = {}, user_query
+def _price_bound(value) -> Optional[int]:
+    return int(value) if value is not None and str(value).isdigit() else None
+
+def resolve_filters(intent: dict) -> dict:
+    """
+    Turns intent into the filters the cascade runs on. Known colour families and
+    categories hit the columns ingest derives (colour_family / category) with
+    indexed equality; anything else falls back to colour values / name patterns.
+    """
+    color_intent = str(intent.get("color") or intent.get("colour") or "").strip().lower()
+    category_intent = str(intent.get("category") or "").strip().lower()
+
+    filters = {
+        "colour_family": None, "colour_values": [], "category": None, "name_patterns": [],
+        "max_price": _price_bound(intent.get("max_price")),
+        "min_price": _price_bound(intent.get("min_price")),
+    }
+    if color_intent in COLOR_FAMILY_MAP:
+        filters["colour_family"] = color_intent
+    elif color_intent:
+        filters["colour_values"] = resolve_color_values(color_intent)
+
+    category = category_for_term(category_intent)
+    if category:
+        filters["category"] = category
+    elif category_intent:
+        filters["name_patterns"] = [f"%{category_intent}%"]
+    return filters
+
+def _filter_modes(filters: dict) -> Tuple[Optional[str], Optional[str]]:
+    colour_mode = "family" if filters["colour_family"] else "values" if filters["colour_values"] else None
+    category_mode = "column" if filters["category"] else "name" if filters["name_patterns"] else None
+    return colour_mode, category_mode
+
+# The whole fallback cascade runs as one statement: each tier is a CTE gated on the
+# earlier tiers being empty. The gates are uncorrelated, so Postgres evaluates them
+# once as one-time filters and never starts the scan of a tier it does not need.
+#
+# Within a tier, retrieval is hybrid: up to $9 candidates by vector distance (taken
+# by the compact distance when the index is quantized, ranked exactly) and up to $9
+# full-text matches on search_tsv are fused with reciprocal rank fusion. The tier
+# returns its top $6 already scored, so lexical hits outside the vector top-k (brand
+# names, "banarasi") still make it in and only the final rows cross the wire.
+#
+# Parameters are the same for every variant ($1 query vector, $2 category, $3 max
+# price, $4 min price, $5 colour values, $6 limit, $7 name patterns, $8 colour
+# family, $9 candidates per retriever, $10 tsquery text, $11 RRF k), so each variant
+# is PREPAREd once per pooled connection.
+CASCADE_PARAM_TYPES = ("vector", "text", "int", "int", "text[]", "int", "text[]", "text", "int", "text", "int")
+
+SEARCH_CANDIDATE_POOL = int(os.getenv("SEARCH_CANDIDATE_POOL", "100"))
+SEARCH_RRF_K = int(os.getenv("SEARCH_RRF_K", "60"))
+
+_TIER_WHERE = "($3::int IS NULL OR price <= $3) AND ($4::int IS NULL OR price >= $4)"
+
+# score keeps the old weights, with the vector similarity replaced by the fused
+# rank normalized to (0, 1]: 0.6 * rrf + 0.3 * category_match + 0.1 * popularity
+_TIER_CTES = """
+vec{tier} AS (
+    SELECT product_id, row_number() OVER (ORDER BY distance) AS rank FROM (
+        SELECT product_id, embedding <=> $1::vector AS distance FROM myntra_products
+        WHERE {where}
+        ORDER BY {coarse_distance} LIMIT $9
+    ) candidates
+),
+txt{tier} AS (
+    SELECT product_id, row_number() OVER (ORDER BY text_rank DESC) AS rank FROM (
+        SELECT product_id, ts_rank_cd(search_tsv, to_tsquery('english', $10)) AS text_rank FROM myntra_products
+        WHERE search_tsv @@ to_tsquery('english', $10) AND {where}
+        ORDER BY text_rank DESC LIMIT $9
+    ) matches
+),
+tier{tier} AS (
+    SELECT p.product_id, p.name, p.price, p.colour, p.brand, p.img, p.description, p.avg_rating, p.rating_count,
+    1 - (p.embedding <=> $1::vector) AS similarity, {category_match} AS category_match,
+    0.6 * (COALESCE(1.0 / ($11 + v.rank), 0) + COALESCE(1.0 / ($11 + t.rank), 0)) * ($11 + 1) / 2
+        + 0.3 * {category_match} + 0.1 * LEAST(COALESCE(p.rating_count, 0) / 500.0, 1.0) AS score,
+    {tier} AS tier
+    FROM vec{tier} v FULL JOIN txt{tier} t USING (product_id)
+    JOIN myntra_products p USING (product_id)
+    ORDER BY score DESC LIMIT $6
+)"""
+COLOUR_FILTERS = {
+    "family": " AND colour_family @> ARRAY[$8]",
+    "values": " AND colour = ANY($5)",
+}
+CATEGORY_FILTERS = {
+    "column": " AND category = $2",
+    "name": " AND LOWER(name) LIKE ANY($7)",
+}
+
+TIER_STRICT, TIER_CATEGORY, TIER_COLOUR, TIER_FALLBACK = 1, 2, 3, 4
+
+RELAXED_NOTICES = {
+    TIER_CATEGORY: "No exact color matches—showing results for the style.",
+    TIER_FALLBACK: "Showing the closest items I could find.",
+}
+
+def tier_plan(colour_mode: Optional[str], category_mode: Optional[str]) -> list:
+    """(tier, category_match, uses colour, uses category) for the tiers this query can use."""
+    tiers = []
+    if colour_mode and category_mode:
+        tiers.append((TIER_STRICT, 1, True, True))
+    if category_mode:
+        tiers.append((TIER_CATEGORY, 1, False, True))
+    if colour_mode:
+        tiers.append((TIER_COLOUR, 0, True, False))
+    tiers.append((TIER_FALLBACK, 0, False, False))
+    return tiers
+
+def _cascade_tiers(colour_mode: Optional[str], category_mode: Optional[str]) -> list:
+    """(tier, category_match, filter SQL) for the tiers this query can use."""
+    return [
+        (tier, category_match,
+         (COLOUR_FILTERS[colour_mode] if uses_colour else "") +
+         (CATEGORY_FILTERS[category_mode] if uses_category else ""))
+        for tier, category_match, uses_colour, uses_category in tier_plan(colour_mode, category_mode)
+    ]
+
+def build_cascade_sql(colour_mode: Optional[str], category_mode: Optional[str],
+                      quantization: Optional[str] = None) -> str:
+    quantization = quantization or VECTOR_QUANTIZATION
+    tiers = _cascade_tiers(colour_mode, category_mode)
+    ctes = []
+    for i, (tier, category_match, tier_filter) in enumerate(tiers):
+        gates = "".join(f" AND NOT EXISTS (SELECT 1 FROM tier{prev})" for prev, _, _ in tiers[:i])
+        ctes.append(_TIER_CTES.format(
+            category_match=category_match, tier=tier, where=_TIER_WHERE + tier_filter + gates,
+            coarse_distance=coarse_distance_sql(quantization)
+        ))
+    selects = "\nUNION ALL\n".join(f"SELECT * FROM tier{tier}" for tier, _, _ in tiers)
+    return "WITH " + ",".join(ctes) + "\n" + selects + "\nORDER BY tier, score DESC"
+
+def text_query(*texts: str) -> str:
+    """OR-tsquery over the words of the query, e.g. 'red | banarasi | saree'."""
+    words = []
+    for text in texts:
+        words += [w for w in re.findall(r"[a-z0-9]+", (text or "").lower()) if not w.isdigit()]
+    return " | ".join(dict.fromkeys(words))
 
-    color_intent = intent.get("color") or intent.get("colour")
-    category_intent = intent.get("category")
-    max_price, min_price = intent.get("max_price"), intent.get("min_price")
+def vector_literal(embedding) -> str:
+    return "[" + ",".join(map(str, embedding)) + "]"
 
-    query_embedding = get_model().encode(f"{user_query}. {rewritten}").tolist()
-    color_values = resolve_color_values(color_intent)
-    category_keywords = resolve_category_keywords(category_intent)
+def cascade_params(query_embedding, filters: dict, top_k: int, quantization: Optional[str] = None,
+                   text: str = "") -> list:
+    return [
+        vector_literal(query_embedding),
+        filters["category"],
+        filters["max_price"],
+        filters["min_price"],
+        filters["colour_values"],
+        top_k,
+        filters["name_patterns"],
+        filters["colour_family"],
+        candidate_pool(top_k, quantization),
+        text or None,
+        SEARCH_RRF_K,
+    ]
 
-    conn = get_db()
-    rows = []
-    exact_filters_used = False
-    relaxed_notice = None
+def candidate_pool(top_k: int, quantization: Optional[str] = None) -> int:
+    """Rows each retriever contributes to the fusion (at least the rerank over-fetch)."""
+    return max(SEARCH_CANDIDATE_POOL, rerank_candidates(top_k, quantization), top_k)
 
+def _understand(user_query: str, intent: Optional[dict], rewritten: Optional[str]):
+    """Fills in whatever the caller did not already get from llm_client.understand_query."""
+    # a failed understand_query hands over {} and "", which must not count as answers
+    intent, rewritten = intent or None, rewritten or None
+    if intent is None and rewritten is None:
+        parsed = parse_intent(user_query)
+        if parsed["confidence"] >= INTENT_RULES_MIN_CONFIDENCE:
+            return parsed["intent"], parsed["rewritten_query"] or user_query
+
+    # in_context: the LLM spans land in this request's trace
+    intent_future = _llm_executor.submit(timing.in_context(extract_intent), user_query) if intent is None else None
+    rewrite_future = _llm_executor.submit(timing.in_context(rewrite_query), user_query) if rewritten is None else None
+    if intent_future: intent = _llm_result(intent_future, "intent extraction")
+    if rewrite_future: rewritten = _llm_result(rewrite_future, "query rewrite")
+    return intent or {}, rewritten or user_query
+
+def _llm_result(future, what: str):
     try:
+        return future.result()
+    except Exception as e:
+        logger.warning(f"{what} failed, searching without it: {e}")
+        return None
+
+def search_products(user_query: str, top_k: int = 8, recall_mode: Optional[str] = None,
+                    intent: Optional[dict] = None, rewritten: Optional[str] = None,
+                    return_cursor: bool = False):
+    """Ranked results; with return_cursor=True, (results, cursor) for fetch_more."""
+    with timing.span("search.understand"):
+        intent, rewritten = _understand(user_query, intent, rewritten)
+
+    filters = resolve_filters(intent)
+    cache_key = ResultCache.make_key(rewritten, filters, top_k, backend=SEARCH_BACKEND, recall_mode=recall_mode)
+    with timing.span("search.result_cache") as span:
+        cached = result_cache.get_entry(cache_key)
+        span["hit"] = cached is not None
+    if cached is not None:
+        results, meta = cached
+        if not return_cursor:
+            return results
+        with timing.span("search.encode"):
+            query_embedding = query_embeddings.get(f"{user_query}. {rewritten}")
+        return results, SearchCursor(query_embedding, filters, meta.get("tier"), results, recall_mode)
+
+    with timing.span("search.encode"):
+        query_embedding = query_embeddings.get(f"{user_query}. {rewritten}")
+    colour_mode, category_mode = _filter_modes(filters)
+
+    # the whole tier cascade is one statement; the span notes which tier answered
+    with timing.span(f"search.{SEARCH_BACKEND}") as span:
+        if SEARCH_BACKEND == "memory":
+            rows = get_memory_index().search(
+                query_embedding, filters, colour_mode, category_mode, tier_plan(colour_mode, category_mode), top_k,
+                text=text_query(rewritten, user_query), pool=candidate_pool(top_k), rrf_k=SEARCH_RRF_K
+            )
+        else:
+            rows = _search_postgres(
+                query_embedding, filters, colour_mode, category_mode, top_k, recall_mode,
+                text_query(rewritten, user_query)
+            )
+        span["tier"] = rows[0][-1] if rows else None
+        span["rows"] = len(rows)
+    tier = rows[0][-1] if rows else None
+    results = _to_results(rows)
+    result_cache.set(cache_key, results, {"tier": tier})
+    if return_cursor:
+        return results, SearchCursor(query_embedding, filters, tier, results, recall_mode)
+    return results
+
+def _search_postgres(query_embedding, filters: dict, colour_mode: Optional[str], category_mode: Optional[str],
+                     top_k: int, recall_mode: Optional[str], text: str = "") -> list:
+    params = cascade_params(query_embedding, filters, top_k, text=text)
+    statement = f"search_hybrid_{VECTOR_QUANTIZATION}_{colour_mode or 'any'}_{category_mode or 'any'}"
+    # the index has to yield every fusion candidate, not just top_k
+    knobs_sql, knobs_params = recall_mode_sql(recall_mode, candidate_pool(top_k))
+
+    def run_cascade(conn):
         with conn.cursor() as cur:
-            # 1. Strict Search
-            if color_values and category_keywords:
-                price_clause, price_params = build_price_clause(max_price, min_price)
-                name_like = [f"%{kw}%" for kw in category_keywords]
-                desc_like = [f"%{kw}%" for kw in category_keywords]
-                sql = f"""
-                   SELECT product_id, name, price, colour, brand, img, description, avg_rating, rating_count,
-                   1 - (embedding <=> %s::vector) AS similarity,
-                   (CASE WHEN ({" OR ".join(["LOWER(name) LIKE %s" for _ in name_like])} OR {" OR ".join(["LOWER(description) LIKE %s" for _ in desc_like])}) THEN 1 ELSE 0 END) AS category_match
-                   FROM myntra_products WHERE colour = ANY(%s) {price_clause}
-                   ORDER BY embedding <=> %s::vector LIMIT %s;
-                """
-                cur.execute(sql, [query_embedding] + name_like + desc_like + [color_values] + price_params + [query_embedding, top_k])
-                rows = cur.fetchall()
-                if rows: exact_filters_used = True
-
-            # 2. Category Only
-            if not rows and category_keywords:
-                price_clause, price_params = build_price_clause(max_price, min_price)
-                name_like = [f"%{kw}%" for kw in category_keywords]
-                desc_like = [f"%{kw}%" for kw in category_keywords]
-                sql = f"""
-                   SELECT product_id, name, price, colour, brand, img, description, avg_rating, rating_count,
-                   1 - (embedding <=> %s::vector) AS similarity,
-                   (CASE WHEN ({" OR ".join(["LOWER(name) LIKE %s" for _ in name_like])} OR {" OR ".join(["LOWER(description) LIKE %s" for _ in desc_like])}) THEN 1 ELSE 0 END) AS category_match
-                   FROM myntra_products WHERE TRUE {price_clause}
-                   ORDER BY embedding <=> %s::vector LIMIT %s;
-                """
-                cur.execute(sql, [query_embedding] + name_like + desc_like + price_params + [query_embedding, top_k])
-                rows = cur.fetchall()
-                if rows: relaxed_notice = "No exact color matches—showing results for the style."
-
-            # 3. Color Only
-            if not rows and color_values:
-                price_clause, price_params = build_price_clause(max_price, min_price)
-                sql = f"""
-                    SELECT product_id, name, price, colour, brand, img, description, avg_rating, rating_count,
-                    1 - (embedding <=> %s::vector) AS similarity, 0 as category_match
-                    FROM myntra_products WHERE colour = ANY(%s) {price_clause}
-                    ORDER BY embedding <=> %s::vector LIMIT %s;
-                """
-                cur.execute(sql, [query_embedding, color_values] + price_params + [query_embedding, top_k])
-                rows = cur.fetchall()
-
-            # 4. Fallback
-            if not rows:
-                price_clause, price_params = build_price_clause(max_price, min_price)
-                sql = f"""
-                    SELECT product_id, name, price, colour, brand, img, description, avg_rating, rating_count,
-                    1 - (embedding <=> %s::vector) AS similarity, 0 as category_match
-                    FROM myntra_products WHERE TRUE {price_clause}
-                    ORDER BY embedding <=> %s::vector LIMIT %s;
-                """
-                cur.execute(sql, [query_embedding] + price_params + [query_embedding, top_k])
-                rows = cur.fetchall()
-                relaxed_notice = "Showing the closest items I could find."
-
-    finally:
-        conn.close()
+            execute_prepared(
+                cur, statement, build_cascade_sql(colour_mode, category_mode), params,
+                CASCADE_PARAM_TYPES, prefix=knobs_sql, prefix_params=knobs_params
+            )
+            return cur.fetchall()
+
+    return get_pool().run(run_cascade)
+
+def _batch_query(query) -> dict:
+    if isinstance(query, str):
+        return {"query": query}
+    return query
+
+def combination_queries(intent: dict) -> list:
+    """
+    search_products_batch queries for a combination intent ({"primary_item",
+    "pair_with"}): one per item. The budget applies to both, the colour only to
+    the primary item. [] for any other intent.
+    """
+    items = [intent.get("primary_item"), intent.get("pair_with")]
+    if not all(isinstance(item, str) and item.strip() for item in items):
+        return []
+    budget = {k: intent[k] for k in ("min_price", "max_price") if intent.get(k) is not None}
+    colour = str(intent.get("color") or intent.get("colour") or "").strip()
+    primary, pair = (item.strip() for item in items)
+    return [
+        {"query": f"{colour} {primary}".strip(), "rewritten": f"{colour} {primary}".strip(),
+         "intent": {**budget, "color": colour or None, "category": primary}},
+        {"query": pair, "rewritten": pair, "intent": {**budget, "category": pair}},
+    ]
+
+def search_products_batch(queries: list, top_k: int = 8, recall_mode: Optional[str] = None) -> list:
+    """
+    search_products for several queries at once, e.g. both halves of an outfit or a
+    nightly precompute. Each query is a string or a dict with "query" and optional
+    "intent" / "rewritten". Cache misses are encoded in one model call and searched
+    in one statement; returns one result list per query, in order.
+    """
+    queries = [_batch_query(q) for q in queries]
+    with timing.span("search.batch.understand", queries=len(queries)):
+        futures = [
+            _batch_executor.submit(timing.in_context(_understand), q["query"], q.get("intent"), q.get("rewritten"))
+            for q in queries
+        ]
+        understood = [f.result() for f in futures]
+
+    results = [None] * len(queries)
+    pending = []
+    for i, (q, (intent, rewritten)) in enumerate(zip(queries, understood)):
+        filters = resolve_filters(intent)
+        cache_key = ResultCache.make_key(rewritten, filters, top_k, backend=SEARCH_BACKEND, recall_mode=recall_mode)
+        results[i] = result_cache.get(cache_key)
+        if results[i] is None:
+            pending.append((i, q["query"], rewritten, filters, cache_key))
+    if not pending:
+        return results
+
+    with timing.span("search.batch.encode", texts=len(pending)):
+        embeddings = query_embeddings.get_many([f"{query}. {rewritten}" for _, query, rewritten, _, _ in pending])
+
+    with timing.span(f"search.batch.{SEARCH_BACKEND}", queries=len(pending)):
+        if SEARCH_BACKEND == "memory":
+            index = get_memory_index()
+            rows_per_query = []
+            for (_, query, rewritten, filters, _), embedding in zip(pending, embeddings):
+                colour_mode, category_mode = _filter_modes(filters)
+                rows_per_query.append(index.search(
+                    embedding, filters, colour_mode, category_mode, tier_plan(colour_mode, category_mode), top_k,
+                    text=text_query(rewritten, query), pool=candidate_pool(top_k), rrf_k=SEARCH_RRF_K
+                ))
+        else:
+            rows_per_query = _search_postgres_batch(
+                [(filters, embedding, text_query(rewritten, query))
+                 for (_, query, rewritten, filters, _), embedding in zip(pending, embeddings)],
+                top_k, recall_mode
+            )
+
+    for (i, _, _, _, cache_key), rows in zip(pending, rows_per_query):
+        results[i] = _to_results(rows)
+        result_cache.set(cache_key, results[i], {"tier": rows[0][-1] if rows else None})
+    return results
+
+# The batch statement runs the same cascade once per query through a LATERAL join.
+# Queries are grouped by filter modes (which decide the cascade's shape); each group's
+# per-query values arrive as one jsonb array and every group is UNION ALLed into a
+# single statement. $1 limit, $2 candidates per retriever, $3 RRF k, $4.. one jsonb
+# array per group. The cascade's own placeholders are rewritten to the lateral columns.
+_BATCH_GROUP_SQL = """
+SELECT q.query_index, r.* FROM (
+    SELECT (spec->>'index')::int AS query_index,
+        (spec->>'embedding')::vector AS q_embedding,
+        spec->>'category' AS q_category,
+        (spec->>'max_price')::int AS q_max_price,
+        (spec->>'min_price')::int AS q_min_price,
+        ARRAY(SELECT jsonb_array_elements_text(spec->'colour_values')) AS q_colour_values,
+        ARRAY(SELECT jsonb_array_elements_text(spec->'name_patterns')) AS q_name_patterns,
+        spec->>'colour_family' AS q_colour_family,
+        spec->>'text' AS q_text
+    FROM jsonb_array_elements(${group}::jsonb) AS specs(spec)
+) q
+CROSS JOIN LATERAL (
+{cascade}
+) r"""
+
+_BATCH_PLACEHOLDERS = {
+    1: "q.q_embedding", 2: "q.q_category", 3: "q.q_max_price", 4: "q.q_min_price", 5: "q.q_colour_values",
+    6: "$1", 7: "q.q_name_patterns", 8: "q.q_colour_family", 9: "$2", 10: "q.q_text", 11: "$3",
+}
+
+def build_batch_sql(groups: list, quantization: Optional[str] = None) -> str:
+    """`groups` is the list of (colour_mode, category_mode), one jsonb parameter each."""
+    selects = []
+    for n, (colour_mode, category_mode) in enumerate(groups):
+        cascade = re.sub(r"\$(\d+)", lambda m: _BATCH_PLACEHOLDERS[int(m.group(1))],
+                         build_cascade_sql(colour_mode, category_mode, quantization))
+        selects.append(_BATCH_GROUP_SQL.format(group=4 + n, cascade=cascade))
+    return "\nUNION ALL\n".join(selects) + "\nORDER BY query_index, tier, score DESC"
+
+def batch_statement_name(sql: str) -> str:
+    """Prepared statement name for a batch shape; hashed to stay within Postgres's 63-character limit."""
+    return "search_batch_" + hashlib.sha256(sql.encode("utf-8")).hexdigest()[:12]
+
+def _search_postgres_batch(searches: list, top_k: int, recall_mode: Optional[str]) -> list:
+    """`searches` holds (filters, query embedding, tsquery text); returns rows per search."""
+    groups = {}
+    for i, (filters, embedding, text) in enumerate(searches):
+        groups.setdefault(_filter_modes(filters), []).append({
+            "index": i, "embedding": vector_literal(embedding), "text": text or None,
+            **{k: filters[k] for k in ("category", "max_price", "min_price", "colour_values",
+                                      "name_patterns", "colour_family")},
+        })
+    modes = sorted(groups, key=lambda m: (m[0] or "", m[1] or ""))
+    params = [top_k, candidate_pool(top_k), SEARCH_RRF_K] + [json.dumps(groups[m]) for m in modes]
+    sql = build_batch_sql(modes)
+    statement = batch_statement_name(sql)
+    knobs_sql, knobs_params = recall_mode_sql(recall_mode, candidate_pool(top_k))
+
+    def run_batch(conn):
+        with conn.cursor() as cur:
+            execute_prepared(
+                cur, statement, sql, params,
+                ("int", "int", "int") + ("jsonb",) * len(modes), prefix=knobs_sql, prefix_params=knobs_params
+            )
+            return cur.fetchall()
+
+    rows_per_search = [[] for _ in searches]
+    for row in get_pool().run(run_batch):
+        rows_per_search[row[0]].append(row[1:])
+    return rows_per_search
+
+class SearchCursor:
+    """
+    Where a search left off, so "show more" skips the LLM calls, the encoding and
+    the cascade: the query embedding, the resolved filters, the tier that answered
+    and the keyset (distance, product_id) of the last row fetch_more returned.
+    Opaque to callers; pass it back to fetch_more.
+    """
+
+    def __init__(self, query_embedding, filters: dict, tier: Optional[int], results: list,
+                 recall_mode: Optional[str] = None):
+        self.query_embedding = query_embedding
+        self.filters = filters
+        self.tier = tier
+        self.recall_mode = recall_mode
+        self.backend = SEARCH_BACKEND
+        # the first page is fused with full-text hits, so it is not a prefix of the
+        # distance ranking fetch_more walks; its rows are excluded instead
+        self.shown = [r["product_id"] for r in results]
+        self.last_distance = None
+        self.last_product_id = None
+        self.at_last_distance = []   # already returned rows tied at last_distance
+        self.fetched = 0
+        self.exhausted = tier is None
+
+    def advance(self, distances: list, product_ids: list, k: int):
+        if distances:
+            if distances[-1] != self.last_distance:
+                self.at_last_distance = []
+            self.last_distance = distances[-1]
+            self.last_product_id = product_ids[-1]
+            self.at_last_distance += [pid for d, pid in zip(distances, product_ids) if d == self.last_distance]
+        self.fetched += len(product_ids)
+        self.exhausted = len(product_ids) < k
+
+    @property
+    def excluded(self) -> list:
+        return self.shown + self.at_last_distance
+
+
+# fetch_more continues the answering tier's vector ranking with keyset pagination:
+# rows at or past the last distance, minus the ids already returned at exactly that
+# distance (pgvector indexes order by distance alone, so ties are settled by id set
+# rather than ORDER BY distance, product_id) and minus the fused first page.
+# $1-$8 as in the cascade with $6 the page size, $9 the last distance (NULL for the
+# first "show more"), $10 the excluded product ids. The distance column comes first
+# and is stripped before _to_results.
+MORE_PARAM_TYPES = ("vector", "text", "int", "int", "text[]", "int", "text[]", "text", "float8", "text[]")
+
+_MORE_SQL = """
+SELECT {coarse_distance} AS distance,
+    product_id, name, price, colour, brand, img, description, avg_rating, rating_count,
+    1 - (embedding <=> $1::vector) AS similarity, {category_match} AS category_match, NULL::float8 AS score,
+    {tier} AS tier
+FROM myntra_products
+WHERE {where} AND ($9::float8 IS NULL OR {coarse_distance} >= $9) AND NOT (product_id = ANY($10))
+ORDER BY {coarse_distance} LIMIT $6
+"""
+
+def build_more_sql(colour_mode: Optional[str], category_mode: Optional[str], tier: int,
+                   quantization: Optional[str] = None) -> str:
+    for t, category_match, tier_filter in _cascade_tiers(colour_mode, category_mode):
+        if t == tier:
+            return _MORE_SQL.format(
+                coarse_distance=coarse_distance_sql(quantization or VECTOR_QUANTIZATION),
+                category_match=category_match, tier=tier, where=_TIER_WHERE + tier_filter
+            )
+    raise ValueError(f"Tier {tier} is not part of this query's cascade")
+
+def fetch_more(cursor: SearchCursor, k: int = 6) -> list:
+    """
+    The next k results of the search the cursor came from, as one indexed query.
+    Advances the cursor; returns [] once the tier runs out.
+    """
+    if cursor.exhausted:
+        return []
+    colour_mode, category_mode = _filter_modes(cursor.filters)
+    with timing.span(f"search.more.{cursor.backend}", tier=cursor.tier) as span:
+        if cursor.backend == "memory":
+            tier_entry = next(t for t in tier_plan(colour_mode, category_mode) if t[0] == cursor.tier)
+            rows = get_memory_index().search_after(
+                cursor.query_embedding, cursor.filters, colour_mode, category_mode, tier_entry, k,
+                after=cursor.last_distance, exclude=cursor.excluded
+            )
+        else:
+            rows = _more_postgres(cursor, colour_mode, category_mode, k)
+        span["rows"] = len(rows)
+    cursor.advance([r[0] for r in rows], [r[1] for r in rows], k)
+    return _to_results([r[1:] for r in rows])
+
+def _more_postgres(cursor: SearchCursor, colour_mode: Optional[str], category_mode: Optional[str],
+                   k: int) -> list:
+    params = cascade_params(cursor.query_embedding, cursor.filters, k)[:8]
+    params += [cursor.last_distance, cursor.excluded]
+    statement = f"search_more_{VECTOR_QUANTIZATION}_{colour_mode or 'any'}_{category_mode or 'any'}_{cursor.tier}"
+    # rows before the keyset are walked and filtered, so HNSW has to yield them too, and
+    # in exact distance order: relaxed_order would repeat and skip rows across pages
+    knobs_sql, knobs_params = recall_mode_sql(
+        cursor.recall_mode, len(cursor.shown) + cursor.fetched + k, iterative_scan=ORDERED_ITERATIVE_SCAN
+    )
+
+    def run_more(conn):
+        with conn.cursor() as cur:
+            execute_prepared(
+                cur, statement, build_more_sql(colour_mode, category_mode, cursor.tier), params,
+                MORE_PARAM_TYPES, prefix=knobs_sql, prefix_params=knobs_params
+            )
+            return cur.fetchall()
+
+    return get_pool().run(run_more)
+
+def get_similar_products(product_id: str, k: int = 4) -> list:
+    """
+    "More like this" for the details view: one primary-key lookup of the
+    precomputed neighbors, or the snapshot in memory mode. The view works
+    without it, so database trouble yields no similar items rather than an error.
+    """
+    def fetch(conn):
+        with conn.cursor() as cur:
+            execute_prepared(cur, "similar_products", SIMILAR_SQL, [str(product_id), k], SIMILAR_PARAM_TYPES)
+            return cur.fetchall()
+
+    with timing.span("search.similar", backend=SEARCH_BACKEND) as span:
+        if SEARCH_BACKEND == "memory":
+            rows = get_memory_index().similar(str(product_id), k, NEIGHBORS_SCOPE)
+        else:
+            try:
+                rows = get_pool().run(fetch)
+            except errors.UndefinedTable:
+                rows = []   # neighbors not computed yet
+            except (pool.PoolError, psycopg2.Error) as e:
+                logger.warning(f"Similar items unavailable: {e}")
+                rows = []
+        span["rows"] = len(rows)
+    return _to_results(rows)
+
+def _to_results(rows: list) -> list:
+    """Rows come back ranked; `score` is None when the backend left scoring to us."""
+    tier = rows[0][-1] if rows else TIER_FALLBACK
+    exact_filters_used = tier == TIER_STRICT
+    relaxed_notice = RELAXED_NOTICES.get(tier)
 
     results = []
     for r in rows:
-        pid, name, price, col, brand, img, desc, avg_r, r_cnt, sim, cat_m = r
+        pid, name, price, col, brand, img, desc, avg_r, r_cnt, sim, cat_m, score, _tier = r
         sim = float(sim or 0.0)
-        score = (0.6 * sim) + (0.3 * (1.0 if cat_m else 0.0)) + (0.1 * (min(float(r_cnt or 0)/500, 1.0)))
+        if score is None:
+            score = (0.6 * sim) + (0.3 * (1.0 if cat_m else 0.0)) + (0.1 * (min(float(r_cnt or 0)/500, 1.0)))
+        score = float(score)
         results.append({
             "product_id": pid, "name": name, "price": price, "colour": col, "brand": brand,
             "image": img, "avg_rating": avg_r, "rating_count": r_cnt, "similarity": round(sim, 4),
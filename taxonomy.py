@@ -0,0 +1,114 @@
+# taxonomy.py
+"""Fashion vocabularies shared by search, the rule-based intent parser and the app."""
+import re
+from typing import Optional
+
+COLOR_FAMILY_MAP = {
+    "red": ["red","maroon","magenta","rust","coral","peach"],
+    "blue": ["blue","navy blue","turquoise blue","teal","sea green"],
+    "green": ["green","olive","lime green","fluorescent green"],
+    "white": ["white","off white"],
+    "black": ["black","charcoal"],
+    "grey": ["grey","gray"],
+    "pink": ["pink","peach","lavender"],
+    "purple": ["purple","magenta"],
+    "orange": ["orange","rust"],
+}
+
+CATEGORY_ALIAS_MAP = {
+    "saree": ["saree", "sari", "drape", "pleats", "pallu", "zari", "border", "banarasi", "kanjeevaram", "silk saree"],
+    "kurti": ["kurti","kurta","tunic"],
+    "dress": ["dress","gown","one piece","anarkali"],
+    "shirt": ["shirt","top","tee","blouse","t-shirt","tshirt"],
+    "jeans": ["jean","jeans","denim"],
+    "jacket": ["jacket","coat"],
+}
+
+CATEGORY_TERMS = {
+    "saree", "sari", "kurti", "kurta", "dress", "gown", "shirt", "top",
+    "tee", "blouse", "jeans", "denim", "jacket", "coat", "lehenga",
+    "salwar", "suit", "tshirt", "t-shirt", "hoodie", "skirt", "pants",
+    "trousers", "traditional", "ethnic", "western"
+}
+COLOR_TERMS = {
+    "red", "blue", "green", "white", "black", "grey", "gray", "pink",
+    "purple", "orange", "yellow", "maroon", "navy", "beige", "brown"
+}
+AUDIENCE_TERMS = {
+    "men", "man", "male", "women", "woman", "female", "kids", "kid",
+    "boy", "boys", "girl", "girls", "family", "adult", "adults"
+}
+OCCASION_TERMS = {
+    "wedding", "party", "festival", "office", "casual", "formal",
+    "college", "daily", "travel", "function", "engagement", "diwali", "eid"
+}
+
+# garment nouns that decide a catalog row's category in derive_category; unlike the
+# search aliases above, no details like "border" or "pleats" that other garments share
+CATEGORY_GARMENTS = {
+    "saree": ["saree", "sari"],
+    "kurti": ["kurti", "kurta", "tunic"],
+    "dress": ["dress", "gown", "anarkali", "one piece"],
+    "shirt": ["shirt", "top", "tee", "blouse"],
+    "jeans": ["jeans", "jean"],
+    "jacket": ["jacket", "coat"],
+}
+
+# style words in CATEGORY_TERMS that describe a look rather than name a garment
+STYLE_TERMS = {"traditional", "ethnic", "western"}
+
+
+_GARMENT_PATTERN = re.compile(
+    r"\b(" + "|".join(re.escape(w) for w in sorted(
+        (w for words in CATEGORY_GARMENTS.values() for w in words), key=len, reverse=True
+    )) + r")(?:e?s)?\b"
+)
+_GARMENT_TO_CATEGORY = {w: key for key, words in CATEGORY_GARMENTS.items() for w in words}
+# what follows these is an accessory or a set piece, not the product itself
+_HEAD_END = re.compile(r"\s(?:with|and|&|has|paired)\s|[,(|]")
+_ALIAS_TO_CATEGORY = {alias: key for key, aliases in CATEGORY_ALIAS_MAP.items() for alias in aliases}
+
+
+def category_for_term(term: Optional[str]) -> Optional[str]:
+    """Maps a user category ("kurta", "Sarees") to its CATEGORY_ALIAS_MAP key, if any."""
+    if not term:
+        return None
+    term = term.strip().lower()
+    for candidate in (term, term[:-1], term[:-2]):
+        if candidate in CATEGORY_ALIAS_MAP:
+            return candidate
+        if candidate in _ALIAS_TO_CATEGORY:
+            return _ALIAS_TO_CATEGORY[candidate]
+    return None
+
+
+def derive_category(name: Optional[str], description: Optional[str] = None) -> Optional[str]:
+    """
+    Normalized category for a catalog row, from garment nouns only. The name's
+    head phrase (up to "with" / "and" / "&") ends with the garment ("Women Blue
+    Denim Jacket", "Printed Top with Lace Border"), so its last garment wins;
+    otherwise the first garment in the rest of the name, then in the description.
+    """
+    if name and isinstance(name, str):
+        text = name.lower()
+        head_end = _HEAD_END.search(text)
+        head = text[:head_end.start()] if head_end else text
+        garments = _GARMENT_PATTERN.findall(head)
+        if garments:
+            return _GARMENT_TO_CATEGORY[garments[-1]]
+        match = _GARMENT_PATTERN.search(text)
+        if match:
+            return _GARMENT_TO_CATEGORY[match.group(1)]
+    if description and isinstance(description, str):
+        match = _GARMENT_PATTERN.search(re.sub(r"<.*?>", " ", description).lower())
+        if match:
+            return _GARMENT_TO_CATEGORY[match.group(1)]
+    return None
+
+
+def colour_families(colour: Optional[str]) -> list:
+    """Every COLOR_FAMILY_MAP family a catalog colour belongs to ("peach" -> red, pink)."""
+    if not colour or not isinstance(colour, str):
+        return []
+    colour = colour.strip().lower()
+    return [family for family, members in COLOR_FAMILY_MAP.items() if colour == family or colour in members]
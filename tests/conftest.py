@@ -0,0 +1,8 @@
+import os
+import sys
+
+# modules live at the repo root, next to app.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# llm_client builds its client at import time; tests never reach the API
+os.environ.setdefault("GROQ_API_KEY", "test")
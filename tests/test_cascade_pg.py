@@ -0,0 +1,74 @@
+"""
+Runs the search cascade against a real pgvector database. Skipped unless
+TEST_DB_NAME names a scratch database (the tables used are temporary).
+"""
+import os
+
+import numpy as np
+import pytest
+
+if not os.getenv("TEST_DB_NAME"):
+    pytest.skip("TEST_DB_NAME not set", allow_module_level=True)
+
+import db
+import search
+from vector_index import recall_mode_sql
+
+ROWS = 3000
+
+
+@pytest.fixture
+def conn():
+    conn = db.connect(dbname=os.environ["TEST_DB_NAME"])
+    with conn.cursor() as cur:
+        cur.execute("CREATE EXTENSION IF NOT EXISTS vector;")
+        # shadows any real myntra_products for this session only
+        cur.execute("""
+            CREATE TEMP TABLE myntra_products (
+                product_id TEXT PRIMARY KEY, name TEXT, price INT, colour TEXT, brand TEXT, img TEXT,
+                rating_count INT, avg_rating FLOAT, description TEXT, category TEXT, colour_family TEXT[],
+                embedding VECTOR(768), search_tsv TSVECTOR
+            );
+        """)
+    yield conn
+    conn.rollback()
+    conn.close()
+
+
+def load(conn, query):
+    """Everything is near the query except three red sarees, which are far from it."""
+    rng = np.random.default_rng(0)
+    rows = []
+    for i in range(ROWS):
+        far = i < 3
+        vec = -query + rng.normal(scale=0.1, size=768) if far else query + rng.normal(scale=0.3, size=768)
+        rows.append((
+            str(i), f"item {i}", 1000, "red" if far else "blue", "brand", "", 10, 4.0, "",
+            "saree" if far else "tops", ["red"] if far else ["blue"], search.vector_literal(vec),
+        ))
+    with conn.cursor() as cur:
+        cur.executemany("""
+            INSERT INTO myntra_products (product_id, name, price, colour, brand, img, rating_count, avg_rating,
+                                         description, category, colour_family, embedding)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s::vector);
+        """, rows)
+        cur.execute("CREATE INDEX ON myntra_products USING hnsw (embedding vector_cosine_ops);")
+        cur.execute("ANALYZE myntra_products;")
+
+
+def test_selective_filter_is_answered_by_the_strict_tier(conn):
+    query = np.random.default_rng(1).normal(size=768)
+    load(conn, query)
+    filters = {"colour_family": "red", "colour_values": [], "category": "saree", "name_patterns": [],
+               "max_price": None, "min_price": None}
+    sql = search.build_cascade_sql("family", "column", quantization="none")
+    params = search.cascade_params(query, filters, 3, quantization="none")
+    knobs_sql, knobs_params = recall_mode_sql("fast", search.candidate_pool(3, "none"))
+    with conn.cursor() as cur:
+        cur.execute(f"PREPARE cascade ({', '.join(search.CASCADE_PARAM_TYPES)}) AS {sql}")
+        cur.execute(knobs_sql, knobs_params)
+        cur.execute(f"EXECUTE cascade ({', '.join(['%s'] * len(params))});", params)
+        rows = cur.fetchall()
+    assert rows, "the three matching rows exist"
+    assert {r[-1] for r in rows} == {search.TIER_STRICT}
+    assert sorted(r[0] for r in rows) == ["0", "1", "2"]
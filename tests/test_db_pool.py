@@ -0,0 +1,86 @@
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("psycopg2")
+
+from psycopg2 import extensions
+
+from db import ConnectionPool
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+        self.prepared = set()
+        self.last_checked = time.monotonic()
+
+    def get_transaction_status(self):
+        return extensions.TRANSACTION_STATUS_IDLE
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = 1
+
+
+def make_pool(maxconn=8, minconn=1):
+    opened = []
+
+    def connect():
+        conn = FakeConnection()
+        opened.append(conn)
+        return conn
+
+    return ConnectionPool(minconn=minconn, maxconn=maxconn, timeout=5, healthcheck_interval=60,
+                          connect_fn=connect), opened
+
+
+def run_concurrently(db_pool, n):
+    barrier = threading.Barrier(n)
+    used = []
+
+    def work(conn):
+        barrier.wait()   # all n connections are checked out at once
+        used.append(conn)
+        conn.prepared.add("search")
+
+    threads = [threading.Thread(target=db_pool.run, args=(work,)) for _ in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return used
+
+
+def test_concurrent_runs_reuse_warm_connections():
+    db_pool, opened = make_pool(maxconn=8)
+    first = run_concurrently(db_pool, 6)
+    assert len(opened) == 6
+
+    for _ in range(5):
+        again = run_concurrently(db_pool, 6)
+        assert {id(c) for c in again} == {id(c) for c in first}
+    assert len(opened) == 6
+    assert not any(c.closed for c in opened)
+    assert all("search" in c.prepared for c in opened)
+    assert db_pool.stats["discarded"] == 0
+
+
+def test_broken_connection_is_replaced():
+    db_pool, opened = make_pool(maxconn=2)
+    conn = db_pool.getconn()
+    db_pool.putconn(conn, close=True)
+    assert conn.closed
+    assert db_pool.getconn() is not conn
+    assert len(opened) == 2
+
+
+def test_closed_idle_connection_is_not_handed_out():
+    db_pool, opened = make_pool(maxconn=2)
+    conn = db_pool.getconn()
+    db_pool.putconn(conn)
+    conn.closed = 1   # server went away while idle
+    assert db_pool.getconn() is not conn
@@ -0,0 +1,139 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from embedding_cache import EmbeddingCache, normalize_query
+
+
+class SlowEncoder:
+    """Counts model calls; each call blocks until `release` is set."""
+
+    def __init__(self):
+        self.calls = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self._lock = threading.Lock()
+
+    def encode(self, text):
+        return self.encode_many([text])[0]
+
+    def encode_many(self, texts):
+        with self._lock:
+            self.calls.append(list(texts))
+        self.started.set()
+        assert self.release.wait(5)
+        return [np.full(3, len(t), dtype=np.float32) for t in texts]
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+def run_threads(n, target):
+    results, errors = [None] * n, []
+
+    def run(i):
+        try:
+            results[i] = target(i)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    return threads, results, errors
+
+
+def test_concurrent_misses_share_one_encode():
+    encoder = SlowEncoder()
+    cache = EmbeddingCache(encoder.encode)
+    threads, results, errors = run_threads(8, lambda i: cache.get(["Red Saree", "red  saree!", "RED SAREE"][i % 3]))
+    assert encoder.started.wait(5)
+    wait_until(lambda: cache.stats["misses"] + cache.stats["coalesced"] == 8)
+    encoder.release.set()
+    for t in threads:
+        t.join(5)
+    assert not errors
+    assert encoder.calls == [["red saree"]]
+    assert all(r is results[0] for r in results)
+    assert cache.stats == {"hits": 0, "misses": 1, "coalesced": 7, "evictions": 0}
+
+
+def test_encode_failure_reaches_every_waiter_and_is_not_cached():
+    calls = []
+    started, release = threading.Event(), threading.Event()
+
+    def encode(text):
+        calls.append(text)
+        started.set()
+        release.wait(5)
+        raise RuntimeError("model crashed")
+
+    cache = EmbeddingCache(encode)
+    threads, _, errors = run_threads(4, lambda i: cache.get("saree"))
+    assert started.wait(5)
+    wait_until(lambda: cache.stats["misses"] + cache.stats["coalesced"] == 4)
+    release.set()
+    for t in threads:
+        t.join(5)
+    assert len(errors) == 4 and len(calls) == 1
+    release.clear()
+    cache._encode = lambda text: np.ones(3)
+    assert cache.get("saree").tolist() == [1, 1, 1]
+
+
+def test_get_many_batches_misses_and_keeps_order():
+    encoder = SlowEncoder()
+    encoder.release.set()
+    cache = EmbeddingCache(encoder.encode, encode_many_fn=encoder.encode_many)
+    cache.get("kurti")
+    encoder.calls.clear()
+
+    texts = ["blue jeans", "Kurti", "red saree", "blue  JEANS", "top"]
+    vectors = cache.get_many(texts)
+    assert encoder.calls == [["blue jeans", "red saree", "top"]]     # one model call, duplicates once
+    assert [v[0] for v in vectors] == [len(normalize_query(t)) for t in texts]
+    assert vectors[0] is vectors[3]
+    assert cache.stats["hits"] == 1
+
+
+def test_get_many_waits_on_misses_already_in_flight():
+    encoder = SlowEncoder()
+    cache = EmbeddingCache(encoder.encode, encode_many_fn=encoder.encode_many)
+    threads, results, errors = run_threads(1, lambda i: cache.get("saree"))
+    assert encoder.started.wait(5)
+    batch, batch_results, _ = run_threads(1, lambda i: cache.get_many(["dress", "saree"]))
+    wait_until(lambda: cache.stats["coalesced"] == 1)
+    encoder.release.set()
+    for t in threads + batch:
+        t.join(5)
+    assert not errors
+    assert sorted(map(tuple, encoder.calls)) == [("dress",), ("saree",)]
+    assert batch_results[0][1] is results[0]
+
+
+def test_lru_eviction_at_max_entries():
+    calls = []
+    cache = EmbeddingCache(lambda text: calls.append(text) or np.zeros(2), max_entries=2)
+    cache.get("a")
+    cache.get("b")
+    cache.get("a")          # a is now most recently used
+    cache.get("c")          # evicts b
+    assert cache.stats["evictions"] == 1
+    assert cache.snapshot()["entries"] == 2
+    cache.get("a")
+    cache.get("c")
+    assert calls == ["a", "b", "c"]
+    cache.get("b")
+    assert calls == ["a", "b", "c", "b"]
+
+
+def test_vectors_are_read_only():
+    cache = EmbeddingCache(lambda text: [1.0, 2.0])
+    with pytest.raises(ValueError):
+        cache.get("saree")[0] = 5.0
@@ -0,0 +1,130 @@
+import json
+
+import numpy as np
+import pytest
+
+import search
+from memory_backend import EMBEDDING_DIM, MemoryIndex
+
+
+class FakeCursor:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def fetchall(self):
+        return []
+
+
+class FakePool:
+    def run(self, fn):
+        return fn(type("Conn", (), {"cursor": lambda self: FakeCursor()})())
+
+
+def test_postgres_paging_scans_in_strict_distance_order(monkeypatch):
+    sent = {}
+    monkeypatch.setattr(search, "get_pool", lambda: FakePool())
+    monkeypatch.setattr(search, "execute_prepared",
+                        lambda cur, name, sql, params, types, prefix, prefix_params: sent.update(knobs=prefix_params))
+    filters = {"colour_family": None, "colour_values": [], "category": "saree", "name_patterns": [],
+               "max_price": None, "min_price": None}
+    cursor = search.SearchCursor([0.1] * 768, filters, search.TIER_CATEGORY, [{"product_id": "1"}])
+    cursor.backend = "postgres"
+    search.fetch_more(cursor, 4)
+    knobs = dict(zip(sent["knobs"][::2], sent["knobs"][1::2]))
+    assert knobs["hnsw.iterative_scan"] == "strict_order"
+    assert knobs["ivfflat.iterative_scan"] == "off"
+
+
+def make_index(tmp_path, directions, category="saree"):
+    path = tmp_path / "snapshot"
+    path.mkdir()
+    embeddings = np.zeros((len(directions), EMBEDDING_DIM), dtype=np.float32)
+    embeddings[:, :2] = directions
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    np.save(path / "embeddings.npy", embeddings)
+    n = len(directions)
+    columns = {
+        "product_id": [f"p{i:02d}" for i in range(n)], "name": [f"Saree {i}" for i in range(n)],
+        "price": [1000] * n, "colour": ["Red"] * n, "brand": [None] * n, "img": [None] * n,
+        "description": [None] * n, "avg_rating": [None] * n, "rating_count": [0] * n,
+        "category": [category] * n, "colour_family": [[]] * n,
+    }
+    (path / "columns.json").write_text(json.dumps(columns))
+    return MemoryIndex(str(path))
+
+
+FILTERS = {"colour_family": None, "colour_values": [], "category": "saree", "name_patterns": [],
+           "max_price": None, "min_price": None}
+QUERY = np.eye(1, EMBEDDING_DIM, dtype=np.float32)[0]
+
+
+@pytest.fixture
+def paged(tmp_path, monkeypatch):
+    rng = np.random.default_rng(7)
+    directions = rng.uniform(0.1, 1.0, size=(30, 2))
+    directions[10:19] = directions[10]      # nine rows tied at one distance, across page boundaries
+    index = make_index(tmp_path, directions)
+    monkeypatch.setattr(search, "SEARCH_BACKEND", "memory")
+    monkeypatch.setattr(search, "get_memory_index", lambda: index)
+    return index
+
+
+def first_page(index, top_k=5):
+    rows = index.search(QUERY, FILTERS, None, "column", search.tier_plan(None, "column"), top_k)
+    results = search._to_results(rows)
+    return search.SearchCursor(QUERY, FILTERS, rows[0][-1], results), [r["product_id"] for r in results]
+
+
+def page_through(cursor, k, max_pages=50):
+    pages = []
+    for _ in range(max_pages):      # a keyset that stops advancing would otherwise loop forever
+        page = search.fetch_more(cursor, k)
+        if not page:
+            return pages
+        pages.append([r["product_id"] for r in page])
+    pytest.fail("fetch_more never ran out")
+
+
+@pytest.mark.parametrize("k", [1, 4, 6, 25])
+def test_memory_pages_cover_the_tier_once(paged, k):
+    cursor, shown = first_page(paged)
+    pages = page_through(cursor, k)
+    seen = shown + [pid for page in pages for pid in page]
+    assert len(seen) == len(set(seen))                     # no duplicates
+    assert set(seen) == set(paged.columns["product_id"])   # no gaps
+    assert cursor.exhausted
+    assert search.fetch_more(cursor, k) == []
+    assert all(len(page) == k for page in pages[:-1])
+
+
+def test_memory_pages_follow_the_distance_ranking(paged):
+    cursor, shown = first_page(paged)
+    paged_ids = [pid for page in page_through(cursor, 4) for pid in page]
+    distances = 1 - paged.embeddings @ QUERY
+    order = [paged.columns["product_id"].index(pid) for pid in paged_ids]
+    full = [pid for pid in (r[0] for r in paged.search(QUERY, FILTERS, None, "column",
+                                                        search.tier_plan(None, "column"), 30))
+            if pid not in shown]
+    assert sorted(paged_ids) == sorted(full)
+    # pages follow each other in distance order (rows within a page are re-sorted by score)
+    pages = [order[i:i + 4] for i in range(0, len(order), 4)]
+    for earlier, later in zip(pages, pages[1:]):
+        assert distances[earlier].max() <= distances[later].min() + 1e-6
+
+
+def test_ties_at_the_last_distance_are_not_repeated_or_dropped(paged):
+    cursor, shown = first_page(paged, top_k=1)
+    tied = {f"p{i:02d}" for i in range(10, 19)} - set(shown)
+    seen = [pid for page in page_through(cursor, 2) for pid in page]
+    assert tied <= set(seen)
+    assert len(seen) == len(set(seen))
+
+
+def test_more_sql_rejects_a_tier_outside_the_cascade():
+    with pytest.raises(ValueError):
+        search.build_more_sql(None, None, search.TIER_STRICT)
+    with pytest.raises(ValueError):
+        search.build_more_sql(None, "column", search.TIER_COLOUR)
@@ -0,0 +1,53 @@
+import pytest
+
+from intent_rules import parse_intent
+
+
+@pytest.mark.parametrize("query, min_price, max_price", [
+    ("black jeans under 1000", None, 1000),
+    ("black jeans under 1,000", None, 1000),
+    ("red saree rs 2k", None, 2000),
+    ("saree rs. 1500", None, 1500),
+    ("₹800 top", None, 800),
+    ("kurti 999 rs", None, 999),
+    ("budget 1500 kurti", None, 1500),
+    ("dress budget of 2k", None, 2000),
+    ("jeans upto 1200", None, 1200),
+    ("kurti above 500", 500, None),
+    ("jeans between 500 and 1500", 500, 1500),
+    ("kurtis 500-1000", 500, 1000),
+    # numbers without a currency or price cue are not budgets
+    ("sister 2024 wedding saree", None, None),
+    ("kurti 999", None, None),
+    ("blue trousers 3", None, None),
+    ("2-3 kurtis", None, None),
+    ("3 kurtis", None, None),
+])
+def test_prices(query, min_price, max_price):
+    intent = parse_intent(query)["intent"]
+    assert intent.get("min_price") == min_price
+    assert intent.get("max_price") == max_price
+
+
+def test_bare_year_is_not_trusted_as_a_fast_path_answer():
+    assert parse_intent("sister 2024 wedding saree")["confidence"] < 1.0
+
+
+def test_currency_letters_inside_words_are_left_alone():
+    parsed = parse_intent("blue trousers 3")
+    assert parsed["intent"] == {"category": "trousers", "color": "blue"}
+    assert parsed["rewritten_query"] == "blue trousers"
+    assert parsed["quantity"] == 3
+
+
+def test_quantity_range_keeps_the_category():
+    parsed = parse_intent("2-3 kurtis")
+    assert parsed["intent"]["category"] == "kurti"
+    assert parsed["rewritten_query"] == "kurtis"
+
+
+@pytest.mark.parametrize("query", ["men t-shirt", "men tshirt", "men t shirt", "Men T-Shirt"])
+def test_tshirt_spellings_map_to_the_shirt_category(query):
+    parsed = parse_intent(query)
+    assert parsed["intent"]["category"] == "shirt"
+    assert parsed["rewritten_query"] == "men t-shirt"
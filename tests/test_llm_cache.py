@@ -0,0 +1,85 @@
+import pytest
+
+import llm_cache
+from llm_cache import LLMCache
+
+MESSAGES = [{"role": "user", "content": "red saree under 2000"}]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(llm_cache, "time", clock)
+    return clock
+
+
+def make_cache(tmp_path, **kwargs):
+    kwargs.setdefault("ttl", 60)
+    return LLMCache(str(tmp_path / "llm.sqlite3"), **kwargs)
+
+
+def test_key_covers_model_messages_and_params():
+    key = LLMCache.make_key("model-a", MESSAGES, max_tokens=200, temp=0.0, json_mode=True)
+    assert key == LLMCache.make_key("model-a", [dict(MESSAGES[0])], json_mode=True, temp=0.0, max_tokens=200)
+    assert key != LLMCache.make_key("model-b", MESSAGES, max_tokens=200, temp=0.0, json_mode=True)
+    assert key != LLMCache.make_key("model-a", [{"role": "user", "content": "red saree"}],
+                                    max_tokens=200, temp=0.0, json_mode=True)
+    assert key != LLMCache.make_key("model-a", MESSAGES, max_tokens=100, temp=0.0, json_mode=True)
+    assert key != LLMCache.make_key("model-a", MESSAGES, max_tokens=200, temp=0.0, json_mode=False)
+
+
+def test_disk_hits_survive_a_restart_and_are_promoted(tmp_path, clock):
+    cache = make_cache(tmp_path)
+    cache.set("k", "value")
+    reopened = make_cache(tmp_path)
+    assert reopened.get("k") == "value"
+    assert reopened.get("k") == "value"
+    assert reopened.stats["disk_hits"] == 1 and reopened.stats["memory_hits"] == 1
+
+
+def test_entries_expire_after_ttl_in_both_tiers(tmp_path, clock):
+    cache = make_cache(tmp_path, ttl=60)
+    cache.set("k", "value")
+    clock.now += 59
+    assert cache.get("k") == "value"
+    clock.now += 2
+    assert cache.get("k") is None
+    assert make_cache(tmp_path, ttl=60).get("k") is None
+    assert cache.stats["misses"] == 1
+
+
+def test_memory_tier_is_bounded_lru(tmp_path, clock):
+    cache = LLMCache(None, ttl=60, max_memory_entries=2)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    cache.get("a")
+    cache.set("c", "3")         # evicts b
+    assert cache.get("b") is None
+    assert cache.get("a") == "1" and cache.get("c") == "3"
+    assert cache.stats["evictions"] == 1
+
+
+def test_disk_tier_drops_expired_then_least_recently_used(tmp_path, clock, monkeypatch):
+    monkeypatch.setattr(llm_cache, "_EVICT_EVERY", 5)
+    cache = make_cache(tmp_path, ttl=60, max_memory_entries=1, max_disk_entries=3)
+    cache.set("expired", "x")
+    clock.now += 61
+    for key in ("old", "used", "newer"):
+        clock.now += 1
+        cache.set(key, key)
+    clock.now += 1
+    reader = make_cache(tmp_path, max_memory_entries=1)
+    assert reader.get("used") == "used"         # refreshes last_access on disk
+    clock.now += 1
+    cache.set("newest", "newest")               # fifth write: evict
+    keys = {k for (k,) in cache._db.execute("SELECT key FROM llm_cache;")}
+    assert keys == {"used", "newer", "newest"}
+    assert cache.stats["evictions"] >= 2
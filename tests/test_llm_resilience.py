@@ -0,0 +1,178 @@
+import asyncio
+import threading
+import time
+from http.server import ThreadingHTTPServer
+from types import SimpleNamespace
+
+import groq
+import pytest
+
+from benchmarks.fake_llm_server import make_handler
+from llm_resilience import CircuitBreaker, CircuitOpenError, ResilientLLM
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+def make_llm(base_url=None, **kwargs):
+    kwargs.setdefault("retry_base_delay", 0.01)
+    return ResilientLLM(api_key="fake", base_url=base_url, **kwargs)
+
+
+def call(llm, make_request):
+    """Runs llm._call(make_request) on the client's loop, as complete() does."""
+    return asyncio.run_coroutine_threadsafe(llm._call(make_request), llm._loop).result(timeout=10)
+
+
+def scripted(*steps):
+    """make_request whose n-th request sleeps, raises or returns the n-th step."""
+    calls = []
+
+    def make_request():
+        step = steps[min(len(calls), len(steps) - 1)]
+        calls.append(step)
+
+        async def request():
+            if isinstance(step, (int, float)) and not isinstance(step, bool):
+                await asyncio.sleep(step)
+                return f"slept {step}"
+            if isinstance(step, BaseException):
+                raise step
+            return step
+        return request()
+    make_request.calls = calls
+    return make_request
+
+
+@pytest.fixture
+def fake_server():
+    servers = []
+
+    def start(**overrides):
+        args = SimpleNamespace(latency=0.0, jitter=0.0, error_rate=0.0, slow_rate=0.0, slow_delay=0.0,
+                               token_delay=0.0, reply="hello there", json_reply="{}")
+        vars(args).update(overrides)
+        server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(args))
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_deadline_bounds_a_hung_request():
+    llm = make_llm(deadline=0.2, max_retries=5)
+    started = time.monotonic()
+    with pytest.raises(asyncio.TimeoutError):
+        call(llm, scripted(10))
+    assert time.monotonic() - started < 1.0
+    assert llm.stats["timeouts"] >= 1
+
+
+def test_retries_recover_from_transient_errors():
+    llm = make_llm(max_retries=2)
+    make_request = scripted(asyncio.TimeoutError(), asyncio.TimeoutError(), "ok")
+    assert call(llm, make_request) == "ok"
+    assert llm.stats["retries"] == 2
+    assert llm.breaker.state == "closed"
+
+
+def test_retry_exhaustion_against_failing_server(fake_server):
+    llm = make_llm(fake_server(error_rate=1.0), max_retries=2)
+    with pytest.raises(groq.InternalServerError):
+        llm.complete(model="fake", messages=MESSAGES)
+    assert llm.stats["retries"] == 2
+    assert llm.stats["failures"] == 1
+
+
+def test_non_retryable_status_is_not_retried_or_counted_against_the_breaker(fake_server):
+    llm = make_llm(fake_server(), max_retries=2, breaker=CircuitBreaker(threshold=1, cooldown=60))
+    llm._client = llm._client.with_options(base_url=llm._client.base_url.copy_with(path="/missing/"))
+    with pytest.raises(groq.NotFoundError):
+        llm.complete(model="fake", messages=MESSAGES)
+    assert llm.stats["retries"] == 0
+    assert llm.breaker.state == "closed"
+
+
+def test_complete_against_fake_server(fake_server):
+    llm = make_llm(fake_server(latency=0.01))
+    response = llm.complete(model="fake", messages=MESSAGES)
+    assert response.choices[0].message.content == "hello there"
+
+
+def test_breaker_opens_then_half_opens_then_closes():
+    breaker = CircuitBreaker(threshold=2, cooldown=0.2)
+    llm = make_llm(max_retries=0, breaker=breaker)
+    failing = scripted(RuntimeError("upstream down"))
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            call(llm, failing)
+    assert breaker.state == "open"
+
+    with pytest.raises(CircuitOpenError):
+        call(llm, scripted("never sent"))
+    assert llm.stats["short_circuited"] == 1
+
+    time.sleep(0.25)
+    assert breaker.state == "half-open"
+    assert call(llm, scripted("ok")) == "ok"     # the trial call
+    assert breaker.state == "closed"
+
+
+def test_failed_trial_reopens_the_breaker():
+    breaker = CircuitBreaker(threshold=1, cooldown=0.2)
+    llm = make_llm(max_retries=0, breaker=breaker)
+    with pytest.raises(RuntimeError):
+        call(llm, scripted(RuntimeError("down")))
+    time.sleep(0.25)
+    assert breaker.state == "half-open"
+    with pytest.raises(RuntimeError):
+        call(llm, scripted(RuntimeError("still down")))
+    assert breaker.state == "open"
+
+
+def test_half_open_lets_one_trial_through():
+    breaker = CircuitBreaker(threshold=1, cooldown=0.0)
+    breaker.record_failure()
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.release()
+    assert breaker.allow()
+
+
+def test_hedge_answers_when_the_first_request_is_slow():
+    llm = make_llm(hedge_after=0.05, deadline=5)
+    make_request = scripted(2, "hedged")
+    started = time.monotonic()
+    assert call(llm, make_request) == "hedged"
+    assert time.monotonic() - started < 1.0
+    assert llm.stats["hedges"] == 1
+    assert len(make_request.calls) == 2
+
+
+def test_no_hedge_when_the_first_request_is_fast():
+    llm = make_llm(hedge_after=0.5)
+    make_request = scripted("fast")
+    assert call(llm, make_request) == "fast"
+    assert llm.stats["hedges"] == 0
+    assert len(make_request.calls) == 1
+
+
+def test_stream_against_fake_server(fake_server):
+    llm = make_llm(fake_server(token_delay=0.01))
+    text = "".join(c.choices[0].delta.content or "" for c in llm.stream(model="fake", messages=MESSAGES))
+    assert text == "hello there"
+
+
+def test_stalled_stream_fails_within_the_deadline(fake_server):
+    llm = make_llm(fake_server(token_delay=5), deadline=0.3)
+    received = []
+    started = time.monotonic()
+    with pytest.raises(TimeoutError, match="stalled"):
+        for item in llm.stream(model="fake", messages=MESSAGES):
+            received.append(item)
+    assert time.monotonic() - started < 3
+    assert len(received) == 1      # the role chunk arrived before the stall
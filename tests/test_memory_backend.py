@@ -0,0 +1,200 @@
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from memory_backend import (EMBEDDING_DIM, MemoryIndex, MemoryIndexHandle, publish_snapshot, snapshot_dir,
+                            snapshot_lock, text_terms)
+
+COLUMNS = ("product_id", "name", "price", "colour", "brand", "img", "description",
+           "avg_rating", "rating_count", "category", "colour_family")
+
+
+def write_files(directory, product_ids, version, delay=0.0):
+    rng = np.random.default_rng(len(product_ids))
+    embeddings = rng.normal(size=(len(product_ids), EMBEDDING_DIM)).astype(np.float32)
+    np.save(os.path.join(directory, "embeddings.npy"), embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True))
+    time.sleep(delay)
+    columns = {k: [None] * len(product_ids) for k in COLUMNS}
+    columns["product_id"] = list(product_ids)
+    with open(os.path.join(directory, "columns.json"), "w", encoding="utf-8") as f:
+        json.dump(columns, f)
+    with open(os.path.join(directory, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"catalog_version": version, "rows": len(product_ids)}, f)
+    return len(product_ids)
+
+
+def write_snapshot(path, product_ids, version, wait=True, delay=0.0):
+    """build_snapshot with the Postgres copy replaced by synthetic rows."""
+    return publish_snapshot(path, lambda d: write_files(d, product_ids, version, delay), wait)
+
+
+@pytest.fixture
+def snapshot(tmp_path):
+    path = str(tmp_path / "snapshot")
+    write_snapshot(path, ["a", "b"], version=1)
+    return path
+
+
+def test_reloads_when_the_snapshot_is_replaced(snapshot):
+    handle = MemoryIndexHandle(snapshot, version_fn=lambda: 2, check_interval=0, build_fn=lambda p, wait=True: 0)
+    assert len(handle.get()) == 2
+    write_snapshot(snapshot, ["a", "b", "c"], version=2)
+    assert len(handle.get()) == 3
+    assert handle.get().catalog_version == 2
+    assert handle.stats["reloads"] == 1
+
+
+def test_rebuilds_when_the_catalog_version_moves(snapshot):
+    version = {"value": 1}
+    handle = MemoryIndexHandle(
+        snapshot, version_fn=lambda: version["value"], check_interval=0,
+        build_fn=lambda p, wait=True: write_snapshot(p, ["a", "b", "c", "d"], version["value"], wait),
+    )
+    assert len(handle.get()) == 2
+    assert handle.get().catalog_version == 1
+    assert handle._rebuild_thread is None
+
+    version["value"] = 2
+    old = handle.get()      # the old index keeps serving while the rebuild runs
+    assert len(old) == 2
+    handle._rebuild_thread.join(5)
+    index = handle.get()
+    assert len(index) == 4 and index.catalog_version == 2
+    assert handle.stats["rebuilds"] == 1
+
+
+def test_version_errors_keep_the_current_index(snapshot):
+    def fail():
+        raise RuntimeError("database unavailable")
+
+    handle = MemoryIndexHandle(snapshot, version_fn=fail, check_interval=0, build_fn=lambda p, wait=True: 0)
+    index = handle.get()
+    assert handle.get() is index
+    assert handle.stats["version_errors"] == 1
+    assert handle._rebuild_thread is None
+
+
+def test_checks_are_rate_limited(snapshot):
+    calls = []
+    handle = MemoryIndexHandle(snapshot, version_fn=lambda: calls.append(1) or 1, check_interval=3600,
+                               build_fn=lambda p, wait=True: 0)
+    handle.get()
+    write_snapshot(snapshot, ["a", "b", "c"], version=1)
+    assert len(handle.get()) == 2
+    assert calls == []
+
+
+def test_concurrent_builds_publish_complete_snapshots(tmp_path):
+    path = str(tmp_path / "snapshot")
+    write_snapshot(path, ["a"], version=1)
+    results, errors = {}, []
+
+    def build(name, ids):
+        try:
+            results[name] = write_snapshot(path, ids, version=2, delay=0.2)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=build, args=(n, ids))
+               for n, ids in (("ingest", ["a", "b"]), ("app", ["a", "b", "c"]))]
+    for t in threads:
+        t.start()
+    # readers see the old or a new snapshot, never a missing or mixed one
+    while any(t.is_alive() for t in threads):
+        index = MemoryIndex(path)
+        assert len(index) == len(index.embeddings) in (1, 2, 3)
+    for t in threads:
+        t.join()
+    assert not errors
+    assert results == {"ingest": 2, "app": 3}
+    index = MemoryIndex(path)
+    assert len(index) == len(index.embeddings) and index.catalog_version == 2
+    generations = [n for n in os.listdir(path) if n.startswith("gen-")]
+    assert len(generations) <= 2 and os.path.basename(snapshot_dir(path)) in generations
+
+
+def test_rebuild_is_skipped_while_another_build_holds_the_lock(snapshot):
+    builds = []
+    handle = MemoryIndexHandle(snapshot, version_fn=lambda: 2, check_interval=0,
+                               build_fn=lambda p, wait=True: builds.append(p))
+    handle.get()
+    with snapshot_lock(snapshot) as locked:
+        assert locked
+        handle.get()
+        assert handle._rebuild_thread is None
+        assert write_snapshot(snapshot, ["x"], version=2, wait=False) is None
+    handle.get()
+    handle._rebuild_thread.join(5)
+    assert builds == [snapshot]
+
+
+def write_catalog(path, rows):
+    """rows of (product_id, name, brand, description, category, colour, embedding direction)."""
+    os.makedirs(path)
+    embeddings = np.zeros((len(rows), EMBEDDING_DIM), dtype=np.float32)
+    columns = {k: [] for k in COLUMNS}
+    for i, (pid, name, brand, description, category, colour, direction) in enumerate(rows):
+        embeddings[i, :2] = direction
+        embeddings[i] /= np.linalg.norm(embeddings[i])
+        for key, value in zip(("product_id", "name", "price", "colour", "brand", "img", "description",
+                               "avg_rating", "rating_count", "category", "colour_family"),
+                              (pid, name, 1000, colour, brand, None, description, None, 0, category, [])):
+            columns[key].append(value)
+    np.save(os.path.join(path, "embeddings.npy"), embeddings)
+    with open(os.path.join(path, "columns.json"), "w", encoding="utf-8") as f:
+        json.dump(columns, f)
+    return MemoryIndex(path)
+
+
+FILTERS = {"colour_family": None, "colour_values": [], "category": None, "name_patterns": [],
+           "max_price": None, "min_price": None}
+ANY_TIER = [(4, 0, False, False)]
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    return write_catalog(str(tmp_path / "catalog"), [
+        ("near1", "Red Silk Saree", "Mitera", "", "saree", "Red", (1.0, 0.0)),
+        ("near2", "Red Cotton Saree", "Sangria", "", "saree", "Red", (0.99, 0.1)),
+        ("near3", "Maroon Saree", "Mitera", "", "saree", "Maroon", (0.98, 0.2)),
+        ("far", "Gold-Toned Woven Design Saree", "Banarasi Weaves", "", "saree", "Gold", (0.0, 1.0)),
+    ])
+
+
+def test_text_terms_match_plurals_and_drop_stopwords():
+    assert text_terms("Sarees for the wedding") == ["saree", "wedding"]
+    assert text_terms("dresses | kurtis | jeans") == ["dress", "kurti", "jean"]
+
+
+def test_lexical_match_outside_the_vector_pool_is_fused_in(catalog):
+    query = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+    query[0] = 1.0
+    vector_only = catalog.search(query, FILTERS, None, None, ANY_TIER, top_k=3, pool=2)
+    assert [r[0] for r in vector_only][:2] == ["near1", "near2"]
+    assert "far" not in [r[0] for r in vector_only]
+
+    hybrid = catalog.search(query, FILTERS, None, None, ANY_TIER, top_k=3, text="banarasi | saree", pool=2)
+    assert "far" in [r[0] for r in hybrid]
+
+
+def test_scores_follow_the_sql_formula(catalog):
+    query = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+    query[0] = 1.0
+    rows = catalog.search(query, FILTERS, None, None, [(2, 1, False, False)], top_k=4, text="silk", pool=4, rrf_k=60)
+    by_id = {r[0]: r for r in rows}
+    # near1 is first by vector and the only lexical match; near3 is third by vector only
+    assert by_id["near1"][11] == pytest.approx(0.6 * (1 / 61 + 1 / 61) * 61 / 2 + 0.3)
+    assert by_id["near3"][11] == pytest.approx(0.6 * (1 / 63) * 61 / 2 + 0.3)
+    assert rows[0][0] == "near1"
+    assert all(r[-1] == 2 for r in rows)
+
+
+def test_empty_tier_falls_through(catalog):
+    query = np.ones(EMBEDDING_DIM, dtype=np.float32)
+    filters = dict(FILTERS, category="kurti")
+    rows = catalog.search(query, filters, None, "column", [(2, 1, False, True), (4, 0, False, False)], top_k=2)
+    assert {r[-1] for r in rows} == {4}
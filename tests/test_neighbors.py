@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+
+from neighbors import SCOPES, Catalog, rows_to_refresh, top_neighbors
+from taxonomy import COLOR_FAMILY_MAP
+
+COUNT = 5
+BLOCK = 16          # small blocks so the blockwise passes are exercised
+FAMILIES = sorted(COLOR_FAMILY_MAP)[:3]
+
+
+def make_products(rng, start, n):
+    """product_id -> (embedding, category, colour_family, source hash)."""
+    return {
+        f"p{i:03d}": (rng.normal(size=8), rng.choice(["saree", "kurti", None]),
+                      [str(f) for f in rng.choice(FAMILIES, size=rng.integers(0, 3), replace=False)], f"h{i}")
+        for i in range(start, start + n)
+    }
+
+
+def catalog_of(products):
+    ids = sorted(products)
+    return Catalog.from_arrays(
+        ids, np.array([products[p][0] for p in ids]), [products[p][1] for p in ids],
+        [products[p][2] for p in ids], [products[p][3] for p in ids],
+    )
+
+
+def refresh(catalog, stored, scope, count=COUNT, full=False):
+    """What refresh_neighbors leaves in product_neighbors, minus Postgres."""
+    rows, _ = rows_to_refresh(catalog, stored, full, count, scope, BLOCK)
+    result = {pid: entry for pid, entry in stored.items() if pid in catalog.position}
+    for row, neighbors, similarities in top_neighbors(catalog, rows, count, scope, BLOCK):
+        result[catalog.product_ids[row]] = (
+            [catalog.product_ids[j] for j in neighbors],
+            float(similarities[-1]) if len(similarities) else None,
+            catalog.source_hashes[row], f"{scope}/{count}",
+        )
+    return result, len(rows)
+
+
+def neighbor_ids(table):
+    return {pid: ids for pid, (ids, _, _, _) in table.items()}
+
+
+@pytest.mark.parametrize("scope", SCOPES)
+def test_incremental_refresh_matches_full_recompute(scope):
+    rng = np.random.default_rng(11)
+    products = make_products(rng, 0, 80)
+    stored, _ = refresh(catalog_of(products), {}, scope)
+
+    # inserts
+    products.update(make_products(rng, 100, 6))
+    # deletes
+    for pid in ("p003", "p010", "p042"):
+        del products[pid]
+    # changed text/embedding and changed attributes
+    for pid in ("p005", "p020"):
+        products[pid] = (rng.normal(size=8), *products[pid][1:3], products[pid][3] + "-new")
+    for pid, category in (("p030", "kurti"), ("p031", None)):
+        embedding, _, families, source_hash = products[pid]
+        products[pid] = (embedding, category, families, source_hash + "-cat")
+
+    catalog = catalog_of(products)
+    incremental, recomputed = refresh(catalog, stored, scope)
+    full, _ = refresh(catalog, {}, scope, full=True)
+    assert neighbor_ids(incremental) == neighbor_ids(full)
+    assert recomputed < len(catalog)        # it really was incremental
+
+
+def test_unchanged_catalog_recomputes_nothing():
+    rng = np.random.default_rng(3)
+    catalog = catalog_of(make_products(rng, 0, 40))
+    stored, _ = refresh(catalog, {}, "category")
+    assert refresh(catalog, stored, "category")[1] == 0
+
+
+@pytest.mark.parametrize("old, new", [(("category", COUNT), ("both", COUNT)), (("any", COUNT), ("any", COUNT + 2))])
+def test_changed_scope_or_count_recomputes_everything(old, new):
+    rng = np.random.default_rng(5)
+    catalog = catalog_of(make_products(rng, 0, 40))
+    stored, _ = refresh(catalog, {}, old[0], count=old[1])
+    rows, full = rows_to_refresh(catalog, stored, False, new[1], new[0], BLOCK)
+    assert full and len(rows) == len(catalog)
+    result, _ = refresh(catalog, stored, new[0], count=new[1])
+    assert neighbor_ids(result) == neighbor_ids(refresh(catalog, {}, new[0], count=new[1])[0])
@@ -0,0 +1,51 @@
+import pytest
+
+import search
+from result_cache import ResultCache
+
+
+def make_cache(version_fn):
+    return ResultCache(version_fn, max_entries=8, ttl=60, version_check=0)
+
+
+def test_version_change_empties_the_cache():
+    version = {"value": 1}
+    cache = make_cache(lambda: version["value"])
+    cache.get("k")
+    cache.set("k", [{"id": 1}], {"tier": 1})
+    assert cache.get_entry("k") == ([{"id": 1}], {"tier": 1})
+    version["value"] = 2
+    assert cache.get("k") is None
+    assert cache.stats["invalidations"] == 1
+
+
+def test_version_errors_bypass_the_cache():
+    state = {"fail": False}
+
+    def version_fn():
+        if state["fail"]:
+            raise RuntimeError("database unavailable")
+        return 1
+
+    cache = make_cache(version_fn)
+    cache.get("k")
+    cache.set("k", [{"id": 1}])
+    state["fail"] = True
+    assert cache.get("k") is None           # no exception, no unverified hit
+    cache.set("other", [{"id": 2}])         # ignored while the version is unknown
+    state["fail"] = False
+    assert cache.get("k") == [{"id": 1}]
+    assert cache.get("other") is None
+    assert cache.stats["version_errors"] == 1
+
+
+class FakeIndex:
+    catalog_version = 7
+    stamp = (1, 2)
+
+
+def test_memory_backend_version_comes_from_the_snapshot(monkeypatch):
+    monkeypatch.setattr(search, "SEARCH_BACKEND", "memory")
+    monkeypatch.setattr(search, "get_memory_index", lambda: FakeIndex())
+    monkeypatch.setattr(search, "get_pool", lambda: pytest.fail("memory mode must not query Postgres"))
+    assert search.backend_version() == (7, (1, 2))
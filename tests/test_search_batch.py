@@ -0,0 +1,18 @@
+import itertools
+
+from search import batch_statement_name, build_batch_sql
+
+MODES = list(itertools.product((None, "family", "values"), (None, "column", "name")))
+
+
+def test_statement_name_fits_postgres_identifier_limit():
+    name = batch_statement_name(build_batch_sql(sorted(MODES, key=lambda m: (m[0] or "", m[1] or ""))))
+    assert name.startswith("search_batch_")
+    assert len(name) <= 63
+
+
+def test_statement_name_follows_the_sql():
+    sql = build_batch_sql([("family", "column")])
+    assert batch_statement_name(sql) == batch_statement_name(build_batch_sql([("family", "column")]))
+    assert batch_statement_name(sql) != batch_statement_name(build_batch_sql([("family", "name")]))
+    assert batch_statement_name(sql) != batch_statement_name(build_batch_sql([("family", "column")], "halfvec"))
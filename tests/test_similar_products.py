@@ -0,0 +1,77 @@
+import json
+
+import numpy as np
+import psycopg2
+import pytest
+from psycopg2 import pool
+
+import search
+from memory_backend import EMBEDDING_DIM, MemoryIndex
+
+
+class FailingPool:
+    def __init__(self, error):
+        self.error = error
+
+    def run(self, fn):
+        raise self.error
+
+
+@pytest.mark.parametrize("error", [
+    psycopg2.OperationalError("connection refused"),
+    pool.PoolError("No database connection free after 10s"),
+    psycopg2.errors.UndefinedTable("product_neighbors"),
+])
+def test_database_errors_degrade_to_no_similar_items(monkeypatch, error):
+    monkeypatch.setattr(search, "SEARCH_BACKEND", "postgres")
+    monkeypatch.setattr(search, "get_pool", lambda: FailingPool(error))
+    assert search.get_similar_products("p1", 4) == []
+
+
+def test_other_errors_still_raise(monkeypatch):
+    monkeypatch.setattr(search, "SEARCH_BACKEND", "postgres")
+    monkeypatch.setattr(search, "get_pool", lambda: FailingPool(KeyError("bug")))
+    with pytest.raises(KeyError):
+        search.get_similar_products("p1", 4)
+
+
+@pytest.fixture
+def memory_index(tmp_path):
+    rows = [  # product_id, category, direction
+        ("s1", "saree", (1.0, 0.0)), ("s2", "saree", (0.9, 0.1)), ("s3", "saree", (0.1, 0.9)),
+        ("k1", "kurti", (1.0, 0.01)), ("x1", None, (0.95, 0.0)),
+    ]
+    embeddings = np.zeros((len(rows), EMBEDDING_DIM), dtype=np.float32)
+    embeddings[:, :2] = [d for _, _, d in rows]
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    np.save(tmp_path / "embeddings.npy", embeddings)
+    n = len(rows)
+    columns = {
+        "product_id": [r[0] for r in rows], "name": [r[0] for r in rows], "price": [1000] * n,
+        "colour": [None] * n, "brand": [None] * n, "img": [None] * n, "description": [None] * n,
+        "avg_rating": [None] * n, "rating_count": [0] * n, "category": [r[1] for r in rows],
+        "colour_family": [[]] * n,
+    }
+    (tmp_path / "columns.json").write_text(json.dumps(columns))
+    return MemoryIndex(str(tmp_path))
+
+
+def test_memory_backend_answers_without_postgres(monkeypatch, memory_index):
+    monkeypatch.setattr(search, "SEARCH_BACKEND", "memory")
+    monkeypatch.setattr(search, "NEIGHBORS_SCOPE", "category")
+    monkeypatch.setattr(search, "get_memory_index", lambda: memory_index)
+    monkeypatch.setattr(search, "get_pool", lambda: pytest.fail("memory mode must not query Postgres"))
+    assert [r["product_id"] for r in search.get_similar_products("s1", 4)] == ["s2", "s3"]
+    assert search.get_similar_products("unknown", 4) == []
+
+
+@pytest.mark.parametrize("scope, expected", [
+    ("any", ["x1", "k1", "s2"]),
+    ("category", ["s2", "s3"]),
+])
+def test_memory_similar_scopes(memory_index, scope, expected):
+    assert [r[0] for r in memory_index.similar("s1", 3, scope)] == expected
+
+
+def test_uncategorized_products_are_unrestricted(memory_index):
+    assert [r[0] for r in memory_index.similar("x1", 2, "category")] == ["s1", "k1"]
@@ -0,0 +1,37 @@
+import pytest
+
+from taxonomy import category_for_term, colour_families, derive_category
+
+
+@pytest.mark.parametrize("name, description, expected", [
+    ("Women Blue Printed Top with Lace Border", None, "shirt"),
+    ("Women Pink Solid Top with Pleats", None, "shirt"),
+    ("Women Navy Blue Embellished Zari Border Kurta", None, "kurti"),
+    ("Red & Gold-Toned Zari Woven Design Banarasi Saree", None, "saree"),
+    ("Women Green Silk Blend Saree with Blouse Piece", None, "saree"),
+    ("Women Yellow Floral Printed Kurta with Palazzos & Dupatta", None, "kurti"),
+    ("Women Blue Denim Jacket", None, "jacket"),
+    ("Men Blue Slim Fit Mid-Rise Clean Look Stretchable Jeans", None, "jeans"),
+    ("Women Black Solid Shirt Dress", None, "dress"),
+    ("Men White Printed Round Neck T-shirt", None, "shirt"),
+    ("Women Maroon Anarkali Kurta", None, "kurti"),
+    ("Women Teal Solid Maxi Dress with Belt", None, "dress"),
+    ("Women Off-White Self Design Palazzos", "Pair it with a short kurti", "kurti"),
+    ("Women Beige Solid Palazzos", "Elasticated waistband with pleats", None),
+    ("", None, None),
+    (None, None, None),
+])
+def test_derive_category(name, description, expected):
+    assert derive_category(name, description) == expected
+
+
+@pytest.mark.parametrize("term, expected", [
+    ("Sarees", "saree"), ("kurta", "kurti"), ("tops", "shirt"), ("jeans", "jeans"), ("lehenga", None),
+])
+def test_category_for_term(term, expected):
+    assert category_for_term(term) == expected
+
+
+def test_colour_families_can_overlap():
+    assert colour_families("Peach") == ["red", "pink"]
+    assert colour_families(None) == []
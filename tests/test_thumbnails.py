@@ -0,0 +1,104 @@
+import os
+
+import pytest
+from PIL import Image
+
+import thumbnails
+from thumbnails import ThumbnailCache
+
+
+def write_image(path, colour, size=(900, 1000)):
+    Image.new("RGB", size, colour).save(path, "PNG")
+    return str(path)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ThumbnailCache(root=str(tmp_path / "thumbs"), index_path=str(tmp_path / "index.sqlite3"),
+                          size=(90, 120), fmt="JPEG", url_prefix="app/static/thumbs", access_flush=3600)
+
+
+def count_writes(cache):
+    writes = []
+    cache._db.set_trace_callback(lambda sql: writes.append(sql) if sql.lstrip().upper().startswith(
+        ("UPDATE", "INSERT", "DELETE")) else None)
+    return writes
+
+
+def test_default_paths_resolve_against_the_module():
+    base = os.path.dirname(os.path.abspath(thumbnails.__file__))
+    if "THUMBNAIL_DIR" not in os.environ:
+        assert thumbnails.THUMBNAIL_DIR == os.path.join(base, "static/thumbs")
+    if "THUMBNAIL_INDEX_PATH" not in os.environ:
+        assert thumbnails.THUMBNAIL_INDEX_PATH == os.path.join(base, ".thumbnails.sqlite3")
+
+
+def test_ensure_creates_a_resized_content_addressed_file(cache, tmp_path):
+    source = write_image(tmp_path / "red.png", "red")
+    name = cache.ensure(source)
+    with Image.open(os.path.join(cache.root, name)) as image:
+        assert image.size == (90, 100)
+    # same pixels from another path share the file
+    assert cache.ensure(write_image(tmp_path / "red-copy.png", "red")) == name
+    assert cache.url(name) == f"app/static/thumbs/{name}"
+
+
+def test_lookups_do_not_write_to_the_index(cache, tmp_path):
+    sources = [write_image(tmp_path / f"{c}.png", c) for c in ("red", "green", "blue")]
+    for source in sources:
+        cache.ensure(source)
+    writes = count_writes(cache)
+    for _ in range(5):
+        assert all(cache.lookup(source) for source in sources)
+    assert writes == []
+    cache.flush()
+    assert len(writes) == 3       # one batched UPDATE per touched key
+
+
+def test_access_times_are_flushed_before_eviction(cache, tmp_path):
+    old, recent = write_image(tmp_path / "old.png", "red"), write_image(tmp_path / "recent.png", "blue")
+    cache.ensure(old)
+    cache.ensure(recent)
+    cache._db.execute("UPDATE thumbnails SET last_access = 0;")
+    cache.lookup(recent)          # only recorded in memory so far
+    cache.max_bytes = os.path.getsize(os.path.join(cache.root, cache.lookup(recent)))
+    cache.evict()
+    assert cache.lookup(old) is None
+    assert cache.lookup(recent) is not None
+
+
+def test_index_is_shared_through_sqlite(cache, tmp_path):
+    source = write_image(tmp_path / "red.png", "red")
+    name = cache.ensure(source)
+    cache.flush()
+    other = ThumbnailCache(root=cache.root, index_path=str(tmp_path / "index.sqlite3"),
+                           size=(90, 120), fmt="JPEG", read_fn=lambda s: pytest.fail("should not re-read"))
+    assert other.lookup(source) == name
+
+
+def test_missing_file_is_a_miss(cache, tmp_path):
+    source = write_image(tmp_path / "red.png", "red")
+    os.remove(os.path.join(cache.root, cache.ensure(source)))
+    assert cache.lookup(source) is None
+    assert cache.ensure(source) is not None
+
+
+def test_unreadable_source_fails_softly(cache, tmp_path):
+    assert cache.ensure(str(tmp_path / "missing.png")) is None
+    assert cache.stats["failed"] == 1
+
+
+def test_prefetch_stops_once_the_cache_budget_is_full(cache, tmp_path):
+    sources = [write_image(tmp_path / f"{c}.png", c) for c in ("red", "green", "blue", "white")]
+    sizing = ThumbnailCache(root=str(tmp_path / "sizing"), index_path=str(tmp_path / "sizing.sqlite3"),
+                            size=cache.size, fmt=cache.fmt)
+    cache.max_bytes = sum(os.path.getsize(os.path.join(sizing.root, sizing.ensure(s))) for s in sources[:2])
+    cache.ensure(sources[0])
+    stats = cache.prefetch(sources, workers=1)
+    assert stats["hits"] == 1 and stats["created"] == 1 and stats["skipped"] == 2
+    assert stats["evictions"] == 0
+    assert cache.lookup(sources[0]) and cache.lookup(sources[1])
+    assert cache.lookup(sources[2]) is None and cache.lookup(sources[3]) is None
+    # a rerun fetches nothing new, and cached sources past the budget still count as hits
+    again = cache.prefetch(sources[1:] + sources[:1], workers=1)
+    assert again["created"] == 0 and again["hits"] == 2 and again["skipped"] == 2
@@ -0,0 +1,24 @@
+import pytest
+
+from timing import Histograms, percentile
+
+
+@pytest.mark.parametrize("pct, expected", [(0, 1), (50, 3), (95, 5), (100, 5)])
+def test_percentile_sorts_its_input(pct, expected):
+    assert percentile([5, 1, 4, 2, 3], pct) == expected
+
+
+def test_percentile_is_nearest_rank():
+    values = list(range(1, 21))             # 1..20
+    assert percentile(values, 95) == 19     # rank ceil(0.95 * 20) = 19
+    assert percentile(values, 99) == 20
+    assert percentile(values, 50) == 10
+    assert percentile(values, 5) == 1
+    assert percentile([7], 99) == 7
+
+
+def test_histogram_snapshot_uses_percentile():
+    histograms = Histograms()
+    for ms in (30, 10, 20):
+        histograms.observe("search", ms)
+    assert histograms.snapshot()["search"] == {"count": 3, "p50": 20, "p95": 30, "p99": 30}
@@ -0,0 +1,53 @@
+import logging
+
+import pytest
+
+import search
+
+
+@pytest.fixture
+def llm_calls(monkeypatch):
+    calls = []
+
+    def extract_intent(query):
+        calls.append("intent")
+        return {"category": "saree", "color": "red"}
+
+    def rewrite_query(query):
+        calls.append("rewrite")
+        return "red saree"
+
+    monkeypatch.setattr(search, "extract_intent", extract_intent)
+    monkeypatch.setattr(search, "rewrite_query", rewrite_query)
+    return calls
+
+
+def test_empty_understanding_uses_the_rules_fast_path(llm_calls):
+    intent, rewritten = search._understand("red saree under 2000", {}, "")
+    assert intent == {"category": "saree", "color": "red", "max_price": 2000}
+    assert rewritten == "red saree"
+    assert llm_calls == []
+
+
+def test_empty_understanding_falls_back_to_the_llm(llm_calls):
+    intent, rewritten = search._understand("something elegant for my sister's sangeet", {}, "")
+    assert sorted(llm_calls) == ["intent", "rewrite"]
+    assert intent == {"category": "saree", "color": "red"}
+    assert rewritten == "red saree"
+
+
+def test_given_understanding_is_kept(llm_calls):
+    assert search._understand("anything", {"category": "kurti"}, "kurti") == ({"category": "kurti"}, "kurti")
+    assert llm_calls == []
+
+
+def test_llm_failures_are_logged_and_the_other_answer_kept(monkeypatch, llm_calls, caplog):
+    def broken(query):
+        raise RuntimeError("groq down")
+
+    monkeypatch.setattr(search, "extract_intent", broken)
+    with caplog.at_level(logging.WARNING, logger="search"):
+        intent, rewritten = search._understand("something elegant for my sister's sangeet", None, None)
+    assert intent == {}
+    assert rewritten == "red saree"
+    assert "groq down" in caplog.text
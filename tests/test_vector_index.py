@@ -0,0 +1,36 @@
+import pytest
+
+from vector_index import RECALL_MODES, recall_mode_sql
+
+
+def settings(sql_and_params):
+    _, params = sql_and_params
+    return dict(zip(params[::2], params[1::2]))
+
+
+@pytest.mark.parametrize("mode", [m for m in RECALL_MODES if m != "exact"])
+def test_ann_modes_scan_iteratively(mode):
+    knobs = settings(recall_mode_sql(mode, 10))
+    assert knobs["hnsw.iterative_scan"] == "relaxed_order"
+    assert knobs["ivfflat.iterative_scan"] == "relaxed_order"
+
+
+def test_exact_mode_has_no_ann_knobs():
+    knobs = settings(recall_mode_sql("exact", 10))
+    assert knobs == {"enable_indexscan": "off"}
+
+
+def test_iterative_scan_can_be_turned_off_for_old_pgvector():
+    knobs = settings(recall_mode_sql("balanced", 10, iterative_scan="off"))
+    assert "hnsw.iterative_scan" not in knobs
+
+
+def test_ef_search_covers_top_k_within_pgvector_limit():
+    assert settings(recall_mode_sql("fast", 300))["hnsw.ef_search"] == "300"
+    assert settings(recall_mode_sql("fast", 5000))["hnsw.ef_search"] == "1000"
+
+
+def test_strict_order_keeps_ivfflat_scans_ordered():
+    knobs = settings(recall_mode_sql("balanced", 10, iterative_scan="strict_order"))
+    assert knobs["hnsw.iterative_scan"] == "strict_order"
+    assert knobs["ivfflat.iterative_scan"] == "off"     # pgvector has no strict_order for IVFFlat
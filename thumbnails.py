@@ -0,0 +1,344 @@
+# thumbnails.py
+"""
+Card-size thumbnails of product images, so a card grid loads a few KB per card
+instead of the full catalog image.
+
+Images are fetched (http(s) URLs or local paths), resized to THUMBNAIL_SIZE and
+re-encoded as WebP (JPEG if Pillow lacks WebP) into THUMBNAIL_DIR. Files are
+content-addressed by the SHA-256 of the thumbnail bytes, so products sharing an
+image share a file. A SQLite index maps each (source, size, format) to its file
+and records the last access; once the files exceed THUMBNAIL_CACHE_MB the least
+recently used entries are evicted. Lookups are served from an in-memory copy of
+the index and their access times are written back in batches, so rendering a
+grid does no SQLite writes.
+
+Relative paths resolve against this file's directory. The default directory
+sits under static/, which Streamlit serves at app/static/ when
+server.enableStaticServing is on (.streamlit/config.toml).
+
+    python thumbnails.py              # prefetch every catalog image
+"""
+import hashlib
+import io
+import os
+import sqlite3
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from PIL import Image, ImageOps, features
+from tqdm import tqdm
+
+from db import connect
+
+_BASE_DIR = os.path.dirname(os.path.abspath(__file__))   # Streamlit serves static/ next to app.py, not the cwd
+
+THUMBNAIL_DIR = os.path.join(_BASE_DIR, os.getenv("THUMBNAIL_DIR", "static/thumbs"))
+THUMBNAIL_URL_PREFIX = os.getenv("THUMBNAIL_URL_PREFIX", "app/static/thumbs")   # where Streamlit serves THUMBNAIL_DIR
+THUMBNAIL_INDEX_PATH = os.path.join(_BASE_DIR, os.getenv("THUMBNAIL_INDEX_PATH", ".thumbnails.sqlite3"))  # kept out of the served directory
+THUMBNAIL_SIZE = tuple(int(v) for v in os.getenv("THUMBNAIL_SIZE", "360x480").split("x"))   # bounding box
+THUMBNAIL_QUALITY = int(os.getenv("THUMBNAIL_QUALITY", "80"))
+THUMBNAIL_CACHE_MB = float(os.getenv("THUMBNAIL_CACHE_MB", "500"))
+THUMBNAIL_FETCH_TIMEOUT = float(os.getenv("THUMBNAIL_FETCH_TIMEOUT", "5"))    # seconds
+THUMBNAIL_WORKERS = int(os.getenv("THUMBNAIL_WORKERS", "8"))                  # prefetch downloads in flight
+THUMBNAIL_ACCESS_FLUSH = float(os.getenv("THUMBNAIL_ACCESS_FLUSH", "30"))      # seconds between access-time writes
+
+MAX_SOURCE_BYTES = 20 * 1024 * 1024
+# eviction sums the index, so only run it every N new thumbnails
+_EVICT_EVERY = 50
+
+THUMBNAIL_FORMAT = "WEBP" if features.check("webp") else "JPEG"
+_EXTENSIONS = {"WEBP": "webp", "JPEG": "jpg"}
+
+
+def read_source(source: str, timeout: float = THUMBNAIL_FETCH_TIMEOUT) -> bytes:
+    """Image bytes from an http(s) URL, a file:// URL or a local path."""
+    if source.startswith(("http://", "https://")):
+        request = urllib.request.Request(source, headers={"User-Agent": "fashion-assistant-thumbnails"})
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            data = response.read(MAX_SOURCE_BYTES + 1)
+    else:
+        path = source[len("file://"):] if source.startswith("file://") else source
+        with open(path, "rb") as f:
+            data = f.read(MAX_SOURCE_BYTES + 1)
+    if len(data) > MAX_SOURCE_BYTES:
+        raise ValueError(f"Image larger than {MAX_SOURCE_BYTES} bytes: {source}")
+    return data
+
+
+def make_thumbnail(data: bytes, size: tuple = THUMBNAIL_SIZE, fmt: str = THUMBNAIL_FORMAT,
+                   quality: int = THUMBNAIL_QUALITY) -> bytes:
+    """Resizes to fit within `size` (never upscales) and re-encodes."""
+    with Image.open(io.BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail(size, Image.Resampling.LANCZOS)
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        out = io.BytesIO()
+        image.save(out, fmt, quality=quality, optimize=True)
+    return out.getvalue()
+
+
+class ThumbnailCache:
+    """
+    On-disk thumbnail store. lookup() only consults the in-memory index; ensure()
+    checks the SQLite index (another process may have made it) and then fetches
+    and resizes on a miss. Concurrent ensure() calls for one source may both do the
+    work; the second write is a no-op because the file name is the content hash.
+    """
+
+    def __init__(self, root: str = THUMBNAIL_DIR, index_path: str = THUMBNAIL_INDEX_PATH,
+                 size: tuple = THUMBNAIL_SIZE, fmt: str = THUMBNAIL_FORMAT, quality: int = THUMBNAIL_QUALITY,
+                 max_bytes: int = int(THUMBNAIL_CACHE_MB * 1024 * 1024), url_prefix: str = THUMBNAIL_URL_PREFIX,
+                 read_fn=read_source, access_flush: float = THUMBNAIL_ACCESS_FLUSH):
+        self.root = root
+        self.size = size
+        self.fmt = fmt
+        self.quality = quality
+        self.max_bytes = max_bytes
+        self.url_prefix = url_prefix.rstrip("/")
+        self._read = read_fn
+        self.access_flush = access_flush
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._touched = {}      # key -> last access not yet written to the index
+        self._written_bytes = 0   # bytes of new files written by this instance
+        self._flushed = time.monotonic()
+        self.stats = {"hits": 0, "misses": 0, "created": 0, "failed": 0, "evictions": 0, "skipped": 0}
+
+        os.makedirs(root, exist_ok=True)
+        self._db = sqlite3.connect(index_path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL;")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS thumbnails (
+                key TEXT PRIMARY KEY,
+                file TEXT NOT NULL,
+                bytes INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            );
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS thumbnails_last_access ON thumbnails (last_access);")
+        self._db.execute("CREATE INDEX IF NOT EXISTS thumbnails_file ON thumbnails (file);")
+        self._files = dict(self._db.execute("SELECT key, file FROM thumbnails;").fetchall())
+
+    def key(self, source: str) -> str:
+        payload = f"{source}|{self.size[0]}x{self.size[1]}|{self.fmt}|{self.quality}"
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def lookup(self, source: str) -> Optional[str]:
+        """File name (relative to root) of a cached thumbnail, or None."""
+        key = self.key(source)
+        with self._lock:
+            name = self._files.get(key)
+            if name is not None and os.path.exists(os.path.join(self.root, name)):
+                now = time.monotonic()
+                self._touched[key] = time.time()
+                if now - self._flushed >= self.access_flush:
+                    self._flush(now)
+                self.stats["hits"] += 1
+                return name
+            if name is not None:   # file removed behind our back
+                self._forget(key)
+            self.stats["misses"] += 1
+            return None
+
+    def _flush(self, now: Optional[float] = None):
+        """Writes the batched access times to the index."""
+        if self._touched:
+            self._db.executemany("UPDATE thumbnails SET last_access = ? WHERE key = ?;",
+                                 [(t, k) for k, t in self._touched.items()])
+            self._touched.clear()
+        self._flushed = time.monotonic() if now is None else now
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def _forget(self, key: str):
+        self._files.pop(key, None)
+        self._touched.pop(key, None)
+        self._db.execute("DELETE FROM thumbnails WHERE key = ?;", (key,))
+
+    def ensure(self, source: str) -> Optional[str]:
+        """Cached file name, creating the thumbnail first if needed. None if the image can't be read."""
+        name = self.lookup(source)
+        if name is not None:
+            return name
+        key = self.key(source)
+        with self._lock:
+            row = self._db.execute("SELECT file FROM thumbnails WHERE key = ?;", (key,)).fetchone()
+            if row and os.path.exists(os.path.join(self.root, row[0])):
+                self._files[key] = row[0]
+                self._touched[key] = time.time()
+                return row[0]
+        try:
+            data = make_thumbnail(self._read(source), self.size, self.fmt, self.quality)
+        except Exception:
+            with self._lock:
+                self.stats["failed"] += 1
+            return None
+
+        digest = hashlib.sha256(data).hexdigest()
+        name = f"{digest[:2]}/{digest}.{_EXTENSIONS[self.fmt]}"
+        path = os.path.join(self.root, name)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+            with self._lock:
+                self._written_bytes += len(data)
+
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO thumbnails (key, file, bytes, last_access) VALUES (?, ?, ?, ?);",
+                (key, name, len(data), time.time())
+            )
+            self._files[key] = name
+            self._touched.pop(key, None)
+            self.stats["created"] += 1
+            self._writes += 1
+            if self._writes % _EVICT_EVERY == 0:
+                self._evict()
+        return name
+
+    def url(self, name: str) -> str:
+        return f"{self.url_prefix}/{name}"
+
+    def _evict(self):
+        """Drops least recently used entries (and their files, once unreferenced) until under max_bytes."""
+        self._flush()
+        total = self._used_bytes()
+        if total <= self.max_bytes:
+            return
+        rows = self._db.execute("SELECT key, file, bytes FROM thumbnails ORDER BY last_access;").fetchall()
+        for key, name, size in rows:
+            if total <= self.max_bytes:
+                break
+            self._forget(key)
+            self.stats["evictions"] += 1
+            if self._db.execute("SELECT 1 FROM thumbnails WHERE file = ? LIMIT 1;", (name,)).fetchone() is None:
+                try:
+                    os.remove(os.path.join(self.root, name))
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+    def _used_bytes(self) -> int:
+        return self._db.execute(
+            "SELECT COALESCE(SUM(bytes), 0) FROM (SELECT file, MAX(bytes) AS bytes FROM thumbnails GROUP BY file);"
+        ).fetchone()[0]
+
+    def evict(self):
+        with self._lock:
+            self._evict()
+
+    def prefetch(self, sources: list, workers: int = THUMBNAIL_WORKERS, progress: bool = False) -> dict:
+        """
+        ensure() for the sources, in the given order, on a thread pool; returns the
+        counters for this run. Once the cache holds max_bytes the remaining sources
+        are skipped ("skipped"): fetching them would only evict what was just made.
+        """
+        before = dict(self.stats)
+        sources = list(dict.fromkeys(s for s in sources if s))
+        with self._lock:
+            self._flush()
+            budget = self.max_bytes - self._used_bytes() + self._written_bytes
+
+        def fetch(source):
+            if self._written_bytes < budget:
+                return self.ensure(source)
+            name = self.lookup(source)
+            if name is None:
+                with self._lock:
+                    self.stats["skipped"] += 1
+            return name
+
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="thumbnails") as pool:
+            results = pool.map(fetch, sources)
+            for _ in tqdm(results, total=len(sources), unit="images", disable=not progress):
+                pass
+        self.evict()
+        return {k: self.stats[k] - before[k] for k in self.stats}
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            self._flush()
+            stats = dict(self.stats)
+            stats["entries"], stats["bytes"] = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM thumbnails;"
+            ).fetchone()
+        return stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+# misses seen while rendering are filled in the background, for the next render
+_background = ThreadPoolExecutor(max_workers=2, thread_name_prefix="thumbnails-bg")
+_queued = set()
+
+
+def get_thumbnail_cache() -> ThumbnailCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ThumbnailCache()
+    return _cache
+
+
+def thumbnail_url(source: Optional[str]) -> Optional[str]:
+    """
+    Served URL of the cached thumbnail for render_card. On a miss the original
+    source is returned and the thumbnail is created in the background.
+    """
+    if not source:
+        return source
+    cache = get_thumbnail_cache()
+    name = cache.lookup(source)
+    if name is not None:
+        return cache.url(name)
+    with _cache_lock:
+        if source not in _queued:
+            _queued.add(source)
+            _background.submit(_fill, cache, source)
+    return source
+
+
+def _fill(cache: ThumbnailCache, source: str):
+    try:
+        cache.ensure(source)
+    finally:
+        with _cache_lock:
+            _queued.discard(source)
+
+
+def prefetch_catalog(conn=None, cache: Optional[ThumbnailCache] = None, workers: int = THUMBNAIL_WORKERS) -> dict:
+    """
+    Thumbnails for product images, most rated products first, until the cache
+    budget is full; only missing ones are fetched.
+    """
+    own_conn = conn is None
+    conn = conn or connect()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT img FROM myntra_products WHERE COALESCE(img, '') <> ''
+                GROUP BY img ORDER BY MAX(COALESCE(rating_count, 0)) DESC, img;
+            """)
+            sources = [r[0] for r in cur.fetchall()]
+        conn.rollback()
+    finally:
+        if own_conn:
+            conn.close()
+    return (cache or get_thumbnail_cache()).prefetch(sources, workers, progress=True)
+
+
+if __name__ == "__main__":
+    started = time.perf_counter()
+    stats = prefetch_catalog()
+    print("Thumbnails ready in {:.1f}s: {created} created, {hits} already cached, {failed} failed, "
+          "{skipped} skipped (cache full), {evictions} evicted".format(time.perf_counter() - started, **stats))
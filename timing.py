@@ -0,0 +1,147 @@
+# timing.py
+"""
+Lightweight hot-path timers. span() measures a block, adds it to the current
+request's trace and to a per-stage histogram, and logs it as one JSON line on
+the "timing" logger (INFO level).
+
+    with timing.trace() as t:
+        with timing.span("search.encode"):
+            ...
+    t.spans        # [{"name": "search.encode", "ms": 12.3, "depth": 0, "at_ms": 0.1}, ...]
+"""
+import contextvars
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+from typing import Optional
+
+logger = logging.getLogger("timing")
+
+TIMING_HISTOGRAM_SIZE = int(os.getenv("TIMING_HISTOGRAM_SIZE", "1000"))   # samples kept per stage
+
+_current_trace = contextvars.ContextVar("timing_trace", default=None)
+_depth = contextvars.ContextVar("timing_depth", default=0)
+
+
+class Trace:
+    """Spans recorded while handling one request."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.spans = []
+        self.started = time.perf_counter()
+        self.total_ms = None
+
+    def add(self, span: dict):
+        self.spans.append(span)   # list.append is atomic; worker threads may add spans
+
+
+class Histograms:
+    """Recent durations per stage with p50/p95/p99 on demand."""
+
+    def __init__(self, size: int = TIMING_HISTOGRAM_SIZE):
+        self.size = size
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, ms: float):
+        with self._lock:
+            samples = self._samples.get(name)
+            if samples is None:
+                samples = self._samples[name] = deque(maxlen=self.size)
+            samples.append(ms)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            copies = {name: list(samples) for name, samples in self._samples.items()}
+        return {
+            name: {
+                "count": len(values),
+                "p50": percentile(values, 50),
+                "p95": percentile(values, 95),
+                "p99": percentile(values, 99),
+            }
+            for name, values in sorted(copies.items()) if values
+        }
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+
+
+def percentile(values: list, pct: float) -> float:
+    """Nearest-rank percentile: the smallest value with at least pct% of values at or below it."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered), max(1, math.ceil(pct / 100 * len(ordered)))) - 1]
+
+
+histograms = Histograms()
+
+
+def record(name: str, ms: float, depth: Optional[int] = None, started: Optional[float] = None, **fields):
+    """Records an already measured duration (e.g. time to first token)."""
+    entry = {"name": name, "ms": round(ms, 3), "depth": _depth.get() if depth is None else depth, **fields}
+    current = _current_trace.get()
+    if current is not None:
+        # offset into the request, so spans can be listed in start order
+        if started is None:
+            started = time.perf_counter() - ms / 1000
+        entry["at_ms"] = round((started - current.started) * 1000, 3)
+        current.add(entry)
+    histograms.observe(name, ms)
+    if logger.isEnabledFor(logging.INFO):
+        trace_name = current.name if current is not None else None
+        logger.info(json.dumps({"event": "span", "trace": trace_name, **entry}, default=str))
+
+
+@contextmanager
+def span(name: str, **fields):
+    """Times the block; extra fields can be added to the yielded dict inside it."""
+    depth = _depth.get()
+    token = _depth.set(depth + 1)
+    extra = dict(fields)
+    started = time.perf_counter()
+    try:
+        yield extra
+    finally:
+        _depth.reset(token)
+        record(name, (time.perf_counter() - started) * 1000, depth=depth, started=started, **extra)
+
+
+def timed(name: str):
+    """Decorator form of span()."""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def trace(name: str = "request"):
+    """Collects the spans of one request; nested traces are not supported."""
+    current = Trace(name)
+    token = _current_trace.set(current)
+    try:
+        yield current
+    finally:
+        current.total_ms = round((time.perf_counter() - current.started) * 1000, 3)
+        _current_trace.reset(token)
+        histograms.observe(f"{name}.total", current.total_ms)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps({"event": "trace", "trace": name, "ms": current.total_ms,
+                                    "spans": len(current.spans)}))
+
+
+def in_context(fn):
+    """Wraps fn to run in a copy of the caller's context, so executor threads join its trace."""
+    ctx = contextvars.copy_context()
+    return lambda *args, **kwargs: ctx.run(fn, *args, **kwargs)
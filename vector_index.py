@@ -0,0 +1,177 @@
+# vector_index.py
+"""pgvector ANN index management and per-query recall settings."""
+import math
+import os
+
+INDEX_NAME = "myntra_products_embedding_idx"
+INDEX_KINDS = ("hnsw", "ivfflat", "none")
+EMBEDDING_DIM = 768
+
+# What the ANN index is built over. The table always keeps the full-precision
+# embedding for the exact rerank; only the index shrinks. Per 768-d row:
+#   none     vector(768)   ~3 KB
+#   halfvec  halfvec(768)  ~1.5 KB  (2 bytes per dim)
+#   binary   bit(768)      96 B     (1 bit per dim, Hamming distance)
+# benchmarks/quantization.py measures index sizes and recall on the live catalog.
+QUANTIZATIONS = ("none", "halfvec", "binary")
+VECTOR_QUANTIZATION = os.getenv("VECTOR_QUANTIZATION", "none")
+
+# candidates fetched from a quantized index per result before the exact rerank
+RERANK_OVERFETCH = {"none": 1, "halfvec": 2, "binary": 10}
+VECTOR_RERANK_OVERFETCH = int(os.getenv("VECTOR_RERANK_OVERFETCH", "0"))   # 0 = per-quantization default
+
+VECTOR_INDEX = os.getenv("VECTOR_INDEX", "hnsw")
+HNSW_M = int(os.getenv("HNSW_M", "16"))
+HNSW_MAX_EF_SEARCH = 1000                                           # pgvector rejects anything larger
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "64"))
+IVFFLAT_LISTS = int(os.getenv("IVFFLAT_LISTS", "0"))                # 0 = derive from row count
+INDEX_MAINTENANCE_WORK_MEM = os.getenv("INDEX_MAINTENANCE_WORK_MEM", "512MB")
+
+# latency/recall trade-off applied per query; "exact" disables the ANN index
+RECALL_MODES = {
+    "fast": {"hnsw.ef_search": 40, "ivfflat.probes": 1},
+    "balanced": {"hnsw.ef_search": 100, "ivfflat.probes": 10},
+    "accurate": {"hnsw.ef_search": 400, "ivfflat.probes": 40},
+    "exact": {"enable_indexscan": "off"},
+}
+DEFAULT_RECALL_MODE = os.getenv("SEARCH_RECALL_MODE", "balanced")
+# ANN scans stop after ef_search / probes candidates, and the cascade's filters are
+# applied to those afterwards, so a selective filter could leave a tier empty and
+# show a false "relaxed" notice. Iterative scans (pgvector >= 0.8) keep scanning
+# until enough rows pass; "off" skips the setting on older pgvector.
+VECTOR_ITERATIVE_SCAN = os.getenv("VECTOR_ITERATIVE_SCAN", "relaxed_order")
+ITERATIVE_SCAN_MODES = ("relaxed_order", "strict_order", "off")
+# for keyset paging, which needs rows in exact distance order (unless scans are off entirely)
+ORDERED_ITERATIVE_SCAN = "off" if VECTOR_ITERATIVE_SCAN == "off" else "strict_order"
+
+
+def default_ivfflat_lists(row_count: int) -> int:
+    """pgvector guidance: rows / 1000 up to 1M rows, sqrt(rows) beyond."""
+    if row_count <= 1_000_000:
+        return max(1, row_count // 1000)
+    return int(math.sqrt(row_count))
+
+
+def _check_quantization(quantization: str) -> str:
+    quantization = quantization or VECTOR_QUANTIZATION
+    if quantization not in QUANTIZATIONS:
+        raise ValueError(f"Unknown quantization: {quantization}")
+    return quantization
+
+
+def index_expression(quantization: str = None) -> str:
+    """Indexed expression plus operator class; must match coarse_distance_sql."""
+    quantization = _check_quantization(quantization)
+    if quantization == "halfvec":
+        return f"(embedding::halfvec({EMBEDDING_DIM})) halfvec_cosine_ops"
+    if quantization == "binary":
+        return f"(binary_quantize(embedding)::bit({EMBEDDING_DIM})) bit_hamming_ops"
+    return "embedding vector_cosine_ops"
+
+
+def coarse_distance_sql(quantization: str = None, param: str = "$1") -> str:
+    """ORDER BY expression that the (possibly quantized) index can serve."""
+    quantization = _check_quantization(quantization)
+    if quantization == "halfvec":
+        return f"embedding::halfvec({EMBEDDING_DIM}) <=> {param}::halfvec({EMBEDDING_DIM})"
+    if quantization == "binary":
+        return f"binary_quantize(embedding)::bit({EMBEDDING_DIM}) <~> binary_quantize({param}::vector)"
+    return f"embedding <=> {param}::vector"
+
+
+def rerank_candidates(top_k: int, quantization: str = None) -> int:
+    """How many rows the coarse search returns for `top_k` reranked results."""
+    quantization = _check_quantization(quantization)
+    if quantization == "none":
+        return top_k
+    return top_k * (VECTOR_RERANK_OVERFETCH or RERANK_OVERFETCH[quantization])
+
+
+def index_definition(kind: str, row_count: int = 0, m: int = HNSW_M,
+                     ef_construction: int = HNSW_EF_CONSTRUCTION, lists: int = IVFFLAT_LISTS,
+                     quantization: str = None) -> str:
+    """USING clause for the embedding index; cosine ops to match the `<=>` queries."""
+    expression = index_expression(quantization)
+    if kind == "hnsw":
+        return f"USING hnsw ({expression}) WITH (m = {int(m)}, ef_construction = {int(ef_construction)})"
+    if kind == "ivfflat":
+        lists = int(lists) or default_ivfflat_lists(row_count)
+        return f"USING ivfflat ({expression}) WITH (lists = {lists})"
+    raise ValueError(f"Unknown index kind: {kind}")
+
+
+def index_exists(cur) -> bool:
+    cur.execute("SELECT 1 FROM pg_indexes WHERE indexname = %s;", (INDEX_NAME,))
+    return cur.fetchone() is not None
+
+
+def build_index(conn, kind: str = VECTOR_INDEX, **params):
+    """
+    (Re)builds the ANN index without blocking reads: the new index is built
+    CONCURRENTLY under a temporary name and swapped in, so search keeps using the
+    old one until the rename. kind="none" drops it.
+    """
+    if kind not in INDEX_KINDS:
+        raise ValueError(f"Unknown index kind: {kind}")
+
+    previous_autocommit = conn.autocommit
+    conn.autocommit = True   # CREATE/DROP INDEX CONCURRENTLY cannot run inside a transaction
+    try:
+        with conn.cursor() as cur:
+            if kind == "none":
+                cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {INDEX_NAME};")
+                return
+
+            cur.execute("SELECT COUNT(*) FROM myntra_products;")
+            row_count = cur.fetchone()[0]
+            cur.execute("SELECT set_config('maintenance_work_mem', %s, false);", (INDEX_MAINTENANCE_WORK_MEM,))
+
+            tmp_name = f"{INDEX_NAME}_new"
+            cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {tmp_name};")
+            cur.execute(
+                f"CREATE INDEX CONCURRENTLY {tmp_name} ON myntra_products "
+                f"{index_definition(kind, row_count, **params)};"
+            )
+
+        conn.autocommit = False
+        with conn.cursor() as cur:
+            cur.execute(f"DROP INDEX IF EXISTS {INDEX_NAME};")
+            cur.execute(f"ALTER INDEX {tmp_name} RENAME TO {INDEX_NAME};")
+        conn.commit()
+    finally:
+        conn.autocommit = previous_autocommit
+
+
+def recall_mode_sql(mode: str = None, top_k: int = 0, iterative_scan: str = None):
+    """
+    SQL + params that set the ANN search knobs for the current transaction only
+    (set_config(..., true) == SET LOCAL). Returned separately so callers can send
+    it in the same round trip as their query.
+    """
+    mode = mode or DEFAULT_RECALL_MODE
+    if mode not in RECALL_MODES:
+        raise ValueError(f"Unknown recall mode: {mode}")
+
+    settings = dict(RECALL_MODES[mode])
+    if "hnsw.ef_search" in settings:
+        # HNSW never returns more than ef_search candidates
+        settings["hnsw.ef_search"] = min(max(settings["hnsw.ef_search"], top_k), HNSW_MAX_EF_SEARCH)
+    iterative_scan = iterative_scan or VECTOR_ITERATIVE_SCAN
+    if iterative_scan not in ITERATIVE_SCAN_MODES:
+        raise ValueError(f"Unknown iterative scan mode: {iterative_scan}")
+    if iterative_scan != "off" and "enable_indexscan" not in settings:
+        settings["hnsw.iterative_scan"] = iterative_scan
+        # IVFFlat has no strict_order; a plain IVFFlat scan does return rows in distance order
+        settings["ivfflat.iterative_scan"] = "off" if iterative_scan == "strict_order" else iterative_scan
+
+    names = list(settings)
+    sql = "SELECT " + ", ".join("set_config(%s, %s, true)" for _ in names) + ";"
+    params = []
+    for name in names:
+        params += [name, str(settings[name])]
+    return sql, params
+
+
+def apply_recall_mode(cur, mode: str = None, top_k: int = 0):
+    """Sets the ANN search knobs for the current transaction only (SET LOCAL)."""
+    cur.execute(*recall_mode_sql(mode, top_k))